@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Déduplication des alertes de disponibilité entre scans
+
+Mémorise, par cible, le dernier état de disponibilité constaté et le dernier
+état notifié (persisté sur disque). Un scan ne produit une alerte que sur:
+- apparition de créneaux (indisponible/inconnu → disponible)
+- disparition de créneaux déjà notifiés (disponible → indisponible)
+- rappel, si les créneaux sont toujours là après NOTIFICATION_DEDUP_WINDOW
+  et que la page diffère de celle notifiée (empreinte de contenu, page_fingerprint)
+Toutes les transitions d'un même scan sont regroupées en une seule alerte.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import json_state
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE = 'available'
+UNAVAILABLE = 'unavailable'
+
+
+class AlertDeduplicator:
+    """État de disponibilité par cible et décision de notification"""
+
+    def __init__(self, window: float = 1800.0, persist_path: Optional[str] = None):
+        self.window = window
+        self.persist_path = persist_path
+        self._lock = threading.Lock()
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'notified': 0, 'suppressed': 0, 'gone': 0}
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'AlertDeduplicator':
+        """Construit le déduplicateur depuis la configuration .env"""
+        return cls(
+            window=float(os.getenv('NOTIFICATION_DEDUP_WINDOW', '1800')),
+            persist_path=os.getenv('NOTIFICATION_STATE_PATH', 'data/alert_state.json') or None
+        )
+
+    def observe(self, pages: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Enregistre les résultats d'un scan et décide quoi notifier
+
+        Args:
+            pages: Résultats par cible ('page', 'available', 'conclusive'...);
+                un résultat non concluant (captcha raté, erreur) ne change pas l'état;
+                'fingerprint' (empreinte de contenu) identique à celle de la page
+                notifiée empêche le rappel; sans empreinte, la fenêtre seule décide
+
+        Returns:
+            {'available': cibles à notifier (apparition ou rappel),
+             'gone': cibles dont les créneaux notifiés ont disparu,
+             'suppressed': cibles toujours disponibles, déjà notifiées}
+        """
+        decision: Dict[str, List[Dict[str, Any]]] = {'available': [], 'gone': [], 'suppressed': []}
+        now = time.time()
+
+        with self._lock:
+            for page in pages:
+                if not page.get('conclusive', True):
+                    continue
+                target = page['page']
+                state = AVAILABLE if page.get('available') else UNAVAILABLE
+                previous = self._targets.get(target, {})
+
+                if state == AVAILABLE:
+                    if previous.get('state') != AVAILABLE:
+                        decision['available'].append(dict(page, transition='appeared'))
+                    elif (previous.get('notified_state') != AVAILABLE
+                          or (now - previous.get('notified_at', 0.0) >= self.window
+                              and not self._same_as_notified(page, previous))):
+                        decision['available'].append(dict(page, transition='reminder'))
+                    else:
+                        decision['suppressed'].append(page)
+                elif previous.get('notified_state') == AVAILABLE:
+                    decision['gone'].append(dict(page, transition='gone'))
+
+                entry = self._targets.setdefault(target, {})
+                if entry.get('state') != state:
+                    entry['changed_at'] = now
+                entry['state'] = state
+                entry['seen_at'] = now
+
+            notified = decision['available'] + decision['gone']
+            for page in notified:
+                entry = self._targets[page['page']]
+                entry['notified_at'] = now
+                entry['notified_state'] = AVAILABLE if page['transition'] != 'gone' else UNAVAILABLE
+                entry['notified_fingerprint'] = page.get('fingerprint')
+
+            self.stats['notified'] += len(decision['available'])
+            self.stats['gone'] += len(decision['gone'])
+            self.stats['suppressed'] += len(decision['suppressed'])
+            self._save()
+
+        for page in decision['suppressed']:
+            wait = self._time_to_reminder(page['page'], now)
+            if wait > 0:
+                logger.info(f"🔕 {page['page']}: créneaux déjà notifiés, rappel dans {wait:.0f}s")
+            else:
+                logger.info(f"🔕 {page['page']}: créneaux déjà notifiés, page identique à l'alerte")
+        return decision
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État courant par cible et compteurs de déduplication"""
+        with self._lock:
+            return {
+                'window': self.window,
+                'targets': {target: dict(entry) for target, entry in self._targets.items()},
+                **self.stats,
+            }
+
+    @staticmethod
+    def _same_as_notified(page: Dict[str, Any], previous: Dict[str, Any]) -> bool:
+        """Page identique (empreinte de contenu) à celle de la dernière alerte"""
+        fingerprint = page.get('fingerprint')
+        return fingerprint is not None and fingerprint == previous.get('notified_fingerprint')
+
+    def _time_to_reminder(self, target: str, now: float) -> float:
+        with self._lock:
+            notified_at = self._targets.get(target, {}).get('notified_at', now)
+        return max(0.0, notified_at + self.window - now)
+
+    def _load(self) -> None:
+        state = json_state.load(self.persist_path, "État des alertes")
+        if isinstance(state, dict):
+            self._targets = state.get('targets', {})
+
+    def _save(self) -> None:
+        json_state.save_atomic(self.persist_path, {'updated_at': time.time(), 'targets': self._targets},
+                               "l'état des alertes")
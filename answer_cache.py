@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Cache des réponses captcha indexé par empreinte du contenu (image + audio)
+
+Éviction LRU bornée et persistance optionnelle sur disque. Seule une réponse
+acceptée par le site est resservie; les lectures refusées sont mémorisées
+pour être exclues d'une nouvelle résolution du même captcha.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import json_state
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(image_bytes: bytes, audio_bytes: Optional[bytes] = None) -> str:
+    """Empreinte SHA-256 du contenu captcha (image puis audio éventuel)"""
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(image_bytes).digest())
+    if audio_bytes:
+        digest.update(hashlib.sha256(audio_bytes).digest())
+    return digest.hexdigest()
+
+
+class CaptchaAnswerCache:
+    """Cache LRU des réponses acceptées par le site"""
+
+    def __init__(self, max_entries: int = 512, persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'CaptchaAnswerCache':
+        """Construit le cache depuis la configuration .env"""
+        return cls(
+            max_entries=int(os.getenv('CAPTCHA_CACHE_SIZE', '512')),
+            persist_path=os.getenv('CAPTCHA_CACHE_PATH', 'data/captcha_answers.json') or None
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Réponse en cache, seulement si le site l'a acceptée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.get('text') or entry.get('accepted') is not True:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def put(
+        self, key: str, text: str, method: str, confidence: str = '',
+        confidence_score: Optional[float] = None, model: Optional[str] = None
+    ) -> None:
+        """Enregistre une réponse acceptée par le site"""
+        with self._lock:
+            previous = self._entries.get(key, {})
+            self._entries[key] = {
+                'text': text,
+                'method': method,
+                'confidence': confidence,
+                'confidence_score': confidence_score,
+                'model': model,
+                'accepted': True,
+                'rejected': previous.get('rejected', []),
+                'stored_at': time.time(),
+            }
+            self._touch(key)
+
+    def record_outcome(self, key: str, accepted: bool) -> None:
+        """Mémorise si le site a accepté la réponse associée à ce contenu"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['accepted'] = accepted
+            self._save()
+
+    def record_rejection(self, key: str, text: str) -> None:
+        """Mémorise une réponse refusée par le site pour ce contenu captcha"""
+        with self._lock:
+            entry = self._entries.setdefault(key, {
+                'text': '',
+                'method': '',
+                'confidence': '',
+                'accepted': None,
+                'rejected': [],
+                'stored_at': time.time(),
+            })
+            rejected = entry.setdefault('rejected', [])
+            if text not in rejected:
+                rejected.append(text)
+            if entry['text'] == text:
+                entry['accepted'] = False
+            self._touch(key)
+
+    def rejected_answers(self, key: str) -> List[str]:
+        """Réponses déjà refusées par le site pour ce contenu captcha"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return list(entry.get('rejected', [])) if entry else []
+
+    def _touch(self, key: str) -> None:
+        """Marque l'entrée comme la plus récente, évince et persiste (verrou tenu)"""
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._save()
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _load(self) -> None:
+        entries = json_state.load(self.persist_path, "Cache captcha")
+        if not isinstance(entries, list):
+            return
+        for key, entry in entries[-self.max_entries:]:
+            self._entries[key] = entry
+        logger.info(f"🗃️ Cache captcha chargé: {len(self._entries)} réponse(s)")
+
+    def _save(self) -> None:
+        # Liste ordonnée (du moins au plus récemment utilisé)
+        json_state.save_atomic(self.persist_path, list(self._entries.items()), "le cache captcha")
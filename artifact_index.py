@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Index en mémoire des artefacts du scanner (captures et audios de screenshots/)
+
+Les artefacts sont horodatés et jamais réécrits: seul l'ensemble des noms
+change. L'index n'est donc rafraîchi que si le mtime du dossier a bougé
+(ajout ou suppression) ou après ARTIFACT_INDEX_RESCAN secondes, et seuls les
+nouveaux fichiers sont stat()és. Les requêtes sont paginées et filtrables
+(type, tentative, période) sans toucher au disque.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_EXTENSIONS = ('.png', '.wav')
+# Délai (s) après lequel un artefact est considéré comme complètement écrit
+WRITE_SETTLE_SECONDS = 10.0
+# captcha_image_20261019_101500_attempt_2.png → type, horodatage, tentative
+_ARTIFACT_NAME = re.compile(r'^(?P<type>[a-z_]+?)_(?P<stamp>\d{8}_\d{6})_attempt_(?P<attempt>\d+)\.\w+$')
+
+
+def screenshots_dir() -> str:
+    """Dossier des artefacts (conteneur: /app/screenshots, sinon ./screenshots)"""
+    return "/app/screenshots" if os.path.exists("/app/screenshots") else "./screenshots"
+
+
+def parse_artifact_name(name: str) -> Dict[str, Any]:
+    """Type, tentative et horodatage déduits du nom (None si non conforme)"""
+    match = _ARTIFACT_NAME.match(name)
+    if not match:
+        return {'type': os.path.splitext(name)[0], 'attempt': None, 'taken_at': None}
+    try:
+        taken_at = datetime.strptime(match.group('stamp'), '%Y%m%d_%H%M%S').timestamp()
+    except ValueError:
+        taken_at = None
+    return {
+        'type': match.group('type'),
+        'attempt': int(match.group('attempt')),
+        'taken_at': taken_at,
+    }
+
+
+class ArtifactIndex:
+    """Artefacts d'un dossier triés par date de modification"""
+
+    def __init__(self, directory: str, rescan_interval: float = 60.0):
+        self.directory = directory
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        # Trié par mtime croissant (bisect pour les périodes)
+        self._ordered: List[Dict[str, Any]] = []
+        self._mtimes: List[float] = []
+        self._dir_mtime: Optional[float] = None
+        self._scanned_at = 0.0
+        self.stats = {'rescans': 0, 'stats': 0}
+
+    @classmethod
+    def from_env(cls) -> 'ArtifactIndex':
+        return cls(screenshots_dir(), float(os.getenv('ARTIFACT_INDEX_RESCAN', '60')))
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Met l'index à jour si le dossier a changé
+
+        Returns:
+            True si un rescan a eu lieu
+        """
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            with self._lock:
+                self._set_records({})
+                self._dir_mtime = None
+            return False
+
+        with self._lock:
+            stale = time.monotonic() - self._scanned_at >= self.rescan_interval
+            if not force and not stale and dir_mtime == self._dir_mtime:
+                return False
+
+            records: Dict[str, Dict[str, Any]] = {}
+            # Un fichier récent peut être encore en cours d'écriture: il est re-stat()é
+            settled_before = time.time() - WRITE_SETTLE_SECONDS
+            try:
+                with os.scandir(self.directory) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(ARTIFACT_EXTENSIONS) or entry.name.startswith('.'):
+                            continue
+                        known = self._records.get(entry.name)
+                        if known is not None and known['mtime'] < settled_before:
+                            records[entry.name] = known
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        self.stats['stats'] += 1
+                        records[entry.name] = dict(
+                            parse_artifact_name(entry.name),
+                            name=entry.name,
+                            size=stat.st_size,
+                            mtime=stat.st_mtime,
+                        )
+            except OSError as e:
+                logger.warning(f"⚠️ Lecture de {self.directory} impossible: {e}")
+                return False
+
+            self._set_records(records)
+            self._dir_mtime = dir_mtime
+            self._scanned_at = time.monotonic()
+            self.stats['rescans'] += 1
+            return True
+
+    def forget(self, name: str) -> None:
+        """Retire un artefact supprimé (sans attendre le prochain rescan)"""
+        with self._lock:
+            if name in self._records:
+                records = dict(self._records)
+                del records[name]
+                self._set_records(records)
+
+    def query(self, artifact_type: Optional[str] = None, attempt: Optional[int] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+        """
+        Artefacts filtrés, du plus récent au plus ancien, page par page
+
+        Args:
+            artifact_type: ex. 'after_submit', 'captcha_audio'
+            attempt: numéro de tentative
+            since, until: bornes de date de modification (timestamps)
+        """
+        self.refresh()
+        with self._lock:
+            start = bisect.bisect_left(self._mtimes, since) if since is not None else 0
+            end = bisect.bisect_right(self._mtimes, until) if until is not None else len(self._mtimes)
+            matching = [
+                record for record in reversed(self._ordered[start:end])
+                if (artifact_type is None or record['type'] == artifact_type)
+                and (attempt is None or record['attempt'] == attempt)
+            ]
+            types = sorted({record['type'] for record in self._ordered})
+
+        return {
+            'total': len(matching),
+            'total_size': sum(record['size'] for record in matching),
+            'offset': offset,
+            'limit': limit,
+            'types': types,
+            'files': [
+                {
+                    'name': record['name'],
+                    'type': record['type'],
+                    'attempt': record['attempt'],
+                    'size': record['size'],
+                    'modified': datetime.fromtimestamp(record['mtime']).isoformat(timespec='seconds'),
+                }
+                for record in matching[offset:offset + limit]
+            ],
+        }
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Copie des enregistrements, du plus ancien au plus récent"""
+        self.refresh()
+        with self._lock:
+            return [dict(record) for record in self._ordered]
+
+    def _set_records(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """Remplace l'index (verrou tenu)"""
+        self._records = records
+        self._ordered = sorted(records.values(), key=lambda record: record['mtime'])
+        self._mtimes = [record['mtime'] for record in self._ordered]
+
+
+_shared_index: Optional[ArtifactIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_artifact_index() -> ArtifactIndex:
+    """Index partagé par le viewer et les tâches de maintenance"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = ArtifactIndex.from_env()
+        return _shared_index
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Prétraitement des audios captcha avant envoi à Gemini
+
+Basé sur le module standard `wave` et NumPy. Étapes activables via
+CAPTCHA_AUDIO_PREPROCESS (ex: "trim,mono,resample"), désactivées par défaut
+tant que leur effet sur la précision n'est pas mesuré:
+- trim: suppression des silences de début et de fin
+- mono: mixage des canaux
+- resample: sous-échantillonnage à CAPTCHA_AUDIO_RATE Hz (jamais de
+  suréchantillonnage: un audio 8 kHz reste à 8 kHz)
+Le format de sortie (CAPTCHA_AUDIO_FORMAT) peut être wav, ou flac/mp3/ogg
+si pydub et ffmpeg sont disponibles.
+"""
+import io
+import logging
+import os
+import threading
+import wave
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE_STEPS = ('trim', 'mono', 'resample')
+DEFAULT_STEPS = 'none'
+
+# Octets reçus et envoyés, tous pipelines confondus (exposés dans /health)
+_totals = {'processed': 0, 'bytes_in': 0, 'bytes_out': 0}
+_totals_lock = threading.Lock()
+
+_FORMAT_MIME_TYPES = {
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+    'mp3': 'audio/mp3',
+    'ogg': 'audio/ogg',
+}
+
+
+def detect_audio_mime(data: bytes) -> str:
+    """Détecte le type MIME réel d'un audio à partir de sa signature"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return 'audio/wav'
+    if data[:4] == b'OggS':
+        return 'audio/ogg'
+    if data[:4] == b'fLaC':
+        return 'audio/flac'
+    if data[:4] == b'FORM' and data[8:12] in (b'AIFF', b'AIFC'):
+        return 'audio/aiff'
+    if data[:3] == b'ID3':
+        return 'audio/mp3'
+    if data[4:8] == b'ftyp':
+        return 'audio/mp4'
+    if len(data) >= 2 and data[0] == 0xFF:
+        # ADTS (AAC) si la layer vaut 0, sinon trame MPEG audio
+        if data[1] & 0xF6 == 0xF0:
+            return 'audio/aac'
+        if data[1] & 0xE0 == 0xE0:
+            return 'audio/mp3'
+    return 'application/octet-stream'
+
+
+class AudioPreprocessor:
+    """Pipeline de prétraitement audio configurable"""
+
+    def __init__(
+        self,
+        steps: Sequence[str] = (),
+        target_rate: int = 16000,
+        output_format: str = 'wav',
+        silence_threshold_db: float = -40.0,
+        padding_ms: int = 100
+    ):
+        unknown = [step for step in steps if step not in AVAILABLE_STEPS]
+        if unknown:
+            raise ValueError(f"Étapes de prétraitement audio inconnues: {unknown}")
+        if output_format not in _FORMAT_MIME_TYPES:
+            raise ValueError(f"Format audio non supporté: {output_format}")
+        self.steps = tuple(step for step in AVAILABLE_STEPS if step in steps)
+        self.target_rate = target_rate
+        self.output_format = output_format
+        self.silence_threshold_db = silence_threshold_db
+        self.padding_ms = padding_ms
+        self.total_bytes_in = 0
+        self.total_bytes_out = 0
+        # Les stratégies de l'ensemble prétraitent en parallèle
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'AudioPreprocessor':
+        """Construit le pipeline depuis la configuration .env"""
+        steps_env = os.getenv('CAPTCHA_AUDIO_PREPROCESS', DEFAULT_STEPS)
+        steps = [s.strip() for s in steps_env.split(',') if s.strip() and s.strip() != 'none']
+        return cls(
+            steps=steps,
+            target_rate=int(os.getenv('CAPTCHA_AUDIO_RATE', '16000')),
+            output_format=os.getenv('CAPTCHA_AUDIO_FORMAT', 'wav').lower()
+        )
+
+    def process(self, data: bytes) -> Tuple[bytes, str]:
+        """
+        Applique les étapes activées à un audio
+
+        Args:
+            data: Contenu brut du fichier audio
+
+        Returns:
+            (contenu traité, type MIME réel); l'audio est renvoyé tel quel
+            s'il n'est pas en WAV PCM ou si NumPy est absent
+        """
+        mime_type = detect_audio_mime(data)
+        if mime_type != 'audio/wav' or (not self.steps and self.output_format == 'wav'):
+            return self._account(data, data, mime_type)
+
+        try:
+            import numpy as np
+        except ImportError:
+            logger.warning("⚠️ NumPy non installé: prétraitement audio désactivé")
+            return self._account(data, data, mime_type)
+
+        try:
+            samples, rate = self._read_wav(np, data)
+        except Exception as e:
+            logger.warning(f"⚠️ WAV non décodable, envoi brut: {e}")
+            return self._account(data, data, mime_type)
+
+        if 'mono' in self.steps and samples.shape[1] > 1:
+            samples = samples.mean(axis=1, keepdims=True)
+        if 'trim' in self.steps:
+            samples = self._trim_silence(np, samples, rate)
+        # Suréchantillonner grossit l'audio sans ajouter d'information
+        if 'resample' in self.steps and rate > self.target_rate:
+            samples = self._resample(np, samples, rate, self.target_rate)
+            rate = self.target_rate
+
+        output = self._write_wav(np, samples, rate)
+        output_mime = 'audio/wav'
+        if self.output_format != 'wav':
+            encoded = self._encode(output, self.output_format)
+            if encoded is not None:
+                output, output_mime = encoded, _FORMAT_MIME_TYPES[self.output_format]
+
+        # Ne jamais envoyer plus gros que l'original
+        if len(output) >= len(data):
+            return self._account(data, data, mime_type)
+        return self._account(data, output, output_mime)
+
+    def _account(self, original: bytes, output: bytes, mime_type: str) -> Tuple[bytes, str]:
+        """Comptabilise les octets économisés"""
+        with self._lock:
+            self.total_bytes_in += len(original)
+            self.total_bytes_out += len(output)
+        with _totals_lock:
+            _totals['processed'] += 1
+            _totals['bytes_in'] += len(original)
+            _totals['bytes_out'] += len(output)
+        saved = len(original) - len(output)
+        if saved > 0:
+            logger.info(f"🎚️ Audio prétraité: {len(original)} → {len(output)} octets ({saved} économisés, {mime_type})")
+        return output, mime_type
+
+    def stats(self) -> Dict[str, Any]:
+        """Octets reçus et envoyés par ce pipeline"""
+        with self._lock:
+            return _summarize(self.total_bytes_in, self.total_bytes_out)
+
+    @staticmethod
+    def _read_wav(np, data: bytes):
+        """Décode un WAV PCM en tableau float32 (échantillons x canaux) normalisé"""
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+
+        if width == 1:
+            samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768
+        elif width == 3:
+            raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+            ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                    | (raw[:, 2].astype(np.int32) << 16))
+            ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+            samples = ints.astype(np.float32) / (1 << 23)
+        elif width == 4:
+            samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / (1 << 31)
+        else:
+            raise ValueError(f"Largeur d'échantillon non supportée: {width}")
+
+        return samples.reshape(-1, channels), rate
+
+    @staticmethod
+    def _write_wav(np, samples, rate: int) -> bytes:
+        """Encode en WAV PCM 16 bits"""
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(samples.shape[1])
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(pcm.tobytes())
+        return buffer.getvalue()
+
+    def _trim_silence(self, np, samples, rate: int):
+        """Coupe le silence avant le premier et après le dernier son audible"""
+        if samples.shape[0] == 0:
+            return samples
+
+        window = max(1, rate // 100)  # fenêtres de 10 ms
+        energy = np.abs(samples).max(axis=1)
+        usable = energy[:len(energy) // window * window]
+        if usable.size == 0:
+            return samples
+        frame_peaks = usable.reshape(-1, window).max(axis=1)
+
+        peak = frame_peaks.max()
+        if peak <= 0:
+            return samples
+        threshold = peak * (10 ** (self.silence_threshold_db / 20))
+        loud = np.flatnonzero(frame_peaks >= threshold)
+
+        padding = int(rate * self.padding_ms / 1000)
+        start = max(0, loud[0] * window - padding)
+        end = min(samples.shape[0], (loud[-1] + 1) * window + padding)
+        return samples[start:end]
+
+    @staticmethod
+    def _resample(np, samples, rate: int, target_rate: int):
+        """Rééchantillonnage linéaire (avec moyenne glissante anti-repliement)"""
+        if samples.shape[0] < 2:
+            return samples
+
+        ratio = rate / target_rate
+        if ratio > 1:
+            kernel_size = int(np.ceil(ratio))
+            kernel = np.ones(kernel_size, dtype=np.float32) / kernel_size
+            samples = np.stack(
+                [np.convolve(samples[:, c], kernel, mode='same') for c in range(samples.shape[1])],
+                axis=1
+            )
+
+        duration = samples.shape[0] / rate
+        target_length = max(1, int(round(duration * target_rate)))
+        source_positions = np.arange(samples.shape[0]) / rate
+        target_positions = np.arange(target_length) / target_rate
+        return np.stack(
+            [np.interp(target_positions, source_positions, samples[:, c]) for c in range(samples.shape[1])],
+            axis=1
+        ).astype(np.float32)
+
+    @staticmethod
+    def _encode(wav_bytes: bytes, output_format: str) -> Optional[bytes]:
+        """Ré-encode via pydub/ffmpeg; None si indisponible"""
+        try:
+            from pydub import AudioSegment
+            segment = AudioSegment.from_wav(io.BytesIO(wav_bytes))
+            buffer = io.BytesIO()
+            segment.export(buffer, format=output_format)
+            return buffer.getvalue()
+        except Exception as e:
+            logger.warning(f"⚠️ Ré-encodage {output_format} impossible, envoi en WAV: {e}")
+            return None
+
+
+def _summarize(bytes_in: int, bytes_out: int) -> Dict[str, Any]:
+    return {
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'saved_ratio': round(1 - bytes_out / bytes_in, 3) if bytes_in else None,
+    }
+
+
+def preprocessing_stats() -> Dict[str, Any]:
+    """Audios traités et octets économisés depuis le démarrage"""
+    with _totals_lock:
+        return dict(_summarize(_totals['bytes_in'], _totals['bytes_out']), processed=_totals['processed'])
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Résolution hors ligne en lot via HybridOptimizedSolver
+
+Évalue un changement de modèle ou de prompt sur des milliers de captchas:
+pool borné de workers, chaque appel Gemini attend son jeton du quota client
+(GEMINI_RATE_LIMITS) et résultats écrits en JSONL au fil de l'eau. Un captcha
+resté sans réponse faute de quota est réessayé puis marqué RATE_LIMITED,
+hors du calcul de précision.
+
+    python batch_solver.py screenshots --labels labels.json --workers 8
+    python batch_solver.py --corpus data/captcha_corpus --limit 2000
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from answer_cache import CaptchaAnswerCache
+from strategy_stats import StrategyStats
+
+# Attente maximale d'un jeton par appel Gemini
+QUOTA_WAIT_SECONDS = 60.0
+# Nouveaux essais d'un captcha resté sans réponse faute de quota (429 serveur)
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF_SECONDS = 30.0
+
+
+def iter_directory(directory: str, labels: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+    """Captures du scanner: captcha_image_<suffixe>.png et l'audio de même suffixe"""
+    for image_path in sorted(glob.glob(os.path.join(directory, 'captcha_image_*.png'))):
+        name = os.path.basename(image_path)
+        suffix = name[len('captcha_image_'):-len('.png')]
+        audio_path = os.path.join(directory, f"captcha_audio_{suffix}.wav")
+        yield {
+            'id': name,
+            'image': image_path,
+            'audio': audio_path if os.path.exists(audio_path) else None,
+            'label': (labels or {}).get(name),
+        }
+
+
+def iter_corpus(base_path: str, accepted_only: bool = True,
+                limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Échantillons du corpus, passés en mémoire aux solvers (lecture mmap)"""
+    from captcha_corpus import CaptchaCorpus
+
+    corpus = CaptchaCorpus(base_path)
+    for sample in corpus.samples(accepted_only=accepted_only, limit=limit):
+        yield {
+            'id': sample.key[:16],
+            'image': sample.image,
+            'audio': sample.audio,
+            'label': sample.label if sample.accepted else None,
+        }
+
+
+class BatchSolver:
+    """Pool borné de workers autour d'un HybridOptimizedSolver partagé"""
+
+    def __init__(self, solver, workers: int = 4, use_cache: bool = False):
+        self.solver = solver
+        self.workers = max(1, workers)
+        if not use_cache:
+            # Une évaluation doit interroger les modèles, pas resservir le cache
+            solver.answer_cache = CaptchaAnswerCache(max_entries=0)
+        # Les essais hors ligne ne doivent pas réordonner les stratégies du scanner
+        solver.strategy_stats = StrategyStats(persist_path=None)
+        # Chaque appel attend son jeton (pris sous verrou) au lieu de sauter le
+        # modèle: N workers ne dépassent pas le RPM, fallback compris
+        from gemini_model_pool import get_model_pool
+        get_model_pool().quota_wait = QUOTA_WAIT_SECONDS
+        self._quota_exhausted = threading.Event()
+
+    def quota_exhausted(self) -> bool:
+        """Vrai quand le quota journalier de tous les modèles est épuisé (arrêt du lot)"""
+        from gemini_model_pool import get_model_pool
+
+        if self._quota_exhausted.is_set():
+            return True
+        pool = get_model_pool()
+        if all(pool.rate_limiter.seconds_until_available(name) is None for name in pool.model_names):
+            print("⛔ Quota journalier épuisé pour tous les modèles, arrêt du lot")
+            self._quota_exhausted.set()
+        return self._quota_exhausted.is_set()
+
+    def solve_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Résout un captcha et produit sa ligne de résultat"""
+        record: Dict[str, Any] = {'id': item['id'], 'expected': item.get('label')}
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            if self.quota_exhausted():
+                record['status'] = 'QUOTA_EXHAUSTED'
+                return record
+            if attempt:
+                time.sleep(RATE_LIMIT_BACKOFF_SECONDS * attempt)
+            result, elapsed = self._solve(item)
+            if result['status'] != 'RATE_LIMITED':
+                break
+
+        record.update({
+            'status': result['status'],
+            'text': result.get('text', ''),
+            'method': result.get('method', ''),
+            'model': result.get('model'),
+            'confidence': result.get('confidence'),
+            'confidence_score': result.get('confidence_score'),
+            'elapsed': elapsed,
+        })
+        if result.get('error'):
+            record['error'] = result['error']
+        # Sans réponse faute de quota: ni juste ni faux
+        if record['expected'] is not None and record['status'] != 'RATE_LIMITED':
+            record['correct'] = record['text'] == record['expected']
+        return record
+
+    def _solve(self, item: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """Résultat du solver et durée de la résolution"""
+        started = time.monotonic()
+        try:
+            result = self.solver.solve_captcha(item['image'], item.get('audio'))
+        except Exception as error:
+            result = {'status': 'ERROR', 'text': '', 'method': 'none', 'error': str(error)}
+        return result, round(time.monotonic() - started, 3)
+
+    def run(self, items: Iterable[Dict[str, Any]], output_path: str) -> Dict[str, Any]:
+        """
+        Résout tous les échantillons et écrit chaque résultat dès qu'il est prêt
+
+        Au plus 2 x workers échantillons sont en vol: la source est lue au
+        fil de l'eau, sans tout charger en mémoire.
+
+        Returns:
+            Résumé (volumes, précision hors captchas RATE_LIMITED, débit)
+        """
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        summary = {'total': 0, 'success': 0, 'labeled': 0, 'correct': 0, 'skipped': 0, 'rate_limited': 0}
+        started = time.monotonic()
+
+        with open(output_path, 'w', encoding='utf-8') as output, \
+                ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+
+            def drain(return_when):
+                nonlocal pending
+                done, pending = wait(pending, return_when=return_when)
+                for future in done:
+                    self._write(output, future.result(), summary, started)
+
+            for item in items:
+                if self._quota_exhausted.is_set():
+                    break
+                pending.add(executor.submit(self.solve_item, item))
+                if len(pending) >= self.workers * 2:
+                    drain(FIRST_COMPLETED)
+            if pending:
+                drain(ALL_COMPLETED)
+
+        elapsed = time.monotonic() - started
+        summary['elapsed'] = round(elapsed, 1)
+        summary['per_second'] = round(summary['total'] / elapsed, 2) if elapsed else None
+        summary['accuracy'] = round(summary['correct'] / summary['labeled'], 3) if summary['labeled'] else None
+        return summary
+
+    @staticmethod
+    def _write(output, record: Dict[str, Any], summary: Dict[str, Any], started: float) -> None:
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        output.flush()
+
+        summary['total'] += 1
+        if record['status'] == 'QUOTA_EXHAUSTED':
+            summary['skipped'] += 1
+        elif record['status'] == 'RATE_LIMITED':
+            summary['rate_limited'] += 1
+        elif record['status'] == 'SUCCESS':
+            summary['success'] += 1
+        if 'correct' in record:
+            summary['labeled'] += 1
+            summary['correct'] += int(record['correct'])
+
+        if summary['total'] % 50 == 0:
+            rate = summary['total'] / max(1e-6, time.monotonic() - started)
+            print(f"📦 {summary['total']} captcha(s) traités ({rate:.1f}/s)")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Résolution de captchas en lot')
+    parser.add_argument('directory', nargs='?', default='screenshots',
+                        help='Dossier de captures (captcha_image_*.png)')
+    parser.add_argument('--corpus', help='Base du corpus (ex: data/captcha_corpus) au lieu du dossier')
+    parser.add_argument('--all', action='store_true', help='Inclure les échantillons refusés du corpus')
+    parser.add_argument('--labels', help='JSON {nom_fichier: code attendu} pour un dossier')
+    parser.add_argument('--output', default='data/batch_results.jsonl')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BATCH_WORKERS', '4')))
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--use-cache', action='store_true', help='Autoriser les réponses en cache')
+    args = parser.parse_args()
+
+    from hybrid_optimized_solver_clean import HybridOptimizedSolver
+
+    if args.corpus:
+        items = iter_corpus(args.corpus, accepted_only=not args.all, limit=args.limit)
+        source = args.corpus
+    else:
+        labels = None
+        if args.labels:
+            with open(args.labels, 'r', encoding='utf-8') as f:
+                labels = json.load(f)
+        items = iter_directory(args.directory, labels)
+        if args.limit:
+            items = islice(items, args.limit)
+        source = args.directory
+
+    batch = BatchSolver(HybridOptimizedSolver(), workers=args.workers, use_cache=args.use_cache)
+    print(f"🚀 Lot {source} → {args.output} ({batch.workers} worker(s))")
+    summary = batch.run(items, args.output)
+
+    print(f"✅ {summary['total']} captcha(s) en {summary['elapsed']}s ({summary['per_second']}/s), "
+          f"{summary['success']} résolu(s), {summary['rate_limited']} sans réponse (quota), "
+          f"précision: {summary['accuracy']}")
+    if summary['total'] == 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Corpus étiqueté de captchas construit automatiquement par le scanner
+
+Format compact en ajout seul:
+- <base>.bin: contenus image/audio concaténés
+- <base>.idx: une ligne JSON par échantillon (empreinte, offsets, étiquette,
+  accepté/refusé, méthode, modèle)
+Les contenus sont dédupliqués par empreinte; une nouvelle ligne d'index pour
+une empreinte connue met à jour son étiquette sans réécrire les données.
+La lecture passe par un mmap: charger des milliers d'échantillons ne coûte
+qu'une lecture de l'index.
+"""
+import json
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from answer_cache import content_key
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusSample:
+    """Échantillon du corpus (contenus servis depuis le mmap)"""
+
+    __slots__ = ('record', '_mapped')
+
+    def __init__(self, record: Dict[str, Any], mapped: mmap.mmap):
+        self.record = record
+        self._mapped = mapped
+
+    @property
+    def key(self) -> str:
+        return self.record['key']
+
+    @property
+    def label(self) -> str:
+        return self.record['label']
+
+    @property
+    def accepted(self) -> bool:
+        return self.record['accepted']
+
+    @property
+    def image(self) -> bytes:
+        offset, length = self.record['image']
+        return self._mapped[offset:offset + length]
+
+    @property
+    def audio(self) -> Optional[bytes]:
+        if not self.record.get('audio'):
+            return None
+        offset, length = self.record['audio']
+        return self._mapped[offset:offset + length]
+
+
+class CaptchaCorpus:
+    """Corpus en ajout seul: un fichier de données et son index"""
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self.data_path = f"{base_path}.bin"
+        self.index_path = f"{base_path}.idx"
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._mapped: Optional[mmap.mmap] = None
+        self._load_index()
+
+    @classmethod
+    def from_env(cls) -> Optional['CaptchaCorpus']:
+        """Corpus configuré via CAPTCHA_CORPUS_PATH (vide = désactivé)"""
+        base_path = os.getenv('CAPTCHA_CORPUS_PATH', 'data/captcha_corpus')
+        return cls(base_path) if base_path else None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Ligne tronquée par un arrêt brutal: on l'ignore
+                    continue
+                self._records[record['key']] = record
+
+    def add(
+        self,
+        image_bytes: bytes,
+        audio_bytes: Optional[bytes],
+        label: str,
+        accepted: bool,
+        method: str = '',
+        model: str = '',
+        target: str = ''
+    ) -> str:
+        """
+        Ajoute un échantillon étiqueté (ou met à jour l'étiquette d'un contenu connu)
+
+        Returns:
+            Empreinte du contenu
+        """
+        key = content_key(image_bytes, audio_bytes)
+        with self._lock:
+            existing = self._records.get(key)
+            if existing and existing['label'] == label and existing['accepted'] == accepted:
+                return key
+            # Une étiquette acceptée n'est jamais écrasée par un refus ultérieur
+            if existing and existing['accepted'] and not accepted:
+                return key
+
+            if existing:
+                image_span, audio_span = existing['image'], existing.get('audio')
+            else:
+                os.makedirs(os.path.dirname(self.data_path) or '.', exist_ok=True)
+                with open(self.data_path, 'ab') as data_file:
+                    offset = data_file.tell()
+                    data_file.write(image_bytes)
+                    image_span = [offset, len(image_bytes)]
+                    audio_span = None
+                    if audio_bytes:
+                        data_file.write(audio_bytes)
+                        audio_span = [offset + len(image_bytes), len(audio_bytes)]
+
+            record = {
+                'key': key,
+                'image': image_span,
+                'audio': audio_span,
+                'label': label,
+                'accepted': accepted,
+                'method': method,
+                'model': model,
+                'target': target,
+                'timestamp': time.time(),
+            }
+            with open(self.index_path, 'a', encoding='utf-8') as index_file:
+                index_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._records[key] = record
+            return key
+
+    def add_files(self, image_path: str, audio_path: Optional[str], **kwargs) -> Optional[str]:
+        """Ajoute un échantillon à partir des fichiers capturés par le scanner"""
+        try:
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
+            audio_bytes = None
+            if audio_path and os.path.exists(audio_path):
+                with open(audio_path, 'rb') as f:
+                    audio_bytes = f.read()
+            return self.add(image_bytes, audio_bytes, **kwargs)
+        except OSError as e:
+            logger.warning(f"⚠️ Échantillon non ajouté au corpus: {e}")
+            return None
+
+    def samples(self, accepted_only: bool = True, limit: Optional[int] = None) -> Iterator[CorpusSample]:
+        """Itère sur les échantillons (lecture mmap, sans copie préalable)"""
+        records: List[Dict[str, Any]] = [
+            r for r in self._records.values() if r['accepted'] or not accepted_only
+        ]
+        if limit is not None:
+            records = records[:limit]
+        mapped = self._mapping() if records else None
+        if mapped is None:
+            return
+
+        for record in records:
+            yield CorpusSample(record, mapped)
+
+    def _mapping(self) -> Optional[mmap.mmap]:
+        """mmap du fichier de données, rouvert si des échantillons ont été ajoutés"""
+        with self._lock:
+            if not os.path.exists(self.data_path):
+                return None
+            size = os.path.getsize(self.data_path)
+            if size == 0:
+                return None
+            if self._mapped is None or len(self._mapped) != size:
+                # L'ancien mmap reste valide pour les échantillons déjà distribués
+                with open(self.data_path, 'rb') as data_file:
+                    self._mapped = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mapped
+
+    def stats(self) -> Dict[str, Any]:
+        accepted = sum(1 for r in self._records.values() if r['accepted'])
+        return {
+            'samples': len(self._records),
+            'accepted': accepted,
+            'rejected': len(self._records) - accepted,
+            'data_bytes': os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0,
+        }
+
+
+def main():
+    """Statistiques du corpus: python captcha_corpus.py [base]"""
+    base_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv('CAPTCHA_CORPUS_PATH', 'data/captcha_corpus')
+    started = time.perf_counter()
+    corpus = CaptchaCorpus(base_path)
+    loaded = sum(len(sample.image) for sample in corpus.samples(accepted_only=False))
+    elapsed = time.perf_counter() - started
+    print(f"📚 Corpus {base_path}: {corpus.stats()}")
+    print(f"⏱️ Chargement complet: {elapsed * 1000:.1f} ms ({loaded} octets d'images)")
+
+
+if __name__ == "__main__":
+    main()
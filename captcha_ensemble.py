@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Vote par caractère entre les réponses des différentes stratégies captcha
+(multimodal, image seule, audio seule)
+"""
+import difflib
+from typing import Dict, List, Optional, Tuple
+
+# Poids de base de chaque stratégie dans le vote
+DEFAULT_METHOD_WEIGHTS: Dict[str, float] = {
+    'multimodal': 1.0,
+    'image_only': 0.8,
+    'audio_only': 0.7,
+}
+
+# Groupes de caractères visuellement ambigus (l'image se trompe, l'audio tranche)
+CONFUSION_GROUPS: Tuple[str, ...] = (
+    '0OoQD',
+    '1lIi|',
+    '5Ss',
+    '8B',
+    '2Zz',
+    '6Gb',
+    '9gq',
+    'uvUV',
+)
+
+# Masse "inconnue" ajoutée au dénominateur: une source seule n'est jamais sûre
+PRIOR_WEIGHT = 0.5
+
+# Facteurs appliqués selon le type de désaccord sur une position
+VISUAL_CONFUSION_FACTORS = {'image_only': 0.5}
+CASE_CONFUSION_FACTORS = {'audio_only': 0.3, 'multimodal': 0.8}
+
+_CANONICAL: Dict[str, str] = {}
+for _group in CONFUSION_GROUPS:
+    for _char in _group:
+        _CANONICAL.setdefault(_char, _group[0])
+
+
+def _canonical(char: str) -> str:
+    """Forme canonique d'un caractère (ignore la casse et les confusions)"""
+    return _CANONICAL.get(char, _CANONICAL.get(char.upper(), char.upper()))
+
+
+def _position_factors(chars: List[str]) -> Dict[str, float]:
+    """Facteurs de pondération par méthode selon la nature du désaccord"""
+    distinct = set(chars)
+    if len(distinct) <= 1:
+        return {}
+    if len({c.lower() for c in distinct}) == 1:
+        return CASE_CONFUSION_FACTORS
+    if len({_canonical(c) for c in distinct}) == 1:
+        return VISUAL_CONFUSION_FACTORS
+    return {}
+
+
+def _align(pivot: str, other: str) -> List[Optional[str]]:
+    """
+    Aligne une réponse sur le pivot
+
+    Returns:
+        Pour chaque position du pivot, le caractère proposé par `other`
+        ou None si `other` n'a rien à cette position
+    """
+    aligned: List[Optional[str]] = [None] * len(pivot)
+    matcher = difflib.SequenceMatcher(
+        None,
+        [_canonical(c) for c in pivot],
+        [_canonical(c) for c in other],
+        autojunk=False
+    )
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ('equal', 'replace'):
+            for offset in range(min(i2 - i1, j2 - j1)):
+                aligned[i1 + offset] = other[j1 + offset]
+    return aligned
+
+
+def vote_candidates(
+    candidates: List[Tuple[str, str]],
+    attempted_methods: List[str],
+    weights: Optional[Dict[str, float]] = None
+) -> Dict[str, object]:
+    """
+    Réconcilie les réponses par vote caractère par caractère
+
+    Args:
+        candidates: Liste de (méthode, texte) ayant produit une réponse
+        attempted_methods: Méthodes lancées (y compris celles en échec)
+        weights: Poids par méthode (DEFAULT_METHOD_WEIGHTS par défaut)
+
+    Returns:
+        Dict avec 'text', 'score' (0-1), 'positions' (score par caractère)
+        et 'agreement' (méthodes en accord total avec le résultat)
+    """
+    weights = weights or DEFAULT_METHOD_WEIGHTS
+    candidates = [(method, text) for method, text in candidates if text]
+    if not candidates:
+        return {'text': '', 'score': 0.0, 'positions': [], 'agreement': []}
+
+    total_weight = sum(weights.get(m, 0.5) for m in set(attempted_methods)) + PRIOR_WEIGHT
+
+    # Longueur retenue: celle qui cumule le plus de poids
+    length_votes: Dict[int, float] = {}
+    for method, text in candidates:
+        length_votes[len(text)] = length_votes.get(len(text), 0.0) + weights.get(method, 0.5)
+    best_length = max(length_votes, key=lambda n: (length_votes[n], n))
+
+    # Pivot: le candidat le plus fiable parmi ceux de la bonne longueur
+    pivot_method, pivot = max(
+        ((m, t) for m, t in candidates if len(t) == best_length),
+        key=lambda mt: weights.get(mt[0], 0.5)
+    )
+
+    columns: List[List[Tuple[str, str]]] = [[] for _ in pivot]
+    for method, text in candidates:
+        aligned = list(text) if method == pivot_method else _align(pivot, text)
+        for index, char in enumerate(aligned):
+            if char is not None:
+                columns[index].append((method, char))
+
+    result_chars: List[str] = []
+    position_scores: List[float] = []
+    for column in columns:
+        factors = _position_factors([char for _, char in column])
+        tally: Dict[str, float] = {}
+        for method, char in column:
+            tally[char] = tally.get(char, 0.0) + weights.get(method, 0.5) * factors.get(method, 1.0)
+        winner = max(tally, key=lambda c: (tally[c], c == pivot[len(result_chars)]))
+        result_chars.append(winner)
+        position_scores.append(round(tally[winner] / total_weight, 3))
+
+    text = ''.join(result_chars)
+    return {
+        'text': text,
+        'score': min(position_scores) if position_scores else 0.0,
+        'positions': position_scores,
+        'agreement': [method for method, candidate in candidates if candidate == text],
+    }
+
+
+def confidence_label(score: float) -> str:
+    """Convertit un score numérique en niveau de confiance historique"""
+    if score >= 0.75:
+        return 'high'
+    if score >= 0.5:
+        return 'medium'
+    if score > 0:
+        return 'low'
+    return 'none'
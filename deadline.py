@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Budget de temps d'une tentative de scan, propagé à chaque étape
+
+Une Deadline est créée par tentative (CAPTCHA_ATTEMPT_DEADLINE secondes) puis
+passée à la navigation, aux captures et à chaque appel des solvers. Chaque
+étape reçoit min(son plafond habituel, budget restant) et échoue tout de
+suite si le budget est épuisé; l'étape qui a fait déborder est mémorisée.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class DeadlineExceeded(Exception):
+    """Budget de la tentative épuisé avant ou pendant une étape"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Budget de {budget:.0f}s épuisé à l'étape '{stage}'")
+        self.stage = stage
+        self.budget = budget
+
+
+class Deadline:
+    """Échéance absolue (horloge monotone) et suivi du temps par étape"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget
+        self.stages: List[Tuple[str, float]] = []
+        self.overrun_stage: Optional[str] = None
+        self._current: Optional[Tuple[str, float]] = None
+
+    @classmethod
+    def from_env(cls) -> 'Deadline':
+        """Budget d'une tentative depuis CAPTCHA_ATTEMPT_DEADLINE (secondes)"""
+        return cls(float(os.getenv('CAPTCHA_ATTEMPT_DEADLINE', '90')))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        """Échoue immédiatement si le budget est épuisé avant l'étape"""
+        if self.expired:
+            self._mark_overrun(stage)
+            raise DeadlineExceeded(stage, self.budget)
+
+    def timeout(self, cap: float, stage: str) -> float:
+        """Délai (s) accordé à une étape: son plafond, borné par le budget restant"""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+    def timeout_ms(self, cap_ms: float, stage: str) -> int:
+        """Variante en millisecondes (timeouts Playwright), au moins 1 ms"""
+        return max(1, int(self.timeout(cap_ms / 1000, stage) * 1000))
+
+    def begin(self, stage: str) -> None:
+        """
+        Clôt l'étape en cours et démarre la suivante
+
+        Échoue immédiatement si le budget est déjà épuisé.
+        """
+        self.finish()
+        self.check(stage)
+        self._current = (stage, time.monotonic())
+
+    def finish(self) -> None:
+        """Clôt l'étape en cours; elle est désignée fautive si elle a épuisé le budget"""
+        if self._current is None:
+            return
+        stage, started = self._current
+        self._current = None
+        self.stages.append((stage, round(time.monotonic() - started, 3)))
+        if self.expired:
+            self._mark_overrun(stage)
+
+    @property
+    def current_stage(self) -> Optional[str]:
+        return self._current[0] if self._current else None
+
+    def _mark_overrun(self, stage: str) -> None:
+        # L'étape en cours est fautive plutôt que le point de contrôle suivant
+        if self.overrun_stage is None:
+            self.overrun_stage = self.current_stage or stage
+
+    def summary(self) -> Dict[str, Any]:
+        """Durée par étape, budget et étape ayant débordé"""
+        return {
+            'budget': self.budget,
+            'elapsed': round(time.monotonic() - self.started, 3),
+            'stages': dict(self.stages),
+            'overrun_stage': self.overrun_stage,
+        }
+
+
+def request_timeout(deadline: Optional[Deadline], cap: float, stage: str) -> float:
+    """Délai d'un appel réseau: le plafond seul sans Deadline, sinon borné par elle"""
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap, stage)
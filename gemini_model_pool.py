@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Registre partagé et paresseux des modèles Gemini
+
+Un seul `genai.configure`, une seule lecture de GEMINI_MODEL_PRIORITY et des
+modèles construits au premier usage. L'état de fallback (modèle préféré),
+les disjoncteurs et les statistiques sont communs à tous les solvers, de
+sorte que les chemins image seule et multimodal voient le même modèle sain.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from deadline import request_timeout
+from rate_limiter import ModelRateLimiter, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PRIORITY = (
+    "gemini-2.5-flash,gemini-2.0-flash-exp,gemini-2.0-flash,gemini-2.5-flash-lite,gemini-2.0-flash-lite,gemini-2.5-pro"
+)
+
+
+class QuotaExhausted(Exception):
+    """Aucun modèle n'a répondu et tous les refus venaient des quotas (client ou 429)"""
+
+    def __init__(self, kind: str):
+        super().__init__(f"Quota épuisé pour tous les modèles ({kind})")
+        self.kind = kind
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Détecte les erreurs liées au rate limit pour déclencher un fallback."""
+    keywords = (
+        "rate limit",
+        "quota",
+        "429",
+        "resource exhausted",
+        "too many requests",
+    )
+    message = str(error).lower()
+    if any(keyword in message for keyword in keywords):
+        return True
+
+    code = getattr(error, 'code', None)
+    if code in (429, '429'):
+        return True
+
+    status = getattr(error, 'status', None)
+    if status in (429, 'RESOURCE_EXHAUSTED', 'TOO_MANY_REQUESTS'):
+        return True
+
+    status_code = getattr(error, 'status_code', None)
+    if status_code in (429, '429'):
+        return True
+
+    try:
+        from google.api_core import exceptions as google_exceptions
+        if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return True
+    except Exception:
+        # google.api_core peut ne pas être présent ou ne pas exposer ces exceptions
+        pass
+
+    return False
+
+
+class ModelStats:
+    """Statistiques d'appels d'un modèle"""
+
+    def __init__(self):
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.total_latency = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        # Disjoncteur ouvert par un 429 (quota serveur) plutôt que par des erreurs
+        self.opened_by_rate_limit = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'successes': self.successes,
+            'failures': self.failures,
+            'rate_limited': self.rate_limited,
+            'avg_latency': round(self.total_latency / self.calls, 3) if self.calls else None,
+            'breaker_open': self.open_until > time.monotonic(),
+        }
+
+
+class GeminiModelPool:
+    """Pool de modèles Gemini partagé par tous les solvers"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model_names: List[str],
+        multimodal_whitelist: Optional[set] = None,
+        rate_limiter: Optional[ModelRateLimiter] = None,
+        breaker_threshold: int = 3,
+        breaker_cooldown: float = 120.0,
+        request_timeout: float = 30.0
+    ):
+        self.api_key = api_key
+        self.model_names = model_names
+        self.multimodal_whitelist = multimodal_whitelist
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        # Plafond d'un appel generate_content (réduit au budget restant de la tentative)
+        self.request_timeout = request_timeout
+        # Attente maximale d'un jeton du quota client avant de sauter un modèle
+        # (0 = modèle sauté aussitôt; les lots hors ligne attendent leur tour)
+        self.quota_wait = 0.0
+
+        self._lock = threading.RLock()
+        self._genai = None
+        self._models: Dict[str, Any] = {}
+        self._failed_models: set = set()
+        self._preferred_index = 0
+        self.stats: Dict[str, ModelStats] = {name: ModelStats() for name in model_names}
+        # Latence et tokens par stratégie et options de génération
+        self.strategy_stats: Dict[str, Dict[str, float]] = {}
+
+    def is_available(self) -> bool:
+        """Vérifie qu'une clé API est configurée"""
+        return bool(self.api_key) and self.api_key != 'your_gemini_api_key_here'
+
+    @property
+    def active_model_name(self) -> Optional[str]:
+        """Modèle ayant répondu en dernier (premier essayé au prochain appel)"""
+        if not self.model_names:
+            return None
+        return self.model_names[self._preferred_index]
+
+    def _ensure_configured(self):
+        """Importe et configure google.generativeai au premier usage"""
+        with self._lock:
+            if self._genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+            return self._genai
+
+    def get_model(self, model_name: str):
+        """Retourne le modèle (construit au premier appel), None si impossible"""
+        with self._lock:
+            if model_name in self._models:
+                return self._models[model_name]
+            if model_name in self._failed_models:
+                return None
+
+            genai = self._ensure_configured()
+            try:
+                model = genai.GenerativeModel(model_name)
+            except Exception as err:
+                logger.warning(f"⚠️ Impossible d'initialiser le modèle {model_name}: {err}")
+                self._failed_models.add(model_name)
+                return None
+
+            self._models[model_name] = model
+            logger.info(f"✅ Modèle Gemini initialisé: {model_name}")
+            return model
+
+    def supports_multimodal(self, model_name: str) -> bool:
+        """Indique si un modèle supporte image+audio selon la configuration"""
+        if self.multimodal_whitelist is None:
+            return True
+        return model_name in self.multimodal_whitelist
+
+    def is_breaker_open(self, model_name: str) -> bool:
+        """Un modèle en échec répété est mis de côté pendant le cooldown"""
+        return self.stats[model_name].open_until > time.monotonic()
+
+    def iterate_candidates(self, require_multimodal: bool = False) -> Iterator[str]:
+        """Itère sur les modèles utilisables en commençant par le modèle préféré"""
+        total = len(self.model_names)
+        start = self._preferred_index
+        for offset in range(total):
+            model_name = self.model_names[(start + offset) % total]
+            if require_multimodal and not self.supports_multimodal(model_name):
+                logger.info(f"⏭️ Modèle {model_name} ignoré (pas de support multimodal déclaré)")
+                continue
+            if self.is_breaker_open(model_name):
+                logger.info(f"⏭️ Modèle {model_name} ignoré (disjoncteur ouvert)")
+                continue
+            yield model_name
+
+    def acquire(self, model_name: str, deadline=None) -> bool:
+        """Réserve un appel dans le quota client du modèle (attente bornée par quota_wait)"""
+        max_wait = self.quota_wait
+        if deadline is not None:
+            max_wait = min(max_wait, deadline.remaining())
+        if self.rate_limiter.acquire(model_name, max_wait):
+            return True
+        logger.info(f"🚦 Modèle {model_name} ignoré: quota client épuisé {self.rate_limiter.remaining(model_name)}")
+        return False
+
+    def record_success(self, model_name: str, latency: float) -> None:
+        """Enregistre un succès et fait du modèle le préféré"""
+        with self._lock:
+            stats = self.stats[model_name]
+            stats.calls += 1
+            stats.successes += 1
+            stats.total_latency += latency
+            stats.consecutive_failures = 0
+            stats.open_until = 0.0
+            self._preferred_index = self.model_names.index(model_name)
+
+    def record_failure(self, model_name: str, latency: float, rate_limited: bool = False) -> None:
+        """Enregistre un échec et ouvre le disjoncteur si nécessaire"""
+        with self._lock:
+            stats = self.stats[model_name]
+            stats.calls += 1
+            stats.failures += 1
+            stats.total_latency += latency
+            stats.consecutive_failures += 1
+            if rate_limited:
+                stats.rate_limited += 1
+                self.rate_limiter.mark_exhausted(model_name)
+            if rate_limited or stats.consecutive_failures >= self.breaker_threshold:
+                stats.open_until = time.monotonic() + self.breaker_cooldown
+                stats.opened_by_rate_limit = rate_limited
+                logger.warning(f"🔌 Disjoncteur ouvert pour {model_name} ({self.breaker_cooldown:.0f}s)")
+
+    def generate_text(
+        self, kind: str, contents: List[Any], require_multimodal: bool = False,
+        settings=None, deadline=None
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Interroge les modèles dans l'ordre jusqu'à obtenir une réponse
+
+        Args:
+            kind: Libellé de la stratégie (pour les logs)
+            contents: Prompt et médias envoyés à generate_content
+            require_multimodal: Ignorer les modèles sans support audio déclaré
+            settings: GenerationSettings de la stratégie (generation_config)
+            deadline: Deadline de la tentative (DeadlineExceeded si épuisée)
+
+        Returns:
+            (modèle, texte brut) ou None si tous les modèles ont échoué
+
+        Raises:
+            QuotaExhausted: tous les modèles essayés ont été refusés par un quota
+        """
+        last_error: Optional[Exception] = None
+        # Aucune réponse à cause des quotas seulement: à réessayer plus tard,
+        # pas à compter comme une mauvaise lecture
+        rate_limited = other_failure = False
+
+        for model_name in self.iterate_candidates(require_multimodal):
+            # Vérifié avant de consommer un jeton du quota
+            request_timeout(deadline, self.request_timeout, f"gemini {kind}")
+            if not self.acquire(model_name, deadline):
+                rate_limited = True
+                continue
+            # Budget restant après l'éventuelle attente du jeton
+            timeout = request_timeout(deadline, self.request_timeout, f"gemini {kind}")
+
+            model_instance = self.get_model(model_name)
+            if model_instance is None:
+                other_failure = True
+                continue
+
+            logger.info(f"🤖 Résolution {kind} avec modèle '{model_name}'")
+            started = time.monotonic()
+            try:
+                request_options = {'timeout': timeout}
+                if settings is not None:
+                    response = model_instance.generate_content(
+                        contents, generation_config=settings.config_for(model_name),
+                        request_options=request_options)
+                else:
+                    response = model_instance.generate_content(contents, request_options=request_options)
+                latency = time.monotonic() - started
+                self._record_strategy(kind, settings, latency, response)
+
+                text = getattr(response, 'text', None)
+                if not text:
+                    other_failure = True
+                    self.record_failure(model_name, latency)
+                    logger.warning(f"❌ Pas de réponse de Gemini pour le modèle {model_name}")
+                    continue
+
+                self.record_success(model_name, latency)
+                return model_name, text
+
+            except Exception as error:
+                last_error = error
+                if is_rate_limit_error(error):
+                    rate_limited = True
+                    self.record_failure(model_name, time.monotonic() - started, rate_limited=True)
+                    logger.warning(f"⏳ Rate limit sur le modèle {model_name}, essai du suivant")
+                    continue
+
+                other_failure = True
+                self.record_failure(model_name, time.monotonic() - started)
+                logger.error(f"❌ Erreur Gemini {kind} ({model_name}): {error}")
+                continue
+
+        if not rate_limited and not other_failure:
+            # Aucun modèle essayé: écartés par un disjoncteur ouvert après un 429 ?
+            rate_limited = any(
+                self.is_breaker_open(name) and self.stats[name].opened_by_rate_limit
+                for name in self.model_names
+                if not require_multimodal or self.supports_multimodal(name)
+            )
+        if rate_limited and not other_failure:
+            logger.warning(f"⏳ Aucun modèle {kind} disponible: quotas épuisés")
+            raise QuotaExhausted(kind)
+        if last_error:
+            logger.error(f"❌ Tous les modèles {kind} ont échoué. Dernière erreur: {last_error}")
+        else:
+            logger.error(f"❌ Aucun modèle {kind} n'a pu répondre.")
+        return None
+
+    def _record_strategy(self, kind: str, settings, latency: float, response) -> None:
+        """Cumule latence et tokens par stratégie et options de génération"""
+        key = f"{kind}:{settings.label}" if settings is not None else kind
+        usage = getattr(response, 'usage_metadata', None)
+        with self._lock:
+            stats = self.strategy_stats.setdefault(
+                key, {'calls': 0, 'latency': 0.0, 'prompt_tokens': 0, 'output_tokens': 0})
+            stats['calls'] += 1
+            stats['latency'] += latency
+            if usage is not None:
+                stats['prompt_tokens'] += getattr(usage, 'prompt_token_count', 0) or 0
+                stats['output_tokens'] += getattr(usage, 'candidates_token_count', 0) or 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État partagé (modèle actif, statistiques et quotas) pour l'observabilité"""
+        # Les workers ajoutent des stratégies et mettent à jour les compteurs en parallèle
+        with self._lock:
+            strategies = {
+                key: {
+                    'calls': stats['calls'],
+                    'avg_latency': round(stats['latency'] / stats['calls'], 3),
+                    'avg_prompt_tokens': round(stats['prompt_tokens'] / stats['calls'], 1),
+                    'avg_output_tokens': round(stats['output_tokens'] / stats['calls'], 1),
+                }
+                for key, stats in self.strategy_stats.items() if stats['calls']
+            }
+            snapshot = {
+                'active_model': self.active_model_name,
+                'models': {name: stats.to_dict() for name, stats in self.stats.items()},
+                'strategies': strategies,
+            }
+        snapshot['quota'] = self.rate_limiter.snapshot()
+        return snapshot
+
+
+_shared_pool: Optional[GeminiModelPool] = None
+_shared_lock = threading.Lock()
+
+
+def get_model_pool() -> GeminiModelPool:
+    """Pool partagé, créé au premier appel depuis la configuration .env"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            try:
+                from dotenv import load_dotenv
+                load_dotenv()
+            except ImportError:
+                pass
+
+            priority_env = os.getenv('GEMINI_MODEL_PRIORITY', DEFAULT_MODEL_PRIORITY)
+            model_names = [m.strip() for m in priority_env.split(',') if m.strip()]
+
+            multimodal_env = os.getenv('GEMINI_MULTIMODAL_MODELS')
+            whitelist = None
+            if multimodal_env:
+                whitelist = {m.strip() for m in multimodal_env.split(',') if m.strip()}
+
+            _shared_pool = GeminiModelPool(
+                api_key=os.getenv('GEMINI_API_KEY'),
+                model_names=model_names,
+                multimodal_whitelist=whitelist,
+                breaker_threshold=int(os.getenv('GEMINI_BREAKER_THRESHOLD', '3')),
+                breaker_cooldown=float(os.getenv('GEMINI_BREAKER_COOLDOWN', '120')),
+                request_timeout=float(os.getenv('GEMINI_REQUEST_TIMEOUT', '30'))
+            )
+            logger.info(f"🧩 Pool Gemini: {', '.join(model_names)}")
+        return _shared_pool
+
+
+def peek_model_pool() -> Optional[GeminiModelPool]:
+    """Pool partagé s'il existe déjà, sans le créer"""
+    return _shared_pool
@@ -4,53 +4,66 @@ Solution gratuite et performante pour les captchas alphanumériques
 """
 import os
 import logging
-from typing import Optional
+from typing import Optional, Tuple
 import base64
+from deadline import Deadline, DeadlineExceeded
+from gemini_model_pool import QuotaExhausted, get_model_pool
+from image_preprocessing import ImagePreprocessor
+from generation_settings import GenerationSettings, parse_captcha_response
+from media_source import MediaSource, as_file_input, describe_media
 
 logger = logging.getLogger(__name__)
 
 
 class GeminiCaptchaSolver:
     """Résolveur de captcha utilisant Gemini Vision"""
-    
+
+    # Prompt optimisé pour les captchas de préfecture
+    PROMPT = """Analyze this CAPTCHA image carefully.
+
+This is a prefecture (government) CAPTCHA that contains ONLY:
+- Letters (uppercase A-Z and lowercase a-z)
+- Numbers (0-9)
+- NO special characters, NO symbols, NO accents
+
+Your task:
+1. Read the text in the image character by character
+2. The code is the exact text you see, with NO spaces
+3. If you see "D7H4Y5", the code is: D7H4Y5
+4. If you see "abc123", the code is: abc123
+
+Important rules:
+- Be very careful with similar-looking characters (0 vs O, 1 vs l vs I, 5 vs S, 8 vs B)
+- Pay attention to uppercase vs lowercase
+- ONLY use letters A-Z, a-z and numbers 0-9
+- NO special characters like š, ç, é, ñ, etc."""
+
     def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
+        # Modèles, fallback et disjoncteurs partagés avec le solver multimodal
+        self.pool = get_model_pool()
+        self.api_key = self.pool.api_key
         self.use_gemini = os.getenv('USE_GEMINI', 'false').lower() == 'true'
-        self.model = None
-        self.model_name = None
         # Par défaut on considère que les modèles listés supportent le multimodal
         # (utile pour l'observabilité et la compatibilité avec le solver multimodal)
         self.supports_multimodal = True
+        self.rate_limiter = self.pool.rate_limiter
+        self.image_preprocessor = ImagePreprocessor.from_env()
+        self.generation_settings = GenerationSettings.from_env('image', self.PROMPT)
+        self.enabled = self.use_gemini and self.pool.is_available() and bool(self.pool.model_names)
         
-        if self.use_gemini and self.api_key and self.api_key != 'your_gemini_api_key_here':
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_key)
-
-                # Priorité des modèles configurable via .env pour fallback
-                # Priorité demandée par l'utilisateur
-                default_priority = 'gemini-2.5-flash,gemini-2.0-flash-exp,gemini-2.0-flash,gemini-2.5-flash-lite,gemini-2.0-flash-lite,gemini-2.5-pro'
-                priority_env = os.getenv('GEMINI_MODEL_PRIORITY', default_priority)
-                models = [m.strip() for m in priority_env.split(',') if m.strip()]
-
-                for model_name in models:
-                    try:
-                        self.model = genai.GenerativeModel(model_name)
-                        self.model_name = model_name
-                        logger.info(f"✅ Gemini Vision initialisé avec le modèle: {model_name}")
-                        logger.info(f"🔍 Support multimodal: {self.supports_multimodal} (modèle: {self.model_name})")
-                        break
-                    except Exception:
-                        self.model = None
-                if not self.model:
-                    logger.warning("⚠️ Aucun modèle Gemini initialisé (tous ont échoué)")
-            except Exception as e:
-                logger.warning(f"⚠️ Erreur lors de l'initialisation de Gemini: {e}")
-                self.model = None
+        if self.enabled:
+            logger.info(f"✅ Gemini Vision prêt (modèles initialisés au premier usage: {', '.join(self.pool.model_names)})")
         elif self.use_gemini:
             logger.warning("⚠️ USE_GEMINI=true mais GEMINI_API_KEY non configuré")
+
+    @property
+    def model_name(self) -> Optional[str]:
+        """Modèle actif du pool partagé"""
+        return self.pool.active_model_name
     
-    def solve_captcha_from_file(self, image_path: str) -> Optional[str]:
+    def solve_captcha_from_file(
+        self, image_path: str, deadline: Optional[Deadline] = None
+    ) -> Optional[Tuple[str, str]]:
         """
         Résout un captcha à partir d'un fichier image
         
@@ -58,49 +71,47 @@ class GeminiCaptchaSolver:
             image_path: Chemin vers l'image du captcha
             
         Returns:
-            Le texte du captcha ou None si échec
+            (modèle ayant répondu, texte du captcha) ou None si échec
+        """
+        return self.solve_captcha_from_bytes(image_path, deadline)
+    
+    def solve_captcha_from_bytes(
+        self, image_bytes: MediaSource, deadline: Optional[Deadline] = None
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Résout un captcha entièrement en mémoire
+        
+        Args:
+            image_bytes: Bytes de l'image du captcha (bytes, memoryview,
+                objet fichier ou chemin)
+            deadline: Budget de la tentative (DeadlineExceeded et QuotaExhausted propagées)
+            
+        Returns:
+            (modèle ayant répondu, texte du captcha) ou None si échec
         """
-        if not self.model:
+        if not self.enabled:
             logger.debug("Gemini non disponible")
             return None
         
         try:
-            logger.info(f"🤖 Analyse du captcha avec Gemini (modèle {getattr(self, 'model', None) and getattr(self, 'model', None).__class__.__name__ or 'unknown'}): {image_path}")
+            logger.info(f"🤖 Analyse du captcha avec Gemini Vision: {describe_media(image_bytes)}")
             
-            # Charger l'image
+            # Charger l'image (sans fichier temporaire)
             from PIL import Image
-            image = Image.open(image_path)
-            
-            # Prompt optimisé pour les captchas de préfecture
-            prompt = """Analyze this CAPTCHA image carefully.
-
-This is a prefecture (government) CAPTCHA that contains ONLY:
-- Letters (uppercase A-Z and lowercase a-z)
-- Numbers (0-9)
-- NO special characters, NO symbols, NO accents
-
-Your task:
-1. Read the text in the image character by character
-2. Return ONLY the exact text you see, with NO spaces, NO explanations, NO formatting
-3. If you see "D7H4Y5", return exactly: D7H4Y5
-4. If you see "abc123", return exactly: abc123
-
-Important rules:
-- Be very careful with similar-looking characters (0 vs O, 1 vs l vs I, 5 vs S, 8 vs B)
-- Pay attention to uppercase vs lowercase
-- ONLY use letters A-Z, a-z and numbers 0-9
-- NO special characters like š, ç, é, ñ, etc.
-- Return ONLY the captcha text, nothing else
-
-CAPTCHA text:"""
+            image = self.image_preprocessor.process(Image.open(as_file_input(image_bytes)))
             
-            # Envoyer à Gemini
-            logger.info(f"🧩 Utilisation du modèle Gemini: {getattr(self, 'model_name', 'unknown')}")
-            response = self.model.generate_content([prompt, image])
+            # Envoyer à Gemini (fallback et quotas gérés par le pool partagé)
+            answer = self.pool.generate_text(
+                'image', [self.generation_settings.prompt, image],
+                settings=self.generation_settings, deadline=deadline)
             
-            if response and response.text:
+            if answer:
+                model_name, result = answer
+                # Extraire le code de la réponse JSON structurée si activée
+                if self.generation_settings.structured:
+                    result = parse_captcha_response(result)
                 # Nettoyer la réponse
-                result = response.text.strip()
+                result = result.strip()
                 # Enlever les marqueurs de code si présents
                 result = result.replace('`', '').replace('\n', '').replace(' ', '')
                 
@@ -112,52 +123,18 @@ CAPTCHA text:"""
                     logger.warning(f"⚠️ Caractères invalides supprimés: '{result}' -> '{cleaned_result}'")
                     result = cleaned_result
                 
-                logger.info(f"✅ Gemini a lu le captcha (modèle {getattr(self, 'model_name', 'unknown')}): '{result}'")
-                return result
+                logger.info(f"✅ Gemini a lu le captcha (modèle {model_name}): '{result}'")
+                return model_name, result
             else:
                 logger.warning("❌ Gemini n'a pas pu lire le captcha")
                 return None
                 
+        except (DeadlineExceeded, QuotaExhausted):
+            raise
         except Exception as e:
             logger.error(f"❌ Erreur lors de la résolution avec Gemini: {e}", exc_info=True)
             return None
     
-    def solve_captcha_from_bytes(self, image_bytes: bytes) -> Optional[str]:
-        """
-        Résout un captcha à partir de bytes
-        
-        Args:
-            image_bytes: Bytes de l'image du captcha
-            
-        Returns:
-            Le texte du captcha ou None si échec
-        """
-        if not self.model:
-            return None
-        
-        try:
-            import tempfile
-            
-            # Sauvegarder temporairement
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                tmp.write(image_bytes)
-                tmp_path = tmp.name
-            
-            # Résoudre
-            result = self.solve_captcha_from_file(tmp_path)
-            
-            # Nettoyer
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la résolution avec Gemini (bytes): {e}")
-            return None
-    
     def is_available(self) -> bool:
         """Vérifie si Gemini est disponible et configuré"""
-        return self.model is not None
+        return self.enabled
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Paramètres de génération Gemini par stratégie (image, audio, multimodal)
+
+Sortie contrainte et minimale: température 0, limite de tokens serrée et
+schéma JSON {code}. Les réglages et le prompt final sont
+construits une seule fois par stratégie puis réutilisés.
+
+Variables .env:
+- GEMINI_STRUCTURED_OUTPUT: true/false (schéma JSON)
+- GEMINI_MAX_OUTPUT_TOKENS: limite de sortie (0 = pas de limite)
+- GEMINI_THINKING_TOKENS: marge de raisonnement ajoutée à la limite des
+  modèles "thinking" (0 = pas de limite pour ces modèles)
+- GEMINI_TEMPERATURE: température (0 par défaut)
+"""
+import json
+import os
+import re
+from typing import Any, Dict
+
+RESPONSE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'code': {'type': 'STRING'},
+    },
+    'required': ['code'],
+}
+
+# Consigne de format ajoutée aux prompts (qui ne décrivent que la tâche)
+STRUCTURED_SUFFIX = '\n\nFormat de réponse: JSON {"code": "<code>"}'
+TEXT_SUFFIX = "\n\nFormat de réponse: le code captcha seul, rien d'autre.\nCode captcha:"
+
+# Les modèles "thinking" décomptent leur raisonnement de max_output_tokens:
+# la limite serrée seule leur ferait renvoyer une réponse vide, ils reçoivent
+# donc la limite plus une marge de raisonnement (le SDK ne règle pas thinking_budget).
+THINKING_MODEL_PREFIXES = ('gemini-2.5',)
+
+
+class GenerationSettings:
+    """Prompt et generation_config d'une stratégie, construits une fois"""
+
+    def __init__(
+        self,
+        strategy: str,
+        prompt: str,
+        structured: bool = True,
+        max_output_tokens: int = 64,
+        temperature: float = 0.0,
+        thinking_tokens: int = 1024
+    ):
+        self.strategy = strategy
+        self.structured = structured
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.thinking_tokens = thinking_tokens
+        self.prompt = prompt + (STRUCTURED_SUFFIX if structured else TEXT_SUFFIX)
+
+        self._base_config: Dict[str, Any] = {'temperature': temperature, 'candidate_count': 1}
+        if structured:
+            self._base_config['response_mime_type'] = 'application/json'
+            self._base_config['response_schema'] = RESPONSE_SCHEMA
+        self._configs: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_env(cls, strategy: str, prompt: str) -> 'GenerationSettings':
+        """Réglages d'une stratégie depuis la configuration .env"""
+        return cls(
+            strategy=strategy,
+            prompt=prompt,
+            structured=os.getenv('GEMINI_STRUCTURED_OUTPUT', 'true').lower() == 'true',
+            max_output_tokens=int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS', '64')),
+            temperature=float(os.getenv('GEMINI_TEMPERATURE', '0')),
+            thinking_tokens=int(os.getenv('GEMINI_THINKING_TOKENS', '1024'))
+        )
+
+    @property
+    def label(self) -> str:
+        """Libellé des options actives (clé des statistiques de latence/tokens)"""
+        parts = ['json' if self.structured else 'text', f"t{self.temperature:g}"]
+        if self.max_output_tokens:
+            parts.append(f"max{self.max_output_tokens}")
+        return '/'.join(parts)
+
+    def config_for(self, model_name: str) -> Dict[str, Any]:
+        """generation_config pour un modèle (mis en cache)"""
+        config = self._configs.get(model_name)
+        if config is None:
+            config = dict(self._base_config)
+            if self.max_output_tokens and not model_name.startswith(THINKING_MODEL_PREFIXES):
+                config['max_output_tokens'] = self.max_output_tokens
+            elif self.max_output_tokens and self.thinking_tokens:
+                # Une réponse tronquée (raisonnement trop long) est vide: le pool passe au modèle suivant
+                config['max_output_tokens'] = self.max_output_tokens + self.thinking_tokens
+            self._configs[model_name] = config
+        return config
+
+
+def parse_captcha_response(response_text: str) -> str:
+    """
+    Extrait le code d'une réponse Gemini
+
+    Accepte la réponse JSON structurée ou, à défaut, du texte libre.
+
+    Returns:
+        Code limité à [a-zA-Z0-9]
+    """
+    text = response_text.strip()
+    try:
+        payload = json.loads(text)
+        if isinstance(payload, dict) and 'code' in payload:
+            text = str(payload['code'])
+    except ValueError:
+        pass
+
+    return re.sub(r'[^a-zA-Z0-9]', '', text)
@@ -3,22 +3,46 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 import threading
 import json
 from datetime import datetime
+from audio_preprocessing import preprocessing_stats as audio_preprocessing_stats
+from gemini_model_pool import peek_model_pool
+from notifier import peek_notifier
+from retention import peek_retention_engine
+
+
+def _snapshot(component):
+    """État d'un composant déjà démarré, None s'il n'existe pas encore"""
+    return component.snapshot() if component is not None else None
+
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/health':
-            self.send_response(200)
+            # Le corps est construit avant l'en-tête: une erreur donne un 500 lisible
+            try:
+                health_status = {
+                    'status': 'healthy',
+                    'timestamp': datetime.now().isoformat(),
+                    'service': 'rdv_scanner',
+                    'version': '1.0.0',
+                    # Modèle actif, disjoncteurs, statistiques et quotas restants
+                    'gemini': _snapshot(peek_model_pool()),
+                    # File, boîte d'envoi et latence détection → livraison des alertes
+                    'notifications': _snapshot(peek_notifier()),
+                    # Suppressions et passages du moteur de rétention des artefacts
+                    'retention': _snapshot(peek_retention_engine()),
+                    # Octets audio reçus / envoyés à Gemini après prétraitement
+                    'audio_preprocessing': audio_preprocessing_stats()
+                }
+                body = json.dumps(health_status).encode()
+                code = 200
+            except Exception as e:
+                body = json.dumps({'status': 'error', 'error': str(e)}).encode()
+                code = 500
+
+            self.send_response(code)
             self.send_header('Content-type', 'application/json')
             self.end_headers()
-            
-            health_status = {
-                'status': 'healthy',
-                'timestamp': datetime.now().isoformat(),
-                'service': 'rdv_scanner',
-                'version': '1.0.0'
-            }
-            
-            self.wfile.write(json.dumps(health_status).encode())
+            self.wfile.write(body)
         else:
             self.send_response(404)
             self.end_headers()
@@ -5,12 +5,29 @@ Résolveur Captcha Hybride Optimisé - Utilise multimodal en priorité
 import glob
 import os
 import re
-from typing import Dict, Any, List, Tuple, Optional
-from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Set, Tuple, Optional
+from answer_cache import CaptchaAnswerCache, content_key
+from captcha_ensemble import vote_candidates, confidence_label
+from deadline import Deadline
+from gemini_model_pool import QuotaExhausted
 from gemini_solver import GeminiCaptchaSolver
+from local_recognizer import LocalCaptchaRecognizer
+from media_source import MediaSource, read_media, read_optional_media
 from multimodal_gemini_solver import MultimodalGeminiSolver
+from strategy_stats import StrategyStats
 
-load_dotenv()
+STRATEGY_MESSAGES = {
+    'multimodal': "🔥 Tentative multimodale (image + audio)...",
+    'image_only': "🖼️ Tentative image seule...",
+    'audio_only': "🎧 Tentative audio seul...",
+}
+
+# Résolutions en attente du verdict du site (cache_key → réponse, cible, méthode, latence)
+MAX_PENDING_OUTCOMES = 64
 
 
 class HybridOptimizedSolver:
@@ -20,25 +37,170 @@ class HybridOptimizedSolver:
         self.multimodal_solver = MultimodalGeminiSolver()
         self.image_solver = GeminiCaptchaSolver()  # Fallback
 
+        # Mode de résolution: 'fallback' (séquentiel) ou 'ensemble' (vote concurrent)
+        self.mode = os.getenv('CAPTCHA_SOLVER_MODE', 'fallback').lower()
+
+        # Réponses déjà obtenues pour un contenu captcha identique
+        self.answer_cache = CaptchaAnswerCache.from_env()
+
+        # Acceptation et latence observées par stratégie et par cible (ordre du fallback)
+        self.strategy_stats = StrategyStats.from_env()
+        self._pending_outcomes: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # Les workers du lot résolvent et enregistrent les verdicts en parallèle
+        self._pending_lock = threading.Lock()
+
+        # Premier niveau local (CPU) optionnel, entraîné sur le corpus accepté
+        self.local_recognizer = LocalCaptchaRecognizer.from_env()
+        self.local_min_confidence = float(os.getenv('LOCAL_RECOGNIZER_MIN_CONFIDENCE', '0.6'))
+        if self.local_recognizer:
+            print(f"🏠 Reconnaissance locale active (seuil {self.local_min_confidence})")
+
         print("✅ Résolveur hybride optimisé initialisé")
 
+    def solve_captcha(
+        self, image: MediaSource, audio: Optional[MediaSource] = None, target: str = '',
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Résout un captcha selon le mode configuré (CAPTCHA_SOLVER_MODE)
+
+        Avec une Deadline, chaque appel Gemini reçoit le budget restant et
+        DeadlineExceeded est levée dès qu'il est épuisé. Le statut
+        'RATE_LIMITED' signale qu'aucune stratégie n'a répondu faute de quota.
+
+        Image et audio peuvent être des chemins, des bytes ou des objets
+        fichier: ils sont lus une seule fois puis traités en mémoire.
+        Consulte d'abord le cache par empreinte du contenu. Le résultat porte
+        un 'cache_key' à renvoyer à record_outcome() une fois la réponse du
+        site connue; target (page cible) sépare les statistiques de stratégies.
+        """
+        try:
+            image_bytes, audio_bytes = self._load_media(image, audio)
+        except OSError as error:
+            print(f"❌ Captcha illisible: {error}")
+            return {
+                'status': 'ERROR',
+                'text': '',
+                'method': 'none',
+                'confidence': 'none',
+                'attempts': [],
+                'cache_key': None
+            }
+
+        cache_key = content_key(image_bytes, audio_bytes)
+        cached = self.answer_cache.get(cache_key)
+        if cached:
+            print(f"🗃️ Réponse en cache: '{cached['text']}' ({cached['method']})")
+            return {
+                'status': 'SUCCESS',
+                'text': cached['text'],
+                'method': cached['method'],
+                'confidence': cached.get('confidence') or 'medium',
+                'confidence_score': cached.get('confidence_score'),
+                'model': cached.get('model'),
+                'attempts': [('cache', cached['text'], 'success')],
+                'cached': True,
+                'cache_key': cache_key
+            }
+
+        # Lectures déjà refusées par le site pour ce même captcha
+        excluded = set(self.answer_cache.rejected_answers(cache_key))
+        if excluded:
+            print(f"🚫 Réponses déjà refusées pour ce captcha: {sorted(excluded)}")
+
+        local_result = self._solve_locally(image_bytes, excluded)
+        if local_result:
+            result = local_result
+        elif self.mode == 'ensemble':
+            result = self.solve_captcha_ensemble(image_bytes, audio_bytes, excluded, deadline)
+        else:
+            result = self.solve_captcha_with_fallback(image_bytes, audio_bytes, excluded, target, deadline)
+
+        result['cache_key'] = cache_key
+        if result['status'] == 'SUCCESS':
+            # Mise en cache au verdict du site: une réponse peu sûre peut encore être
+            # écartée par le scanner (captcha rafraîchi) ou refusée
+            with self._pending_lock:
+                self._pending_outcomes[cache_key] = {
+                    'target': target,
+                    'text': result['text'],
+                    'method': result['method'],
+                    'confidence': result['confidence'],
+                    'confidence_score': result.get('confidence_score'),
+                    'model': result.get('model'),
+                    'elapsed': result.get('elapsed', 0.0),
+                }
+                while len(self._pending_outcomes) > MAX_PENDING_OUTCOMES:
+                    self._pending_outcomes.popitem(last=False)
+        return result
+
+    def record_outcome(self, cache_key: Optional[str], accepted: bool) -> None:
+        """Enregistre si le site a accepté la réponse (seule une réponse acceptée est mise en cache)"""
+        if not cache_key:
+            return
+        pending = self._pop_pending(cache_key)
+        if accepted and pending is not None:
+            self.answer_cache.put(
+                cache_key, pending['text'], pending['method'], pending['confidence'],
+                confidence_score=pending['confidence_score'], model=pending['model'])
+        else:
+            self.answer_cache.record_outcome(cache_key, accepted)
+        self._record_strategy_outcome(pending, accepted)
+
+    def record_rejection(self, cache_key: Optional[str], text: str) -> None:
+        """
+        Mémorise une réponse refusée (error=invalidCaptcha) pour ce captcha
+
+        Si le même captcha est resservi, cette lecture est exclue et le
+        candidat suivant (autre modalité) est proposé, ou un nouveau captcha
+        est demandé (status 'REFRESH').
+        """
+        if cache_key and text:
+            self.answer_cache.record_rejection(cache_key, text)
+            self._record_strategy_outcome(self._pop_pending(cache_key), accepted=False)
+
+    def _pop_pending(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        with self._pending_lock:
+            return self._pending_outcomes.pop(cache_key, None)
+
+    def _record_strategy_outcome(self, pending: Optional[Dict[str, Any]], accepted: bool) -> None:
+        """Verdict du site pour la stratégie ayant produit la réponse soumise"""
+        if pending is None:
+            return
+        self.strategy_stats.record(pending['target'], pending['method'], accepted, pending['elapsed'])
+
+    @staticmethod
+    def _load_media(
+        image: MediaSource, audio: Optional[MediaSource] = None
+    ) -> Tuple[bytes, Optional[bytes]]:
+        """Contenus image et audio (audio None si absent ou fichier inexistant)"""
+        return read_media(image), read_optional_media(audio)
+
     def solve_captcha_with_fallback(
-        self, image_path: str, audio_path: Optional[str] = None
+        self, image: MediaSource, audio: Optional[MediaSource] = None,
+        excluded: Optional[Set[str]] = None, target: str = '',
+        deadline: Optional[Deadline] = None
     ) -> Dict[str, Any]:
         """
         Résout un captcha avec stratégie de fallback intelligente
 
-        Priorité:
-        1. Multimodal (image + audio) si audio disponible
-        2. Image seule en fallback
+        Stratégies: multimodal (image + audio) et audio seul si l'audio est
+        disponible, image seule sinon. Leur ordre et l'étiquette de confiance
+        viennent des statistiques observées pour la cible (acceptation par le
+        site et latence sur une fenêtre glissante); sans historique, l'ordre
+        reste multimodal → image seule → audio seul.
 
         Args:
-            image_path: Chemin vers l'image captcha
-            audio_path: Chemin vers l'audio captcha (optionnel)
+            image: Image captcha (chemin, bytes ou objet fichier)
+            audio: Audio captcha (optionnel)
+            excluded: Réponses déjà refusées par le site pour ce captcha
+            target: Page cible (statistiques séparées par cible)
+            deadline: Budget de la tentative, vérifié avant chaque stratégie
 
         Returns:
             Dict avec résultat et informations de debug
         """
+        image_bytes, audio_bytes = self._load_media(image, audio)
         attempts_list: List[Tuple[str, str, str]] = []
         result: Dict[str, Any] = {
             'status': 'ERROR',
@@ -48,64 +210,71 @@ class HybridOptimizedSolver:
             'attempts': attempts_list
         }
 
-        # Stratégie 1: Multimodal si audio disponible
-        if audio_path and os.path.exists(audio_path):
-            print("🔥 Tentative multimodale (image + audio)...")
-
-            multimodal_text = self.multimodal_solver.solve_captcha_multimodal(
-                image_path, audio_path)
-            if multimodal_text and self._validate_captcha_format(multimodal_text):
-                result.update({
-                    'status': 'SUCCESS',
-                    'text': multimodal_text,
-                    'method': 'multimodal',
-                    'confidence': 'high'
-                })
-                result['attempts'].append(
-                    ('multimodal', multimodal_text, 'success'))
-                return result
-            else:
-                result['attempts'].append(
-                    ('multimodal', multimodal_text or 'null', 'failed'))
-
-        # Stratégie 2: Image seule (fallback)
-        print("🖼️ Fallback: Image seule...")
-
+        strategies: Dict[str, Callable[[], Optional[Tuple[str, str]]]] = {}
+        if audio_bytes:
+            strategies['multimodal'] = lambda: self.multimodal_solver.solve_captcha_multimodal(
+                image_bytes, audio_bytes, deadline=deadline)
         if self.image_solver.is_available():
-            image_text = self.image_solver.solve_captcha_from_file(image_path)
-            if image_text and self._validate_captcha_format(image_text):
+            strategies['image_only'] = lambda: self.image_solver.solve_captcha_from_bytes(
+                image_bytes, deadline=deadline)
+        if audio_bytes:
+            strategies['audio_only'] = lambda: self.multimodal_solver.solve_captcha_audio_only(
+                audio_bytes, deadline=deadline)
+
+        order = self.strategy_stats.order(target, list(strategies))
+        print(f"🧭 Ordre des stratégies ({target or 'défaut'}): {' → '.join(order)}")
+
+        for name in order:
+            if deadline is not None:
+                deadline.check(f"solve {name}")
+            print(STRATEGY_MESSAGES[name])
+            started = time.monotonic()
+            try:
+                # (modèle ayant répondu, lecture): le modèle actif du pool a pu changer depuis
+                model_name, text = strategies[name]() or (None, None)
+            except QuotaExhausted:
+                # Aucune lecture faute de quota: ni réponse ni échec de la stratégie
+                attempts_list.append((name, 'null', 'rate_limited'))
+                continue
+            elapsed = time.monotonic() - started
+
+            if self._is_usable(text, excluded):
                 result.update({
                     'status': 'SUCCESS',
-                    'text': image_text,
-                    'method': 'image_only',
-                    'confidence': 'medium'
+                    'text': text,
+                    'method': name,
+                    'confidence': self.strategy_stats.confidence(target, name),
+                    'model': model_name,
+                    'elapsed': elapsed
                 })
-                result['attempts'].append(
-                    ('image_only', image_text, 'success'))
+                result['attempts'].append((name, text, 'success'))
                 return result
-            else:
-                result['attempts'].append(
-                    ('image_only', image_text or 'null', 'failed'))
 
-        # Stratégie 3: Audio seul si disponible (dernier recours)
-        if audio_path and os.path.exists(audio_path):
-            print("🎧 Dernier recours: Audio seul...")
-
-            audio_text = self.multimodal_solver.solve_captcha_audio_only(
-                audio_path)
-            if audio_text and self._validate_captcha_format(audio_text):
-                result.update({
-                    'status': 'SUCCESS',
-                    'text': audio_text,
-                    'method': 'audio_only',
-                    'confidence': 'low'
-                })
-                result['attempts'].append(
-                    ('audio_only', audio_text, 'success'))
-                return result
-            else:
-                result['attempts'].append(
-                    ('audio_only', audio_text or 'null', 'failed'))
+            failure = self._failure_label(text, excluded)
+            result['attempts'].append((name, text or 'null', failure))
+            if failure == 'failed':
+                # Réponse vide ou invalide: un essai non accepté pour cette stratégie
+                self.strategy_stats.record(target, name, accepted=False, latency=elapsed)
+
+        # Toutes les réponses restantes ont déjà été refusées: mieux vaut un nouveau captcha
+        if any(status == 'rejected' for _, _, status in attempts_list):
+            result.update({
+                'status': 'REFRESH',
+                'text': '',
+                'method': 'none',
+                'confidence': 'none'
+            })
+            return result
+
+        if any(status == 'rate_limited' for _, _, status in attempts_list):
+            # À réessayer quand un jeton sera disponible, pas une mauvaise lecture
+            result.update({
+                'status': 'RATE_LIMITED',
+                'text': '',
+                'method': 'none',
+                'confidence': 'none'
+            })
+            return result
 
         # Échec total
         result.update({
@@ -117,6 +286,183 @@ class HybridOptimizedSolver:
 
         return result
 
+    def solve_captcha_ensemble(
+        self, image: MediaSource, audio: Optional[MediaSource] = None,
+        excluded: Optional[Set[str]] = None, deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Résout un captcha en lançant toutes les stratégies en parallèle
+        puis en réconciliant leurs réponses par vote caractère par caractère
+
+        Le multimodal et l'audio peuvent ainsi corriger l'image sur les
+        confusions visuelles (0/O, 1/l...), et l'image corrige la casse.
+
+        Args:
+            image: Image captcha (chemin, bytes ou objet fichier)
+            audio: Audio captcha (optionnel)
+            excluded: Réponses déjà refusées par le site pour ce captcha
+            deadline: Budget de la tentative; les stratégies encore en cours à
+                l'échéance sont ignorées (leur appel Gemini n'est pas annulé, voir plus bas)
+
+        Returns:
+            Dict avec résultat, 'confidence_score' (0-1) et détails du vote
+        """
+        image_bytes, audio_bytes = self._load_media(image, audio)
+        has_audio = bool(audio_bytes)
+
+        strategies = {}
+        if has_audio:
+            strategies['multimodal'] = lambda: self.multimodal_solver.solve_captcha_multimodal(
+                image_bytes, audio_bytes, deadline=deadline)
+        strategies['image_only'] = lambda: self._solve_image_only(image_bytes, deadline)
+        if has_audio:
+            strategies['audio_only'] = lambda: self.multimodal_solver.solve_captcha_audio_only(
+                audio_bytes, deadline=deadline)
+
+        print(f"🗳️ Résolution en ensemble ({', '.join(strategies)})...")
+        started = time.monotonic()
+
+        answers: Dict[str, Optional[str]] = {}
+        models: Dict[str, str] = {}
+        rate_limited: Set[str] = set()
+        executor = ThreadPoolExecutor(max_workers=len(strategies))
+        try:
+            futures = {name: executor.submit(func) for name, func in strategies.items()}
+            # À l'échéance, on vote avec les réponses déjà arrivées
+            wait(futures.values(), timeout=deadline.remaining() if deadline is not None else None)
+            for name, future in futures.items():
+                if not future.done():
+                    print(f"⏱️ Stratégie {name} ignorée (budget épuisé, appel en cours non annulé)")
+                    answers[name] = None
+                    continue
+                try:
+                    answer = future.result()
+                    answers[name] = answer[1] if answer else None
+                    if answer:
+                        models[name] = answer[0]
+                except QuotaExhausted:
+                    print(f"⏳ Stratégie {name} sans réponse (quota épuisé)")
+                    rate_limited.add(name)
+                    answers[name] = None
+                except Exception as error:
+                    print(f"❌ Stratégie {name} en erreur: {error}")
+                    answers[name] = None
+        finally:
+            # Un appel Gemini déjà parti ne peut pas être interrompu: son thread
+            # continue et son jeton RPM/RPD est consommé. La fuite reste bornée:
+            # le timeout de la requête est plafonné par le budget restant et le
+            # pool refuse tout nouvel appel (autre modèle) une fois l'échéance passée.
+            # cancel_futures n'écarte que les stratégies pas encore démarrées.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if deadline is not None and deadline.expired and not any(answers.values()):
+            deadline.check('solve ensemble')
+
+        attempts_list: List[Tuple[str, str, str]] = []
+        candidates: List[Tuple[str, str]] = []
+        for name in strategies:
+            text = answers.get(name)
+            if text and self._validate_captcha_format(text):
+                candidates.append((name, text))
+                attempts_list.append((name, text, 'success'))
+            elif name in rate_limited:
+                attempts_list.append((name, 'null', 'rate_limited'))
+            else:
+                attempts_list.append((name, text or 'null', 'failed'))
+
+        vote = vote_candidates(candidates, list(strategies))
+        if excluded and vote['text'] in excluded:
+            # Meilleur candidat suivant: on revote sans les lectures déjà refusées
+            remaining = [(name, text) for name, text in candidates if text not in excluded]
+            print(f"🚫 '{vote['text']}' déjà refusé, revote sur {len(remaining)} candidat(s)")
+            vote = vote_candidates(remaining, list(strategies))
+            if vote['text'] in excluded:
+                vote = vote_candidates([], list(strategies))
+            if not vote['text']:
+                return {
+                    'status': 'REFRESH',
+                    'text': '',
+                    'method': 'none',
+                    'confidence': 'none',
+                    'confidence_score': 0.0,
+                    'attempts': attempts_list,
+                    'elapsed': time.monotonic() - started
+                }
+
+        score = float(vote['score'])
+        elapsed = time.monotonic() - started
+
+        if not vote['text']:
+            return {
+                'status': 'RATE_LIMITED' if rate_limited else 'FAILED',
+                'text': '',
+                'method': 'none',
+                'confidence': 'none',
+                'confidence_score': 0.0,
+                'attempts': attempts_list,
+                'elapsed': elapsed
+            }
+
+        return {
+            'status': 'SUCCESS',
+            'text': vote['text'],
+            'method': 'ensemble',
+            'confidence': confidence_label(score),
+            'confidence_score': score,
+            # Modèles ayant fourni une lecture au vote (un par stratégie)
+            'model': '+'.join(sorted({models[name] for name, _ in candidates})),
+            'models': {name: models[name] for name, _ in candidates},
+            'positions': vote['positions'],
+            'agreement': vote['agreement'],
+            'attempts': attempts_list,
+            'elapsed': elapsed
+        }
+
+    def _solve_locally(self, image_bytes: bytes, excluded: Set[str]) -> Optional[Dict[str, Any]]:
+        """Lecture locale retenue seulement au-dessus du seuil de confiance"""
+        if not self.local_recognizer:
+            return None
+
+        started = time.monotonic()
+        try:
+            text, score = self.local_recognizer.recognize(image_bytes)
+        except Exception as error:
+            print(f"⚠️ Reconnaissance locale en erreur: {error}")
+            return None
+        elapsed = time.monotonic() - started
+
+        if score < self.local_min_confidence or not self._is_usable(text, excluded):
+            print(f"🏠 Local: '{text}' ({score:.2f}) insuffisant, escalade vers Gemini")
+            return None
+
+        print(f"🏠 Local: '{text}' ({score:.2f}) en {elapsed * 1000:.1f} ms")
+        return {
+            'status': 'SUCCESS',
+            'text': text,
+            'method': 'local',
+            'confidence': confidence_label(score),
+            'confidence_score': score,
+            'model': 'local',
+            'attempts': [('local', text, 'success')],
+            'elapsed': elapsed
+        }
+
+    def _solve_image_only(
+        self, image_bytes: bytes, deadline: Optional[Deadline] = None
+    ) -> Optional[Tuple[str, str]]:
+        """Image seule via Gemini Vision, ou via le solver multimodal à défaut"""
+        if self.image_solver.is_available():
+            return self.image_solver.solve_captcha_from_bytes(image_bytes, deadline)
+        return self.multimodal_solver.solve_captcha_image_only(image_bytes, deadline=deadline)
+
+    def _is_usable(self, text: Optional[str], excluded: Optional[Set[str]]) -> bool:
+        """Réponse au bon format et pas déjà refusée par le site"""
+        return bool(text) and self._validate_captcha_format(text) and text not in (excluded or ())
+
+    @staticmethod
+    def _failure_label(text: Optional[str], excluded: Optional[Set[str]]) -> str:
+        return 'rejected' if text and text in (excluded or ()) else 'failed'
+
     def _validate_captcha_format(self, text: str) -> bool:
         """Valide le format du captcha"""
         if not text:
@@ -150,8 +496,8 @@ def test_hybrid_solver():
     print(f"Audio: {latest_audio or 'Non disponible'}")
     print()
 
-    # Test avec stratégie de fallback
-    result = solver.solve_captcha_with_fallback(latest_image, latest_audio)
+    # Test avec la stratégie configurée (cache par contenu inclus)
+    result = solver.solve_captcha(latest_image, latest_audio)
 
     print("📊 RÉSULTAT:")
     print(f"   Status: {result['status']}")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Prétraitement des images captcha avant envoi à Gemini
+
+Étapes vectorisées NumPy, activables individuellement via
+CAPTCHA_IMAGE_PREPROCESS (ex: "crop,grayscale,contrast,denoise,resize"):
+- crop: recadrage sur la boîte englobante du texte
+- grayscale: niveaux de gris
+- contrast: étirement du contraste (percentiles 2-98)
+- denoise: filtre médian 3x3
+- resize: réduction à une hauteur cible (jamais d'agrandissement)
+
+Aucune étape par défaut: l'effet sur la précision de Gemini n'a pas encore été
+mesuré sur des captchas étiquetés. CANDIDATE_STEPS est le pipeline à évaluer
+avec le benchmark (--labels --api) avant de l'activer.
+"""
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+AVAILABLE_STEPS = ('crop', 'grayscale', 'contrast', 'denoise', 'resize')
+DEFAULT_STEPS = 'none'
+# Pipeline réduisant le plus la charge utile, à valider par le benchmark
+CANDIDATE_STEPS = 'crop,grayscale,contrast,resize'
+
+
+class ImagePreprocessor:
+    """Pipeline de prétraitement configurable"""
+
+    def __init__(
+        self,
+        steps: Sequence[str] = (),
+        target_height: int = 64,
+        crop_threshold: int = 40,
+        crop_margin: int = 4
+    ):
+        unknown = [step for step in steps if step not in AVAILABLE_STEPS]
+        if unknown:
+            raise ValueError(f"Étapes de prétraitement inconnues: {unknown}")
+        self.steps = tuple(step for step in AVAILABLE_STEPS if step in steps)
+        self.target_height = target_height
+        self.crop_threshold = crop_threshold
+        self.crop_margin = crop_margin
+        self._numpy_missing_logged = False
+
+    @classmethod
+    def from_env(cls) -> 'ImagePreprocessor':
+        """Construit le pipeline depuis la configuration .env"""
+        steps_env = os.getenv('CAPTCHA_IMAGE_PREPROCESS', DEFAULT_STEPS)
+        steps = [s.strip() for s in steps_env.split(',') if s.strip() and s.strip() != 'none']
+        return cls(
+            steps=steps,
+            target_height=int(os.getenv('CAPTCHA_IMAGE_HEIGHT', '64'))
+        )
+
+    def process(self, image):
+        """
+        Applique les étapes activées à une image PIL
+
+        Returns:
+            Nouvelle image PIL (l'image d'origine si aucune étape ou NumPy absent)
+        """
+        if not self.steps:
+            return image
+
+        try:
+            import numpy as np
+        except ImportError:
+            if not self._numpy_missing_logged:
+                logger.warning("⚠️ NumPy non installé: prétraitement image désactivé")
+                self._numpy_missing_logged = True
+            return image
+
+        from PIL import Image
+
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        pixels = np.asarray(image, dtype=np.float32)
+
+        if 'crop' in self.steps:
+            pixels = self._crop(np, pixels)
+        if 'grayscale' in self.steps and pixels.ndim == 3:
+            pixels = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        if 'contrast' in self.steps:
+            pixels = self._stretch_contrast(np, pixels)
+        if 'denoise' in self.steps:
+            pixels = self._median_filter(np, pixels)
+
+        result = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+        if 'resize' in self.steps and result.height > self.target_height:
+            width = max(1, round(result.width * self.target_height / result.height))
+            result = result.resize((width, self.target_height), Image.LANCZOS)
+
+        return result
+
+    def _crop(self, np, pixels):
+        """Recadre sur les pixels qui diffèrent du fond (médiane de la bordure)"""
+        gray = pixels if pixels.ndim == 2 else pixels.mean(axis=2)
+        border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+        mask = np.abs(gray - np.median(border)) > self.crop_threshold
+
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if rows.size == 0 or cols.size == 0:
+            return pixels
+
+        top = max(0, rows[0] - self.crop_margin)
+        bottom = min(gray.shape[0], rows[-1] + self.crop_margin + 1)
+        left = max(0, cols[0] - self.crop_margin)
+        right = min(gray.shape[1], cols[-1] + self.crop_margin + 1)
+        return pixels[top:bottom, left:right]
+
+    @staticmethod
+    def _stretch_contrast(np, pixels):
+        """Étire l'histogramme entre les percentiles 2 et 98"""
+        low, high = np.percentile(pixels, (2, 98))
+        if high - low < 1:
+            return pixels
+        return (pixels - low) * (255.0 / (high - low))
+
+    @staticmethod
+    def _median_filter(np, pixels):
+        """Filtre médian 3x3 (par canal) sans boucle Python"""
+        padded = np.pad(
+            pixels,
+            ((1, 1), (1, 1)) + ((0, 0),) * (pixels.ndim - 2),
+            mode='edge'
+        )
+        windows = np.lib.stride_tricks.sliding_window_view(padded, (3, 3), axis=(0, 1))
+        return np.median(windows.reshape(windows.shape[:-2] + (9,)), axis=-1)
+
+
+def encoded_size(image) -> int:
+    """Taille PNG de l'image, proche de la charge envoyée à l'API"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.tell()
+
+
+def benchmark_preprocessing(
+    image_paths: List[str],
+    labels: Optional[Dict[str, str]] = None,
+    solver=None
+) -> List[Dict[str, Any]]:
+    """
+    Compare chaque étape seule, puis toutes ensemble, à l'image brute
+
+    Args:
+        image_paths: Images captcha à traiter
+        labels: Réponses attendues par nom de fichier (pour la précision)
+        solver: MultimodalGeminiSolver pour mesurer latence et précision (optionnel)
+
+    Returns:
+        Une ligne de résultats par configuration
+    """
+    from PIL import Image
+
+    configurations = [('raw', ())] + [(step, (step,)) for step in AVAILABLE_STEPS]
+    configurations.append(('all', AVAILABLE_STEPS))
+    configurations.append(('candidate', tuple(CANDIDATE_STEPS.split(','))))
+
+    rows = []
+    for name, steps in configurations:
+        preprocessor = ImagePreprocessor(steps=steps)
+        total_bytes = 0
+        cpu_time = 0.0
+        api_time = 0.0
+        correct = 0
+        evaluated = 0
+
+        for path in image_paths:
+            with Image.open(path) as source:
+                source.load()
+                started = time.perf_counter()
+                processed = preprocessor.process(source)
+                cpu_time += time.perf_counter() - started
+            total_bytes += encoded_size(processed)
+
+            if solver is not None:
+                from gemini_model_pool import QuotaExhausted
+
+                started = time.perf_counter()
+                try:
+                    answer = solver.solve_captcha_image_only(path, image_data=processed)
+                    answer = answer[1] if answer else None
+                except QuotaExhausted:
+                    # Pas de lecture: exclu de la précision plutôt que compté faux
+                    api_time += time.perf_counter() - started
+                    continue
+                api_time += time.perf_counter() - started
+                expected = (labels or {}).get(os.path.basename(path))
+                if expected is not None:
+                    evaluated += 1
+                    correct += int(answer == expected)
+
+        count = max(1, len(image_paths))
+        rows.append({
+            'config': name,
+            'avg_bytes': total_bytes // count,
+            'avg_preprocess_ms': round(cpu_time * 1000 / count, 2),
+            'avg_api_ms': round(api_time * 1000 / count, 1) if solver is not None else None,
+            'accuracy': round(correct / evaluated, 3) if evaluated else None,
+        })
+    return rows
+
+
+def main():
+    """Benchmark: python image_preprocessing.py <dossier> [labels.json] [--api]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark du prétraitement des images captcha')
+    parser.add_argument('directory', nargs='?', default='screenshots')
+    parser.add_argument('--labels', help='JSON {nom_fichier: code attendu}')
+    parser.add_argument('--api', action='store_true',
+                        help='Mesurer aussi latence et précision via Gemini')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(os.path.join(args.directory, 'captcha_image_*.png')))[:args.limit]
+    if not image_paths:
+        print(f"❌ Aucune image captcha dans {args.directory}")
+        sys.exit(1)
+
+    labels = None
+    if args.labels:
+        with open(args.labels, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+
+    solver = None
+    if args.api:
+        from multimodal_gemini_solver import MultimodalGeminiSolver
+        solver = MultimodalGeminiSolver()
+
+    print(f"🧪 Benchmark prétraitement sur {len(image_paths)} image(s)")
+    for row in benchmark_preprocessing(image_paths, labels, solver):
+        print(
+            f"   {row['config']:<10} {row['avg_bytes']:>8} o  "
+            f"{row['avg_preprocess_ms']:>7} ms CPU  "
+            f"API: {row['avg_api_ms']} ms  précision: {row['accuracy']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
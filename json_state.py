@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Persistance de l'état des composants (fichiers de data/)
+
+Lecture tolérante: fichier absent ou illisible → None (avec avertissement),
+le composant repart d'un état vide. Écriture atomique: fichier temporaire
+puis os.replace, un arrêt brutal laisse l'ancien état ou le nouveau, jamais
+un fichier tronqué. Un chemin vide désactive la persistance.
+"""
+import json
+import logging
+import os
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def load(path: Optional[str], label: str) -> Any:
+    """Contenu JSON de path, None s'il est absent ou illisible"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ {label} illisible ({path}): {e}")
+        return None
+
+
+def write_atomic(path: str, text: str) -> None:
+    """Remplace path par text (OSError propagée)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_atomic(path: Optional[str], data: Any, label: str) -> bool:
+    """
+    Écrit data en JSON; un échec est journalisé sans interrompre l'appelant
+
+    Returns:
+        True si l'état est sur disque
+    """
+    if not path:
+        return False
+    try:
+        write_atomic(path, json.dumps(data, ensure_ascii=False))
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Impossible de sauvegarder {label}: {e}")
+        return False
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Reconnaissance locale (CPU, NumPy) des captchas, en amont de Gemini
+
+Modèle volontairement simple: segmentation des caractères par projection
+verticale, glyphes normalisés en 16x16 puis plus proches voisins (cosinus)
+sur les glyphes extraits du corpus de captchas acceptés. La réponse n'est
+retenue qu'au-dessus d'un seuil de confiance; sinon on escalade vers Gemini.
+
+    python local_recognizer.py train [corpus] [modele.npz]
+    python local_recognizer.py evaluate [corpus] [modele.npz]
+"""
+import io
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLYPH_SIZE = 16
+MIN_GLYPH_WIDTH = 2
+
+
+def _load_gray(np, image):
+    """Image PIL ou bytes -> tableau float32 en niveaux de gris"""
+    from PIL import Image
+
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    return np.asarray(image.convert('L'), dtype=np.float32)
+
+
+def _binarize(np, gray):
+    """Masque du texte: pixels éloignés du fond (médiane de la bordure), seuil d'Otsu"""
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    distance = np.abs(gray - np.median(border))
+
+    histogram, edges = np.histogram(distance, bins=64)
+    centers = (edges[:-1] + edges[1:]) / 2
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * centers)
+    total_weight, total_mean = weights[-1], means[-1]
+    background = weights[:-1]
+    foreground = total_weight - background
+    valid = (background > 0) & (foreground > 0)
+    if not valid.any():
+        return distance > 0
+    between = np.zeros_like(centers[:-1])
+    between[valid] = (
+        (total_mean * background[valid] / total_weight - means[:-1][valid]) ** 2
+        / (background[valid] * foreground[valid])
+    )
+    return distance > centers[int(np.argmax(between))]
+
+
+def segment_characters(np, mask, expected: Optional[int] = None) -> List:
+    """Découpe le masque en glyphes par projection verticale"""
+    columns = mask.any(axis=0)
+    segments: List[Tuple[int, int]] = []
+    start = None
+    for index, filled in enumerate(columns):
+        if filled and start is None:
+            start = index
+        elif not filled and start is not None:
+            segments.append((start, index))
+            start = None
+    if start is not None:
+        segments.append((start, len(columns)))
+    segments = [(a, b) for a, b in segments if b - a >= MIN_GLYPH_WIDTH]
+
+    # Caractères collés: on coupe le segment le plus large en deux
+    if expected:
+        while 0 < len(segments) < expected:
+            widest = max(range(len(segments)), key=lambda i: segments[i][1] - segments[i][0])
+            a, b = segments[widest]
+            if b - a < 2 * MIN_GLYPH_WIDTH:
+                break
+            middle = (a + b) // 2
+            segments[widest:widest + 1] = [(a, middle), (middle, b)]
+
+    return [mask[:, a:b] for a, b in segments]
+
+
+def glyph_features(np, glyph):
+    """Glyphe recadré, redimensionné en 16x16 et normalisé (norme L2)"""
+    from PIL import Image
+
+    rows = np.flatnonzero(glyph.any(axis=1))
+    if rows.size:
+        glyph = glyph[rows[0]:rows[-1] + 1]
+    resized = Image.fromarray((glyph * 255).astype(np.uint8)).resize(
+        (GLYPH_SIZE, GLYPH_SIZE), Image.BILINEAR)
+    vector = np.asarray(resized, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalCaptchaRecognizer:
+    """Plus proches voisins sur glyphes issus du corpus"""
+
+    def __init__(self, features, labels, neighbours: int = 3):
+        self.features = features
+        self.labels = labels
+        self.neighbours = neighbours
+
+    @classmethod
+    def from_env(cls) -> Optional['LocalCaptchaRecognizer']:
+        """Charge LOCAL_RECOGNIZER_MODEL s'il existe (None sinon ou sans NumPy)"""
+        model_path = os.getenv('LOCAL_RECOGNIZER_MODEL', 'data/local_recognizer.npz')
+        if not model_path or not os.path.exists(model_path):
+            return None
+        try:
+            return cls.load(model_path)
+        except ImportError:
+            logger.warning("⚠️ NumPy non installé: reconnaissance locale désactivée")
+        except Exception as e:
+            logger.warning(f"⚠️ Modèle local illisible ({model_path}): {e}")
+        return None
+
+    @classmethod
+    def load(cls, path: str) -> 'LocalCaptchaRecognizer':
+        import numpy as np
+        with np.load(path) as data:
+            return cls(data['features'].astype(np.float32), data['labels'])
+
+    def save(self, path: str) -> None:
+        import numpy as np
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, features=self.features.astype(np.float16), labels=self.labels)
+
+    @classmethod
+    def train(cls, samples) -> 'LocalCaptchaRecognizer':
+        """
+        Entraîne sur des échantillons acceptés (CorpusSample)
+
+        Seuls les captchas dont la segmentation donne autant de glyphes que
+        de caractères dans l'étiquette sont utilisés.
+        """
+        import numpy as np
+
+        features, labels = [], []
+        for sample in samples:
+            mask = _binarize(np, _load_gray(np, sample.image))
+            glyphs = segment_characters(np, mask, expected=len(sample.label))
+            if len(glyphs) != len(sample.label):
+                continue
+            for glyph, char in zip(glyphs, sample.label):
+                features.append(glyph_features(np, glyph))
+                labels.append(char)
+
+        if not features:
+            raise ValueError("Aucun échantillon exploitable dans le corpus")
+        return cls(np.stack(features), np.array(labels))
+
+    def recognize(self, image) -> Tuple[str, float]:
+        """
+        Lit un captcha localement
+
+        Args:
+            image: Image PIL ou bytes
+
+        Returns:
+            (texte, confiance 0-1); confiance = pire marge entre le caractère
+            retenu et le meilleur concurrent, sur l'ensemble des positions
+        """
+        import numpy as np
+
+        glyphs = segment_characters(np, _binarize(np, _load_gray(np, image)))
+        if not glyphs:
+            return '', 0.0
+
+        queries = np.stack([glyph_features(np, glyph) for glyph in glyphs])
+        similarities = queries @ self.features.T
+        k = min(self.neighbours, similarities.shape[1])
+        nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+        text, confidences = [], []
+        for row, indices in enumerate(nearest):
+            votes = {}
+            for index in indices:
+                char = str(self.labels[index])
+                votes[char] = votes.get(char, 0.0) + max(0.0, float(similarities[row, index]))
+            ranked = sorted(votes.values(), reverse=True)
+            best_char = max(votes, key=votes.get)
+            total = sum(ranked) or 1.0
+            margin = (ranked[0] - (ranked[1] if len(ranked) > 1 else 0.0)) / total
+            # Une similarité faible au plus proche voisin reste peu sûre
+            confidences.append(margin * float(similarities[row, indices].max()))
+            text.append(best_char)
+
+        return ''.join(text), round(min(confidences), 3)
+
+
+def _evaluate(recognizer: LocalCaptchaRecognizer, samples, threshold: float) -> Dict[str, float]:
+    """
+    Mesure sur un jeu de test au seuil de confiance
+
+    Returns:
+        {'precision': part des réponses retenues qui sont justes (0 si aucune),
+         'answered_rate': part des captchas où le seuil est atteint, ...}
+    """
+    total = answered = correct = 0
+    started = time.perf_counter()
+    for sample in samples:
+        total += 1
+        text, confidence = recognizer.recognize(sample.image)
+        if confidence >= threshold:
+            answered += 1
+            correct += int(text == sample.label)
+    elapsed = time.perf_counter() - started
+    precision = correct / answered if answered else 0.0
+    answered_rate = answered / total if total else 0.0
+    print(f"🧪 {total} échantillon(s), {answered} au-dessus du seuil {threshold}, "
+          f"{correct} correct(s), {elapsed * 1000 / max(1, total):.2f} ms/captcha")
+    print(f"   précision {precision:.1%}, réponses {answered_rate:.1%}")
+    return {'total': total, 'answered': answered, 'correct': correct,
+            'precision': precision, 'answered_rate': answered_rate}
+
+
+def _train_or_exit(samples) -> LocalCaptchaRecognizer:
+    try:
+        return LocalCaptchaRecognizer.train(samples)
+    except ValueError as e:
+        print(f"❌ {e}, modèle non écrit")
+        sys.exit(1)
+
+
+def main():
+    from captcha_corpus import CaptchaCorpus
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'train'
+    corpus_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv('CAPTCHA_CORPUS_PATH', 'data/captcha_corpus')
+    model_path = sys.argv[3] if len(sys.argv) > 3 else os.getenv('LOCAL_RECOGNIZER_MODEL', 'data/local_recognizer.npz')
+    threshold = float(os.getenv('LOCAL_RECOGNIZER_MIN_CONFIDENCE', '0.6'))
+    min_precision = float(os.getenv('LOCAL_RECOGNIZER_MIN_PRECISION', '0.95'))
+
+    corpus = CaptchaCorpus(corpus_path)
+    samples = list(corpus.samples())
+    if not samples:
+        print(f"❌ Aucun captcha accepté dans le corpus {corpus_path}")
+        sys.exit(1)
+
+    if command not in ('train', 'evaluate'):
+        print(f"❌ Commande inconnue: {command} (train | evaluate)")
+        sys.exit(1)
+
+    # Évaluation honnête: entraînement sur 80%, test sur les 20% restants
+    split = int(len(samples) * 0.8)
+    if split < 1 or split >= len(samples):
+        # Mesurer sur les échantillons d'entraînement surestimerait la précision:
+        # sans jeu de test, le modèle n'est ni évalué ni activé avant Gemini
+        print(f"❌ {len(samples)} échantillon(s): pas assez pour un jeu de test séparé, "
+              f"seuil {threshold} non validé, modèle non écrit")
+        sys.exit(1)
+    metrics = _evaluate(_train_or_exit(samples[:split]), samples[split:], threshold)
+    validated = metrics['answered'] > 0 and metrics['precision'] >= min_precision
+    if not validated:
+        print(f"❌ Précision {metrics['precision']:.1%} sur {metrics['answered']} réponse(s) retenue(s), "
+              f"minimum {min_precision:.0%} (LOCAL_RECOGNIZER_MIN_PRECISION): modèle non validé")
+        sys.exit(1)
+
+    if command == 'train':
+        # Modèle final sur tout le corpus, après validation sur le jeu de test
+        recognizer = _train_or_exit(samples)
+        recognizer.save(model_path)
+        print(f"✅ Modèle local: {len(recognizer.labels)} glyphe(s) → {model_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Sources de médias captcha acceptées par les solvers
+
+Chemin de fichier, bytes/bytearray/memoryview ou objet fichier (read()):
+les solvers travaillent en mémoire et un chemin n'est qu'un cas particulier.
+"""
+import io
+import os
+from typing import BinaryIO, Optional, Union
+
+MediaSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+
+def read_media(source: MediaSource) -> bytes:
+    """Contenu d'une source (lecture unique pour un chemin ou un flux)"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source.read()
+
+
+def read_optional_media(source: Optional[MediaSource]) -> Optional[bytes]:
+    """Comme read_media, mais None si la source est absente ou le fichier inexistant"""
+    if source is None:
+        return None
+    if isinstance(source, (str, os.PathLike)) and not os.path.exists(source):
+        return None
+    return read_media(source) or None
+
+
+def as_file_input(source: MediaSource) -> Union[str, os.PathLike, BinaryIO]:
+    """Entrée pour Image.open: les bytes sont enveloppés, chemin et flux passent tels quels"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def describe_media(source: Optional[MediaSource]) -> str:
+    """Libellé court pour les logs (chemin ou taille en mémoire)"""
+    if source is None:
+        return '-'
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return f"<{len(source)} octets en mémoire>"
+    return '<flux>'
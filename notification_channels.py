@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Canaux de notification (plugins)
+
+Chaque canal livre une alerte et lève DeliveryError en cas d'échec
+(retryable ou définitif). Canaux disponibles:
+- slack: webhook au format Slack (NOTIFICATION_WEBHOOK, SLACK_WEBHOOK_URL)
+- webhook: webhook JSON générique (NOTIFICATION_WEBHOOK_FORMAT=json)
+- email: SMTP vers NOTIFICATION_EMAIL (NOTIFICATION_SMTP_*)
+- command: commande locale recevant l'alerte en JSON sur stdin (NOTIFICATION_COMMAND)
+"""
+import json
+import logging
+import os
+import shlex
+import smtplib
+import subprocess
+from abc import ABC, abstractmethod
+from datetime import datetime
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional
+
+from slot_extractor import summarize_slots
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """Échec de livraison d'une alerte (retryable: nouvelle tentative utile)"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class NotificationChannel(ABC):
+    """Canal de notification: send() livre l'alerte ou lève DeliveryError"""
+
+    kind = 'channel'
+
+    def __init__(self, name: Optional[str] = None):
+        self.name = name or self.kind
+
+    @abstractmethod
+    def send(self, alert: Dict[str, Any]) -> None:
+        """Livre l'alerte (DeliveryError si échec)"""
+
+
+class _HTTPChannel(NotificationChannel):
+    """Base des webhooks: session HTTP partagée et classement des erreurs"""
+
+    def __init__(self, url: str, session_factory: Callable, timeout: float = 10.0,
+                 name: Optional[str] = None):
+        super().__init__(name)
+        self.url = url
+        self.session_factory = session_factory
+        self.timeout = timeout
+
+    @abstractmethod
+    def payload(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        """Corps JSON envoyé au webhook"""
+
+    def send(self, alert: Dict[str, Any]) -> None:
+        try:
+            response = self.session_factory().post(
+                self.url,
+                json=self.payload(alert),
+                headers={'Content-Type': 'application/json'},
+                timeout=self.timeout
+            )
+        except Exception as e:
+            raise DeliveryError(f"{self.name} injoignable: {e}")
+
+        if 200 <= response.status_code < 300:
+            return
+        retryable = response.status_code == 429 or response.status_code >= 500
+        raise DeliveryError(f"{self.name} HTTP {response.status_code}", retryable=retryable)
+
+
+class SlackWebhookChannel(_HTTPChannel):
+    """Webhook entrant Slack (pièces jointes avec liens cliquables)"""
+
+    kind = 'slack'
+
+    def payload(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        # Format Slack optimisé avec liens cliquables; un seul bloc par scan
+        results = alert['results']
+        gone = alert.get('gone', [])
+        lines = [
+            f"🎯 *<{result['url']}|{result['page']}>* — {result['message']}"
+            + (" _(toujours disponible)_" if result.get('transition') == 'reminder' else "")
+            + (f"\n📅 {summarize_slots(result['slots'])}" if result.get('slots') else "")
+            for result in results
+        ]
+        lines += [f"⌛ *{result['page']}* — plus de créneau" for result in gone]
+        timestamps = [result['timestamp'] for result in results + gone if result.get('timestamp')]
+        first = min(timestamps) if timestamps else datetime.now().isoformat()
+        return {
+            "text": "🚨 *RENDEZ-VOUS DISPONIBLE DÉTECTÉ!*" if results else "⌛ *Créneaux disparus*",
+            "attachments": [
+                {
+                    "color": "good" if results else "warning",
+                    "text": "\n".join(lines),
+                    "fields": [
+                        {
+                            "title": "📅 Détection",
+                            "value": first[:19].replace('T', ' '),
+                            "short": True
+                        },
+                        {
+                            "title": "⚡ Action",
+                            "value": " · ".join(f"<{result['url']}|Réserver {result['page']}>"
+                                                for result in results) or "—",
+                            "short": True
+                        }
+                    ],
+                    "footer": "RDV Scanner • Agissez vite!",
+                    "footer_icon": "https://🚀",
+                    "ts": int(datetime.fromisoformat(first).timestamp())
+                }
+            ]
+        }
+
+
+class JSONWebhookChannel(_HTTPChannel):
+    """Webhook générique: l'alerte brute en JSON"""
+
+    kind = 'webhook'
+
+    def payload(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'event': 'slots_available' if alert['results'] else 'slots_gone',
+            'id': alert['id'],
+            'detected_at': datetime.fromtimestamp(alert['detected_at']).isoformat(),
+            'message': alert['message'],
+            'results': alert['results'],
+            'gone': alert.get('gone', []),
+        }
+
+
+class EmailChannel(NotificationChannel):
+    """Email via SMTP (STARTTLS optionnel, authentification optionnelle)"""
+
+    kind = 'email'
+
+    def __init__(self, recipients: List[str], host: str, port: int = 587,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 sender: Optional[str] = None, starttls: bool = True,
+                 timeout: float = 10.0, name: Optional[str] = None):
+        super().__init__(name)
+        self.recipients = recipients
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username or 'rdv-scanner@localhost'
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, alert: Dict[str, Any]) -> None:
+        message = EmailMessage()
+        if alert['results']:
+            pages = ', '.join(result['page'] for result in alert['results'])
+            message['Subject'] = f"🎉 Rendez-vous disponible: {pages}"
+        else:
+            pages = ', '.join(result['page'] for result in alert.get('gone', []))
+            message['Subject'] = f"⌛ Créneaux disparus: {pages}"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(alert['message'])
+
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username and self.password:
+                    smtp.login(self.username, self.password)
+                smtp.send_message(message)
+        except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused) as e:
+            raise DeliveryError(f"email refusé: {e}", retryable=False)
+        except (OSError, smtplib.SMTPException) as e:
+            raise DeliveryError(f"email non envoyé: {e}")
+
+
+class CommandChannel(NotificationChannel):
+    """Commande locale; l'alerte est passée en JSON sur l'entrée standard"""
+
+    kind = 'command'
+
+    def __init__(self, command: str, timeout: float = 10.0, name: Optional[str] = None):
+        super().__init__(name)
+        self.args = shlex.split(command)
+        self.timeout = timeout
+
+    def send(self, alert: Dict[str, Any]) -> None:
+        try:
+            completed = subprocess.run(
+                self.args,
+                input=json.dumps(alert, ensure_ascii=False).encode('utf-8'),
+                capture_output=True,
+                timeout=self.timeout
+            )
+        except FileNotFoundError as e:
+            raise DeliveryError(f"commande introuvable: {e}", retryable=False)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise DeliveryError(f"commande en échec: {e}")
+
+        if completed.returncode != 0:
+            stderr = completed.stderr.decode('utf-8', 'replace').strip()[:200]
+            raise DeliveryError(f"commande code {completed.returncode}: {stderr}")
+
+
+def channels_from_env(session_factory: Callable, timeout: float = 10.0) -> List[NotificationChannel]:
+    """Canaux configurés dans .env (aucun si rien n'est configuré)"""
+    channels: List[NotificationChannel] = []
+
+    webhook_url = os.getenv('NOTIFICATION_WEBHOOK')
+    if webhook_url and webhook_url != 'your_webhook_url_here':
+        if os.getenv('NOTIFICATION_WEBHOOK_FORMAT', 'slack').lower() == 'json':
+            channels.append(JSONWebhookChannel(webhook_url, session_factory, timeout))
+        else:
+            channels.append(SlackWebhookChannel(webhook_url, session_factory, timeout))
+
+    slack_url = os.getenv('SLACK_WEBHOOK_URL')
+    if slack_url and slack_url != webhook_url:
+        channels.append(SlackWebhookChannel(slack_url, session_factory, timeout, name='slack_app'))
+
+    email = os.getenv('NOTIFICATION_EMAIL')
+    smtp_host = os.getenv('NOTIFICATION_SMTP_HOST')
+    if email and smtp_host:
+        channels.append(EmailChannel(
+            recipients=[address.strip() for address in email.split(',') if address.strip()],
+            host=smtp_host,
+            port=int(os.getenv('NOTIFICATION_SMTP_PORT', '587')),
+            username=os.getenv('NOTIFICATION_SMTP_USER'),
+            password=os.getenv('NOTIFICATION_SMTP_PASSWORD'),
+            sender=os.getenv('NOTIFICATION_SMTP_FROM'),
+            starttls=os.getenv('NOTIFICATION_SMTP_STARTTLS', 'true').lower() == 'true',
+            timeout=timeout
+        ))
+    elif email and email != 'your_email@example.com':
+        logger.warning("⚠️ NOTIFICATION_EMAIL défini sans NOTIFICATION_SMTP_HOST: email désactivé")
+
+    command = os.getenv('NOTIFICATION_COMMAND')
+    if command:
+        channels.append(CommandChannel(command, timeout))
+
+    return channels
@@ -1,121 +1,452 @@
 """
 Module de notification
-Envoie des notifications par email, webhook, etc.
+Envoie des notifications par email, webhook, etc. (voir notification_channels)
+
+Les alertes sont déposées dans une boîte d'envoi durable (un fichier JSON par
+alerte) puis livrées par un thread d'arrière-plan: le scan n'attend jamais un
+webhook lent, et une alerte non livrée survit à un redémarrage.
 """
 import os
 import logging
+import heapq
+import itertools
 import json
-import requests
-from typing import List, Dict, Any
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+import json_state
+from notification_channels import DeliveryError, NotificationChannel, channels_from_env
+from slot_extractor import summarize_slots
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_OUTBOX_DIR = 'data/outbox'
+
 
 class Notifier:
     """Gestionnaire de notifications"""
-    
-    def __init__(self):
-        self.email = os.getenv('NOTIFICATION_EMAIL')
-        self.webhook_url = os.getenv('NOTIFICATION_WEBHOOK')
-    
-    def send_notification(self, results: List[Dict[str, Any]]):
+
+    def __init__(
+        self,
+        outbox_dir: Optional[str] = None,
+        queue_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: float = 300.0,
+        channels: Optional[List[NotificationChannel]] = None
+    ):
+        self.timeout = float(os.getenv('NOTIFICATION_TIMEOUT', '10'))
+        self.outbox_dir = outbox_dir if outbox_dir is not None else os.getenv(
+            'NOTIFICATION_OUTBOX', DEFAULT_OUTBOX_DIR)
+        self.max_attempts = max_attempts or int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '6'))
+        self.backoff_base = backoff_base if backoff_base is not None else float(
+            os.getenv('NOTIFICATION_BACKOFF', '2'))
+        self.backoff_max = backoff_max
+        self._session = None
+        self.channels = channels if channels is not None else channels_from_env(
+            self._get_session, self.timeout)
+
+        # File bornée: le scan ne bloque jamais, le surplus reste dans la boîte d'envoi
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(
+            maxsize=queue_size or int(os.getenv('NOTIFICATION_QUEUE_SIZE', '100')))
+        # Un thread par canal: le canal le plus lent ne retarde pas les autres
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.channels)), thread_name_prefix='notify-channel')
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Alertes en attente de nouvel essai, triées par échéance (hors file:
+        # une nouvelle alerte n'attend jamais derrière un backoff)
+        self._delayed: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._delayed_seq = itertools.count()
+        self._in_flight = 0
+        self._stop = threading.Event()
+        self.stats: Dict[str, Any] = {
+            'queued': 0,
+            'delivered': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped_from_queue': 0,
+            'last_latency': None,
+            'max_latency': None,
+            'total_latency': 0.0,
+        }
+        self.channel_stats: Dict[str, Dict[str, Any]] = {
+            channel.name: {'sent': 0, 'failed': 0, 'last_latency': None,
+                           'total_latency': 0.0, 'last_error': None}
+            for channel in self.channels
+        }
+
+        pending = self._load_outbox()
+        self._worker = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self._worker.start()
+        for alert in pending:
+            self._enqueue(alert)
+        if pending:
+            logger.info(f"📮 {len(pending)} alerte(s) non livrée(s) reprise(s) depuis {self.outbox_dir}")
+
+    def send_notification(self, results: List[Dict[str, Any]], gone: Optional[List[Dict[str, Any]]] = None):
         """
-        Envoie une notification avec les résultats
-        
+        Envoie une notification avec les résultats (sans bloquer)
+
+        L'alerte est persistée dans la boîte d'envoi puis livrée en
+        arrière-plan, avec nouvelles tentatives et backoff exponentiel.
+        Apparitions et disparitions d'un même scan forment une seule alerte.
+
         Args:
             results: Liste des résultats de disponibilité
+            gone: Cibles dont les créneaux notifiés ont disparu
         """
         available_results = [r for r in results if r.get('available')]
-        
-        if not available_results:
+        gone = gone or []
+
+        if not available_results and not gone:
             return
-        
-        message = self._format_message(available_results)
-        
-        # Envoyer par webhook si configuré
-        if self.webhook_url:
-            self._send_webhook(message, available_results)
-        
+
+        message = self._format_message(available_results, gone)
+        alert = {
+            'id': uuid.uuid4().hex,
+            'detected_at': self._detected_at(available_results + gone),
+            'queued_at': time.time(),
+            'attempts': 0,
+            'next_attempt_at': 0.0,
+            'message': message,
+            'results': available_results,
+            'gone': gone,
+            'pending_channels': [channel.name for channel in self.channels],
+            'delivered_channels': [],
+        }
+        self._write_outbox(alert)
+        self._enqueue(alert)
+
         # Log de la notification
         logger.info("=" * 60)
-        logger.info("NOTIFICATION: RENDEZ-VOUS DISPONIBLE(S)")
+        logger.info("NOTIFICATION: RENDEZ-VOUS DISPONIBLE(S)" if available_results
+                    else "NOTIFICATION: CRÉNEAUX DISPARUS")
         logger.info("=" * 60)
         logger.info(message)
         logger.info("=" * 60)
-    
-    def _format_message(self, results: List[Dict[str, Any]]) -> str:
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """
+        Attend la livraison des alertes en file (ex: avant la fin d'un scan unique)
+
+        Returns:
+            True si la file est vide; sinon les alertes restent dans la boîte d'envoi
+        """
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._queue.unfinished_tasks or self._in_flight or self._delayed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.5))
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Arrête le dispatcher (les alertes non livrées restent dans la boîte d'envoi)"""
+        self.flush(timeout)
+        self._stop.set()
+        self._worker.join(timeout=1.0)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._session is not None:
+            self._session.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Statistiques de livraison (latence détection → livraison en secondes)
+        et, par canal, envois réussis/échoués et latence d'envoi
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            delivered = stats.pop('total_latency')
+            stats['avg_latency'] = round(delivered / stats['delivered'], 3) if stats['delivered'] else None
+            stats['pending'] = self._queue.unfinished_tasks + len(self._delayed)
+            stats['channels'] = {}
+            for name, channel_stats in self.channel_stats.items():
+                channel_stats = dict(channel_stats)
+                total = channel_stats.pop('total_latency')
+                channel_stats['avg_latency'] = (
+                    round(total / channel_stats['sent'], 3) if channel_stats['sent'] else None)
+                stats['channels'][name] = channel_stats
+        stats['outbox'] = len(self._outbox_files())
+        return stats
+
+    def _enqueue(self, alert: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(alert)
+            with self._lock:
+                self.stats['queued'] += 1
+        except queue.Full:
+            # Toujours dans la boîte d'envoi: reprise au prochain démarrage
+            with self._lock:
+                self.stats['dropped_from_queue'] += 1
+            logger.warning(f"⚠️ File de notifications pleine, alerte {alert['id']} laissée dans la boîte d'envoi")
+
+    def _run(self) -> None:
+        """Boucle du dispatcher: livre les nouvelles alertes et les essais arrivés à échéance"""
+        while not self._stop.is_set():
+            alert, from_queue = self._pop_due(), False
+            if alert is None:
+                try:
+                    # Réveil au plus tard à l'échéance du prochain essai
+                    alert, from_queue = self._queue.get(timeout=self._next_wait()), True
+                except queue.Empty:
+                    continue
+                with self._lock:
+                    self._in_flight += 1
+
+            try:
+                self._attempt(alert)
+            finally:
+                with self._idle:
+                    self._in_flight -= 1
+                    if from_queue:
+                        self._queue.task_done()
+                    self._idle.notify_all()
+
+    def _pop_due(self) -> Optional[Dict[str, Any]]:
+        """Alerte dont le nouvel essai est arrivé à échéance (comptée en vol)"""
+        with self._lock:
+            if not self._delayed or self._delayed[0][0] > time.time():
+                return None
+            self._in_flight += 1
+            return heapq.heappop(self._delayed)[2]
+
+    def _next_wait(self) -> float:
+        with self._lock:
+            if not self._delayed:
+                return 0.5
+            return min(0.5, max(0.0, self._delayed[0][0] - time.time()))
+
+    def _schedule_retry(self, alert: Dict[str, Any]) -> None:
+        with self._lock:
+            heapq.heappush(self._delayed, (alert['next_attempt_at'], next(self._delayed_seq), alert))
+
+    def _attempt(self, alert: Dict[str, Any]) -> None:
+        alert['attempts'] += 1
+        try:
+            self._deliver(alert)
+        except DeliveryError as e:
+            if e.retryable and alert['attempts'] < self.max_attempts:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (alert['attempts'] - 1)))
+                alert['next_attempt_at'] = time.time() + delay
+                self._write_outbox(alert)
+                with self._lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"🔁 Notification {alert['id']} en échec ({e}), nouvel essai dans {delay:.1f}s")
+                self._schedule_retry(alert)
+                return
+            with self._lock:
+                self.stats['failed'] += 1
+            logger.error(f"❌ Notification {alert['id']} abandonnée après {alert['attempts']} essai(s): {e}")
+            self._move_to_failed(alert)
+            return
+
+        latency = time.time() - alert['detected_at']
+        with self._lock:
+            self.stats['delivered'] += 1
+            self.stats['last_latency'] = round(latency, 3)
+            self.stats['max_latency'] = round(max(latency, self.stats['max_latency'] or 0.0), 3)
+            self.stats['total_latency'] += latency
+        self._remove_outbox(alert)
+        logger.info(f"📨 Notification livrée en {latency:.2f}s après détection ({alert['attempts']} essai(s))")
+
+    def _deliver(self, alert: Dict[str, Any]) -> None:
+        """
+        Livre une alerte sur tous ses canaux en attente, en parallèle
+
+        Seuls les canaux en échec retryable sont retentés à l'essai suivant.
+
+        Raises:
+            DeliveryError: retryable si un canal reste à retenter, définitif
+                si aucun canal n'a pu livrer l'alerte
+        """
+        by_name = {channel.name: channel for channel in self.channels}
+        pending_names = alert.get('pending_channels')
+        if pending_names is None:
+            # Alerte persistée avant l'introduction des canaux
+            pending_names = list(by_name)
+        pending = [by_name[name] for name in pending_names if name in by_name]
+        if not pending:
+            return
+
+        futures = [(channel, self._executor.submit(self._send_channel, channel, alert))
+                   for channel in pending]
+        retry, errors = [], []
+        delivered = alert.setdefault('delivered_channels', [])
+        for channel, future in futures:
+            error = future.result()
+            if error is None:
+                delivered.append(channel.name)
+                continue
+            errors.append(f"{channel.name}: {error}")
+            if error.retryable:
+                retry.append(channel.name)
+            else:
+                logger.error(f"❌ Canal {channel.name} abandonné pour l'alerte {alert['id']}: {error}")
+        alert['pending_channels'] = retry
+
+        if retry:
+            raise DeliveryError('; '.join(errors))
+        if errors and not delivered:
+            raise DeliveryError('; '.join(errors), retryable=False)
+
+    def _send_channel(self, channel: NotificationChannel, alert: Dict[str, Any]) -> Optional[DeliveryError]:
+        """Envoi sur un canal (thread du pool); retourne l'erreur éventuelle"""
+        started = time.monotonic()
+        try:
+            channel.send(alert)
+            error = None
+        except DeliveryError as e:
+            error = e
+        except Exception as e:
+            error = DeliveryError(f"erreur inattendue: {e}", retryable=False)
+        latency = time.monotonic() - started
+
+        with self._lock:
+            stats = self.channel_stats.setdefault(channel.name, {
+                'sent': 0, 'failed': 0, 'last_latency': None, 'total_latency': 0.0, 'last_error': None})
+            stats['last_latency'] = round(latency, 3)
+            if error is None:
+                stats['sent'] += 1
+                stats['total_latency'] += latency
+            else:
+                stats['failed'] += 1
+                stats['last_error'] = str(error)
+        if error is None:
+            logger.info(f"✅ Notification envoyée via {channel.name} en {latency:.2f}s")
+        return error
+
+    @staticmethod
+    def _detected_at(results: List[Dict[str, Any]]) -> float:
+        """Instant de détection le plus ancien des résultats (horodatage ISO)"""
+        instants = []
+        for result in results:
+            try:
+                instants.append(datetime.fromisoformat(result['timestamp']).timestamp())
+            except (KeyError, TypeError, ValueError):
+                continue
+        return min(instants) if instants else time.time()
+
+    def _get_session(self):
+        """Session HTTP réutilisée (connexions keep-alive poolées)"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    # Boîte d'envoi durable: un fichier par alerte, écrit atomiquement
+
+    def _outbox_path(self, alert_id: str) -> str:
+        return os.path.join(self.outbox_dir, f"{alert_id}.json")
+
+    def _outbox_files(self) -> List[str]:
+        if not self.outbox_dir or not os.path.isdir(self.outbox_dir):
+            return []
+        return sorted(name for name in os.listdir(self.outbox_dir) if name.endswith('.json'))
+
+    def _write_outbox(self, alert: Dict[str, Any]) -> None:
+        if not self.outbox_dir:
+            return
+        json_state.save_atomic(self._outbox_path(alert['id']), alert, "l'alerte dans la boîte d'envoi")
+
+    def _remove_outbox(self, alert: Dict[str, Any]) -> None:
+        if not self.outbox_dir:
+            return
+        try:
+            os.remove(self._outbox_path(alert['id']))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible de retirer l'alerte de la boîte d'envoi: {e}")
+
+    def _move_to_failed(self, alert: Dict[str, Any]) -> None:
+        """Conserve les alertes abandonnées pour inspection (boîte d'envoi/failed)"""
+        if not self.outbox_dir:
+            return
+        failed_dir = os.path.join(self.outbox_dir, 'failed')
+        try:
+            os.makedirs(failed_dir, exist_ok=True)
+            os.replace(self._outbox_path(alert['id']), os.path.join(failed_dir, f"{alert['id']}.json"))
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'archiver l'alerte abandonnée: {e}")
+
+    def _load_outbox(self) -> List[Dict[str, Any]]:
+        """Alertes laissées par une exécution précédente (plus anciennes d'abord)"""
+        pending = []
+        for name in self._outbox_files():
+            try:
+                with open(os.path.join(self.outbox_dir, name), 'r', encoding='utf-8') as f:
+                    alert = json.load(f)
+                alert['next_attempt_at'] = 0.0
+                pending.append(alert)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Alerte illisible dans la boîte d'envoi ({name}): {e}")
+        pending.sort(key=lambda alert: alert.get('queued_at', 0.0))
+        return pending
+
+    def _format_message(self, results: List[Dict[str, Any]],
+                        gone: Optional[List[Dict[str, Any]]] = None) -> str:
         """Formate le message de notification"""
-        lines = ["🎉 RENDEZ-VOUS DISPONIBLE(S) DÉTECTÉ(S)!", ""]
-        
+        lines = []
+        if results:
+            lines += ["🎉 RENDEZ-VOUS DISPONIBLE(S) DÉTECTÉ(S)!", ""]
+
         for result in results:
-            lines.append(f"📍 {result['page']}")
+            reminder = " (toujours disponible)" if result.get('transition') == 'reminder' else ""
+            lines.append(f"📍 {result['page']}{reminder}")
             lines.append(f"   URL: {result['url']}")
             lines.append(f"   Message: {result['message']}")
             lines.append(f"   Heure: {result['timestamp']}")
-            
+            if result.get('slots'):
+                lines.append(f"   Créneaux: {summarize_slots(result['slots'])}")
+
             if 'details' in result:
                 details = result['details']
                 if details.get('button_count'):
                     lines.append(f"   Boutons trouvés: {details['button_count']}")
                 if details.get('date_selectors'):
                     lines.append(f"   Sélecteurs de date: {details['date_selectors']}")
-            
+
+            lines.append("")
+
+        if gone:
+            lines.append("⌛ CRÉNEAUX DISPARUS:")
+            for result in gone:
+                lines.append(f"📍 {result['page']} - plus de créneau ({result['timestamp']})")
             lines.append("")
-        
+            if not results:
+                return "\n".join(lines).rstrip()
+
         lines.append("⏰ Agissez rapidement!")
-        
+
         return "\n".join(lines)
-    
-    def _send_webhook(self, message: str, results: List[Dict[str, Any]]):
-        """
-        Envoie une notification via webhook
-        
-        Args:
-            message: Message formaté
-            results: Résultats bruts
-        """
-        try:
-            # Format Slack optimisé avec liens cliquables
-            payload = {
-                "text": "🚨 *RENDEZ-VOUS DISPONIBLE DÉTECTÉ!*",
-                "attachments": [
-                    {
-                        "color": "good",
-                        "title": f"🎯 {result['page']}",
-                        "title_link": result['url'],
-                        "text": f"{result['message']}\n\n🔗 *Lien direct:* <{result['url']}|Réserver maintenant>",
-                        "fields": [
-                            {
-                                "title": "📅 Détection",
-                                "value": result['timestamp'][:19].replace('T', ' '),
-                                "short": True
-                            },
-                            {
-                                "title": "⚡ Action",
-                                "value": f"<{result['url']}|Ouvrir la page>",
-                                "short": True
-                            }
-                        ],
-                        "footer": "RDV Scanner • Agissez vite!",
-                        "footer_icon": "https://🚀",
-                        "ts": int(datetime.fromisoformat(result['timestamp']).timestamp())
-                    }
-                    for result in results
-                ]
-            }
-            
-            response = requests.post(
-                self.webhook_url,
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                logger.info("Notification webhook envoyée avec succès")
-            else:
-                logger.warning(f"Échec d'envoi du webhook: {response.status_code}")
-                
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi du webhook: {e}", exc_info=True)
+
+
+_shared_notifier: Optional[Notifier] = None
+_shared_lock = threading.Lock()
+
+
+def get_notifier() -> Notifier:
+    """Notifier partagé (dispatcher unique par processus)"""
+    global _shared_notifier
+    with _shared_lock:
+        if _shared_notifier is None:
+            _shared_notifier = Notifier()
+        return _shared_notifier
+
+
+def peek_notifier() -> Optional[Notifier]:
+    """Notifier partagé s'il existe déjà, sans le créer (ni démarrer son dispatcher)"""
+    return _shared_notifier
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Empreintes des pages de résultat pour détecter les changements
+
+Deux empreintes par page, calculées sur la zone utile (PAGE_FINGERPRINT_SELECTOR):
+- contenu: texte normalisé (espaces, casse, jetons CSRF et scripts exclus);
+  inchangée ⇒ la liste de créneaux est la même qu'au scan précédent
+- structure: forme de l'arbre HTML (balises et classes, répétitions
+  fusionnées); elle ne bouge pas quand le nombre de créneaux varie, mais
+  change si le site refond la page, ce qui peut casser les sélecteurs
+
+La page « aucun créneau » et la page avec créneaux n'ont pas la même forme:
+la structure n'est comparée qu'à celle vue dans le même état de
+classification (mêmes marqueurs), le passage 0 ↔ N créneaux n'est pas une casse.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import json_state
+
+logger = logging.getLogger(__name__)
+
+# Textes dont dépend la classification de la page /creneau/
+EXPECTED_MARKERS = ('aucun créneau disponible', 'choisissez votre créneau', 'sélectionnez')
+
+_WHITESPACE = re.compile(r'\s+')
+_DIGITS = re.compile(r'\d+')
+
+
+def _region(html: str, selector: Optional[str]):
+    """Document et zone utile (sélecteur CSS, sinon <body>), scripts retirés"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    # Champs cachés: jetons CSRF et identifiants de session changent à chaque visite
+    for tag in soup.find_all('input', attrs={'type': 'hidden'}):
+        tag.decompose()
+    region = soup.select_one(selector) if selector else None
+    return soup, region or soup.body or soup
+
+
+def _shape(element, depth: int = 0, max_depth: int = 12) -> str:
+    """Forme d'un sous-arbre: balise, classes sans chiffres, formes des enfants dédupliquées"""
+    classes = sorted({_DIGITS.sub('', name) for name in element.get('class', [])})
+    signature = element.name + ('.' + '.'.join(classes) if classes else '')
+    if depth >= max_depth:
+        return signature
+    children: List[str] = []
+    for child in element.find_all(True, recursive=False):
+        shape = _shape(child, depth + 1, max_depth)
+        if shape not in children:
+            children.append(shape)
+    return f"{signature}({','.join(children)})" if children else signature
+
+
+def fingerprint(html: str, selector: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Empreintes de contenu et de structure d'une page
+
+    Returns:
+        {'content': sha256, 'structure': sha256, 'markers': marqueurs attendus trouvés}
+    """
+    soup, region = _region(html, selector)
+    text = _WHITESPACE.sub(' ', region.get_text(' ')).strip().lower()
+    # Les marqueurs sont cherchés dans toute la page, comme pour la classification
+    page_text = _WHITESPACE.sub(' ', soup.get_text(' ')).lower()
+    return {
+        'content': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+        'structure': hashlib.sha256(_shape(region).encode('utf-8')).hexdigest(),
+        'markers': [marker for marker in EXPECTED_MARKERS if marker in page_text],
+    }
+
+
+class FingerprintStore:
+    """Dernières empreintes par cible (persistées) et comparaison au scan courant"""
+
+    def __init__(self, persist_path: Optional[str] = None, selector: Optional[str] = 'main'):
+        self.persist_path = persist_path
+        self.selector = selector
+        self._lock = threading.Lock()
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'FingerprintStore':
+        """Construit le magasin depuis la configuration .env"""
+        return cls(
+            persist_path=os.getenv('PAGE_FINGERPRINT_PATH', 'data/page_fingerprints.json') or None,
+            selector=os.getenv('PAGE_FINGERPRINT_SELECTOR', 'main') or None
+        )
+
+    def compare(self, target: str, html: str) -> Dict[str, Any]:
+        """
+        Compare la page aux empreintes précédentes de la cible et les remplace
+
+        Returns:
+            {'changed': contenu différent (ou première visite),
+             'structure_changed': structure différente d'une structure connue,
+             'breakage': motif de sélecteur possiblement cassé, sinon None, ...}
+        """
+        current = fingerprint(html, self.selector)
+        state = '|'.join(current['markers']) or 'aucun'
+        now = time.time()
+        with self._lock:
+            previous = self._targets.get(target)
+            changed = previous is None or previous['content'] != current['content']
+            # Structure de référence: dernière page vue dans le même état de classification
+            structures = dict(previous.get('structures', {})) if previous else {}
+            known_structure = structures.get(state)
+            structure_changed = known_structure is not None and known_structure != current['structure']
+            structures[state] = current['structure']
+            breakage = None
+            if not current['markers']:
+                breakage = "aucun texte de classification attendu sur la page"
+            elif structure_changed:
+                breakage = "structure de la page modifiée"
+
+            entry = dict(current, structures=structures, seen_at=now,
+                         changed_at=now if changed else previous.get('changed_at', now))
+            if structure_changed:
+                entry['structure_changed_at'] = now
+            elif previous is not None and 'structure_changed_at' in previous:
+                entry['structure_changed_at'] = previous['structure_changed_at']
+            self._targets[target] = entry
+            self._save()
+
+        if breakage:
+            logger.warning(f"🧩 {target}: sélecteurs possiblement cassés ({breakage})")
+        return {
+            'changed': changed,
+            'structure_changed': structure_changed,
+            'breakage': breakage,
+            'content': current['content'][:12],
+            'structure': current['structure'][:12],
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {target: dict(entry) for target, entry in self._targets.items()}
+
+    def _load(self) -> None:
+        state = json_state.load(self.persist_path, "Empreintes de pages")
+        if isinstance(state, dict):
+            self._targets = state.get('targets', {})
+
+    def _save(self) -> None:
+        json_state.save_atomic(self.persist_path, {'updated_at': time.time(), 'targets': self._targets},
+                               "les empreintes de pages")
+
+
+def test_slot_transitions():
+    """Le passage « aucun créneau » ↔ créneaux n'est pas signalé comme une casse"""
+    empty = ('<main><h1>Rendez-vous</h1><p class="alert">Aucun créneau disponible</p>'
+             '<a href="/">Retour</a></main>')
+    populated = ('<main><h1>Rendez-vous</h1><p>Choisissez votre créneau</p>'
+                 '<div class="slots"><h3>21/10/2026</h3><button>09:30</button><button>10:00</button>'
+                 '<h3>22/10/2026</h3><button>14:00</button></div><a href="/">Retour</a></main>')
+    more = populated.replace('<button>14:00</button>', '<button>14:00</button><button>15:30</button>')
+    redesigned = populated.replace('<div class="slots">', '<table class="grille"><tr><td>').replace(
+        '</div>', '</td></tr></table>')
+
+    store = FingerprintStore(persist_path=None)
+    store.compare('test', empty)
+    for html, expected_changed, expected_breakage in (
+        (populated, True, False),
+        (empty, True, False),
+        (populated, True, False),
+        (more, True, False),
+        (more, False, False),
+        (redesigned, True, True),
+    ):
+        result = store.compare('test', html)
+        assert result['changed'] == expected_changed, result
+        assert bool(result['breakage']) == expected_breakage, result
+    print("✅ Empreintes: transitions de créneaux sans fausse casse, refonte détectée")
+
+
+if __name__ == "__main__":
+    test_slot_transitions()
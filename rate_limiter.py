@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Limiteur de débit côté client par modèle Gemini (quotas RPM / RPD)
+
+Évite de payer la latence d'une requête pour apprendre via un 429
+que le quota est épuisé: un modèle sans jeton disponible est ignoré.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import json_state
+
+logger = logging.getLogger(__name__)
+
+# Les quotas journaliers Gemini sont remis à zéro à minuit (heure du Pacifique)
+QUOTA_TIMEZONE = 'America/Los_Angeles'
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse une configuration du type "gemini-2.5-flash=10/250,gemini-2.0-flash=15/200"
+
+    Returns:
+        Dict modèle -> (requêtes par minute, requêtes par jour), 0 = illimité
+    """
+    limits: Dict[str, Tuple[int, int]] = {}
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry or '=' not in entry:
+            continue
+        model_name, budget = entry.split('=', 1)
+        rpm, _, rpd = budget.partition('/')
+        try:
+            limits[model_name.strip()] = (int(rpm or 0), int(rpd or 0))
+        except ValueError:
+            logger.warning(f"⚠️ Quota invalide ignoré: '{entry}'")
+    return limits
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu (capacité = RPM, recharge sur 60s)"""
+
+    def __init__(self, capacity: int, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.refill_rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def seconds_until_token(self) -> float:
+        self._refill()
+        if self.tokens >= 1 or self.refill_rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.refill_rate
+
+    def drain(self) -> None:
+        self._refill()
+        self.tokens = 0.0
+
+
+class ModelRateLimiter:
+    """Quotas RPM (seau à jetons) et RPD (compteur persistant) par modèle"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], state_path: Optional[str] = None):
+        self.limits = limits
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._buckets = {
+            model_name: TokenBucket(rpm)
+            for model_name, (rpm, _) in limits.items() if rpm > 0
+        }
+        self._day = self._current_day()
+        self._daily_counts: Dict[str, int] = {}
+        self._load_state()
+
+    @staticmethod
+    def _current_day() -> str:
+        """Jour de quota courant (fuseau du Pacifique, UTC à défaut)"""
+        try:
+            from zoneinfo import ZoneInfo
+            return datetime.now(ZoneInfo(QUOTA_TIMEZONE)).date().isoformat()
+        except Exception:
+            return datetime.now(timezone.utc).date().isoformat()
+
+    def _load_state(self) -> None:
+        state = json_state.load(self.state_path, "État des quotas")
+        if isinstance(state, dict) and state.get('day') == self._day:
+            self._daily_counts = {k: int(v) for k, v in state.get('counts', {}).items()}
+
+    def _save_state(self) -> None:
+        json_state.save_atomic(self.state_path, {'day': self._day, 'counts': self._daily_counts}, "les quotas")
+
+    def _roll_day(self) -> None:
+        day = self._current_day()
+        if day != self._day:
+            self._day = day
+            self._daily_counts = {}
+
+    def try_acquire(self, model_name: str) -> bool:
+        """Consomme un jeton pour le modèle; False si le quota est épuisé"""
+        return self.acquire(model_name, max_wait=0.0)
+
+    def acquire(self, model_name: str, max_wait: float = 0.0) -> bool:
+        """
+        Consomme un jeton pour le modèle, en attendant au plus max_wait secondes
+
+        Vérification et consommation se font sous le même verrou: deux appelants
+        concurrents ne peuvent pas obtenir le même jeton.
+
+        Returns:
+            False si le quota du jour est épuisé ou si aucun jeton n'arrive à temps
+        """
+        if model_name not in self.limits:
+            return True
+
+        give_up_at = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                self._roll_day()
+                _, rpd = self.limits[model_name]
+                used_today = self._daily_counts.get(model_name, 0)
+                if rpd > 0 and used_today >= rpd:
+                    return False
+
+                bucket = self._buckets.get(model_name)
+                if bucket is None or bucket.try_take():
+                    self._daily_counts[model_name] = used_today + 1
+                    self._save_state()
+                    return True
+                delay = bucket.seconds_until_token()
+
+            if delay > give_up_at - time.monotonic():
+                return False
+            time.sleep(delay)
+
+    def mark_exhausted(self, model_name: str) -> None:
+        """Vide le seau après un 429 inattendu (quota serveur plus strict)"""
+        with self._lock:
+            bucket = self._buckets.get(model_name)
+            if bucket is not None:
+                bucket.drain()
+
+    def seconds_until_available(self, model_name: str) -> Optional[float]:
+        """Délai avant le prochain jeton, None si le quota du jour est épuisé"""
+        if model_name not in self.limits:
+            return 0.0
+
+        with self._lock:
+            self._roll_day()
+            _, rpd = self.limits[model_name]
+            if rpd > 0 and self._daily_counts.get(model_name, 0) >= rpd:
+                return None
+            bucket = self._buckets.get(model_name)
+            return bucket.seconds_until_token() if bucket is not None else 0.0
+
+    def remaining(self, model_name: str) -> Dict[str, Optional[float]]:
+        """Budget restant pour un modèle (None = illimité)"""
+        if model_name not in self.limits:
+            return {'minute': None, 'day': None}
+
+        with self._lock:
+            self._roll_day()
+            rpm, rpd = self.limits[model_name]
+            bucket = self._buckets.get(model_name)
+            return {
+                'minute': round(bucket.available(), 2) if bucket is not None else None,
+                'day': max(0, rpd - self._daily_counts.get(model_name, 0)) if rpd > 0 else None,
+                'rpm': rpm,
+                'rpd': rpd,
+            }
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Budget restant de tous les modèles configurés"""
+        return {model_name: self.remaining(model_name) for model_name in self.limits}
+
+
+_shared_limiter: Optional[ModelRateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter() -> ModelRateLimiter:
+    """Limiteur partagé par tous les solvers (configuré via GEMINI_RATE_LIMITS)"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            limits = parse_rate_limits(os.getenv('GEMINI_RATE_LIMITS', ''))
+            state_path = os.getenv('GEMINI_QUOTA_STATE', 'data/gemini_quota.json')
+            _shared_limiter = ModelRateLimiter(limits, state_path)
+            if limits:
+                logger.info(f"🚦 Quotas Gemini configurés: {limits}")
+        return _shared_limiter
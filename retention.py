@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Rétention des artefacts du scanner (captures et audios de screenshots/)
+
+Le scanner consigne chaque tentative dans un manifeste (data/attempts.jsonl:
+cible, statut, disponibilité, fichiers produits). Un thread d'arrière-plan
+applique périodiquement la politique:
+- jamais supprimés: artefacts d'une tentative SUCCESS ou available=True,
+  et ceux des ARTIFACT_KEEP_LAST dernières tentatives de chaque cible
+- supprimés: artefacts plus vieux que ARTIFACT_MAX_AGE_DAYS, puis les plus
+  anciens tant que le dossier dépasse ARTIFACT_MAX_TOTAL_MB
+La suppression est progressive (ARTIFACT_DELETE_RATE fichiers/s au plus) et
+suspendue pendant les scans pour ne pas leur disputer le disque.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import json_state
+from artifact_index import ArtifactIndex, get_artifact_index
+
+logger = logging.getLogger(__name__)
+
+# Artefacts d'une cible inconnue (antérieurs au manifeste): regroupés ici
+UNKNOWN_TARGET = ''
+
+
+class AttemptManifest:
+    """Journal des tentatives (JSON Lines), compacté par le moteur de rétention"""
+
+    def __init__(self, path: Optional[str] = 'data/attempts.jsonl'):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'AttemptManifest':
+        return cls(os.getenv('ARTIFACT_MANIFEST_PATH', 'data/attempts.jsonl') or None)
+
+    def record(self, target: str, attempt: int, status: str, available: bool,
+               files: List[str]) -> None:
+        """Ajoute une tentative et ses artefacts (noms de fichiers)"""
+        if not self.path or not files:
+            return
+        entry = {
+            'at': time.time(),
+            'target': target,
+            'attempt': attempt,
+            'status': status,
+            'available': bool(available),
+            'files': [os.path.basename(path) for path in files],
+        }
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.warning(f"⚠️ Tentative non consignée dans le manifeste: {e}")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Tentatives consignées, des plus anciennes aux plus récentes"""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        entries = []
+        with self._lock:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return entries
+
+    def compact(self, existing: Set[str]) -> None:
+        """Réécrit le manifeste sans les tentatives dont tous les fichiers ont disparu"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with self._lock:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+                kept = []
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if any(name in existing for name in entry.get('files', [])):
+                        kept.append(line)
+                if len(kept) == len(lines):
+                    return
+                json_state.write_atomic(self.path, ''.join(kept))
+        except OSError as e:
+            logger.warning(f"⚠️ Compactage du manifeste impossible: {e}")
+
+
+class RetentionPolicy:
+    """Limites de taille, d'âge et nombre de tentatives conservées par cible"""
+
+    def __init__(self, max_total_bytes: Optional[int] = None, max_age: Optional[float] = None,
+                 keep_last: int = 20, keep_successful: bool = True):
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+        self.keep_last = keep_last
+        self.keep_successful = keep_successful
+
+    @classmethod
+    def from_env(cls) -> 'RetentionPolicy':
+        """Politique depuis .env (0 désactive une limite)"""
+        max_mb = float(os.getenv('ARTIFACT_MAX_TOTAL_MB', '2048'))
+        max_days = float(os.getenv('ARTIFACT_MAX_AGE_DAYS', '14'))
+        return cls(
+            max_total_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None,
+            max_age=max_days * 86400 if max_days > 0 else None,
+            keep_last=int(os.getenv('ARTIFACT_KEEP_LAST', '20')),
+            keep_successful=os.getenv('ARTIFACT_KEEP_SUCCESS', 'true').lower() == 'true'
+        )
+
+    def plan(self, records: List[Dict[str, Any]], entries: List[Dict[str, Any]],
+             now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Artefacts à supprimer, du plus ancien au plus récent
+
+        Args:
+            records: artefacts présents (ArtifactIndex.records(), plus anciens d'abord)
+            entries: tentatives du manifeste (plus anciennes d'abord)
+        """
+        now = now or time.time()
+        protected: Set[str] = set()
+
+        # Tentatives par cible; les fichiers hors manifeste comptent chacun pour une tentative
+        attempts_by_target: Dict[str, List[List[str]]] = {}
+        listed: Set[str] = set()
+        for entry in entries:
+            files = entry.get('files', [])
+            listed.update(files)
+            if self.keep_successful and (entry.get('status') == 'SUCCESS' or entry.get('available')):
+                protected.update(files)
+            attempts_by_target.setdefault(entry.get('target', UNKNOWN_TARGET), []).append(files)
+        for record in records:
+            if record['name'] not in listed:
+                attempts_by_target.setdefault(UNKNOWN_TARGET, []).append([record['name']])
+
+        if self.keep_last > 0:
+            for attempts in attempts_by_target.values():
+                for files in attempts[-self.keep_last:]:
+                    protected.update(files)
+
+        candidates = [record for record in records if record['name'] not in protected]
+        doomed: List[Dict[str, Any]] = []
+        if self.max_age is not None:
+            doomed = [record for record in candidates if now - record['mtime'] > self.max_age]
+
+        if self.max_total_bytes is not None:
+            doomed_names = {record['name'] for record in doomed}
+            total = sum(record['size'] for record in records) - sum(record['size'] for record in doomed)
+            for record in candidates:
+                if total <= self.max_total_bytes:
+                    break
+                if record['name'] in doomed_names:
+                    continue
+                doomed.append(record)
+                total -= record['size']
+            if total > self.max_total_bytes:
+                logger.warning(f"⚠️ Artefacts protégés au-delà de la limite: {total / 1024 / 1024:.1f} Mo conservés")
+
+        doomed.sort(key=lambda record: record['mtime'])
+        return doomed
+
+
+class RetentionEngine:
+    """Thread d'arrière-plan appliquant la politique de rétention"""
+
+    def __init__(self, index: ArtifactIndex, policy: RetentionPolicy, manifest: AttemptManifest,
+                 interval: float = 600.0, delete_rate: float = 20.0):
+        self.index = index
+        self.policy = policy
+        self.manifest = manifest
+        self.interval = interval
+        self.delete_rate = delete_rate
+        self._stop = threading.Event()
+        # Levé hors scan: la suppression attend qu'il le soit
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {
+            'runs': 0,
+            'deleted': 0,
+            'freed_bytes': 0,
+            'errors': 0,
+            'last_run': None,
+            'pending': 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> 'RetentionEngine':
+        return cls(
+            index=get_artifact_index(),
+            policy=RetentionPolicy.from_env(),
+            manifest=get_attempt_manifest(),
+            interval=float(os.getenv('ARTIFACT_RETENTION_INTERVAL', '600')),
+            delete_rate=float(os.getenv('ARTIFACT_DELETE_RATE', '20'))
+        )
+
+    def start(self) -> bool:
+        """Démarre le thread (sans effet si l'intervalle vaut 0 ou s'il tourne déjà)"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+        logger.info(f"🧹 Rétention des artefacts active (toutes les {self.interval:.0f}s)")
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._idle.set()
+
+    def scan_started(self) -> None:
+        """Suspend les suppressions pendant un scan"""
+        self._idle.clear()
+
+    def scan_finished(self) -> None:
+        self._idle.set()
+
+    def run_once(self) -> int:
+        """Un passage complet: planification puis suppression progressive"""
+        self.index.refresh(force=True)
+        doomed = self.policy.plan(self.index.records(), self.manifest.entries())
+        with self._lock:
+            self.stats['pending'] = len(doomed)
+
+        deleted = 0
+        for record in doomed:
+            self._idle.wait()
+            if self._stop.is_set():
+                break
+            self._delete(record)
+            deleted += 1
+            with self._lock:
+                self.stats['pending'] -= 1
+            if self.delete_rate > 0:
+                self._stop.wait(1.0 / self.delete_rate)
+
+        self.manifest.compact({record['name'] for record in self.index.records()})
+        with self._lock:
+            self.stats['runs'] += 1
+            self.stats['last_run'] = time.time()
+        if deleted:
+            logger.info(f"🧹 Rétention: {deleted} artefact(s) supprimé(s)")
+        return deleted
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, running=bool(self._thread and self._thread.is_alive()))
+
+    def _delete(self, record: Dict[str, Any]) -> None:
+        path = os.path.join(self.index.directory, record['name'])
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"⚠️ Suppression de {record['name']} impossible: {e}")
+            return
+        self.index.forget(record['name'])
+        # Miniature éventuelle du viewer
+        from thumbnails import get_thumbnail_cache
+        get_thumbnail_cache().discard(record['name'])
+        with self._lock:
+            self.stats['deleted'] += 1
+            self.stats['freed_bytes'] += record['size']
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                logger.warning(f"⚠️ Passage de rétention en échec: {e}")
+            self._stop.wait(self.interval)
+
+
+_shared_manifest: Optional[AttemptManifest] = None
+_shared_engine: Optional[RetentionEngine] = None
+_shared_lock = threading.Lock()
+
+
+def get_attempt_manifest() -> AttemptManifest:
+    """Manifeste partagé (écrit par le scanner, compacté par la rétention)"""
+    global _shared_manifest
+    with _shared_lock:
+        if _shared_manifest is None:
+            _shared_manifest = AttemptManifest.from_env()
+        return _shared_manifest
+
+
+def get_retention_engine() -> RetentionEngine:
+    """Moteur de rétention partagé (démarré par le scanner continu)"""
+    global _shared_engine
+    if _shared_engine is None:
+        engine = RetentionEngine.from_env()
+        with _shared_lock:
+            if _shared_engine is None:
+                _shared_engine = engine
+    return _shared_engine
+
+
+def peek_retention_engine() -> Optional[RetentionEngine]:
+    """Moteur de rétention partagé s'il existe déjà, sans le créer"""
+    return _shared_engine
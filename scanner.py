@@ -3,31 +3,53 @@
 Scanner RDV Préfecture - Version Finale avec Multimodal Gemini
 Intègre résolution multimodale (image + audio) avec fallback intelligent
 """
+# Importé en premier: sert de référence au rapport de démarrage
+from startup_report import startup_report
 import os
 import sys
 import time
 import logging
 import argparse
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-from hybrid_optimized_solver_clean import HybridOptimizedSolver
-from notifier import Notifier
-
-# Import optionnel du health check pour déploiement cloud
-try:
-    from health_check import start_health_server
-    HEALTH_CHECK_AVAILABLE = True
-except ImportError:
-    HEALTH_CHECK_AVAILABLE = False
-
-# Import optionnel du viewer de screenshots
-try:
-    from screenshot_viewer_secure import run_screenshot_viewer
-    SCREENSHOT_VIEWER_AVAILABLE = True
-except ImportError:
-    SCREENSHOT_VIEWER_AVAILABLE = False
+from alert_dedup import AlertDeduplicator
+from captcha_corpus import CaptchaCorpus
+from deadline import Deadline, DeadlineExceeded
+from page_fingerprint import FingerprintStore
+from retention import get_attempt_manifest, get_retention_engine
+from slot_extractor import SlotFilter, SlotIndex, extract_slots
+
+# Les dépendances lourdes (Playwright, Gemini, PIL, requests, viewers) sont
+# importées au premier usage: la configuration est validée avant tout import.
+
+
+def _load_sync_playwright():
+    """Import paresseux de Playwright"""
+    with startup_report.measure('import playwright'):
+        from playwright.sync_api import sync_playwright
+    return sync_playwright
+
+
+def _load_health_server():
+    """Import optionnel du health check pour déploiement cloud"""
+    try:
+        with startup_report.measure('import health_check'):
+            from health_check import start_health_server
+        return start_health_server
+    except ImportError:
+        return None
+
+
+def _load_screenshot_viewer():
+    """Import optionnel du viewer de screenshots"""
+    try:
+        with startup_report.measure('import screenshot_viewer_secure'):
+            from screenshot_viewer_secure import run_screenshot_viewer
+        return run_screenshot_viewer
+    except ImportError:
+        return None
+
 
 # Configuration du logging
 logging.basicConfig(
@@ -40,6 +62,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pas d'attente de l'audio captcha (interrompue dès réception)
+AUDIO_POLL_MS = 250
+# Bouton « nouveau captcha » du widget (évite de recharger toute la page)
+CAPTCHA_REFRESH_SELECTOR = 'button[title="Générer un nouveau captcha"], button[id$="reload-btn"]'
+
 
 class MultimodalRDVScanner:
     """Scanner RDV avec résolution multimodale avancée"""
@@ -53,15 +80,37 @@ class MultimodalRDVScanner:
         self.background_mode = os.getenv('BACKGROUND_MODE', 'false').lower() == 'true'
         self.check_interval = int(os.getenv('CHECK_INTERVAL', '300'))
         self.max_retries = 3
+        # Score minimum (mode ensemble) pour soumettre plutôt que rafraîchir le captcha
+        self.min_captcha_confidence = float(os.getenv('CAPTCHA_MIN_CONFIDENCE', '0.5'))
+        self.captcha_refresh_selector = os.getenv('CAPTCHA_REFRESH_SELECTOR', CAPTCHA_REFRESH_SELECTOR)
 
         if not self.url_page1:
             raise ValueError("PAGE_1_URL doit être configuré dans .env")
         if not self.url_page2:
             raise ValueError("PAGE_2_URL doit être configuré dans .env")
+        if not os.getenv('GEMINI_API_KEY'):
+            raise ValueError("GEMINI_API_KEY doit être configuré dans .env")
+
+        # Résolveur et notifier construits au premier usage
+        self._captcha_solver = None
+        self._notifier = None
+
+        # Corpus étiqueté alimenté par les réponses acceptées/refusées par le site
+        self.corpus = CaptchaCorpus.from_env()
+
+        # Mémoire des alertes entre scans (et redémarrages): pas de répétition
+        self.alert_dedup = AlertDeduplicator.from_env()
+
+        # Créneaux extraits de /creneau/ et critères d'intérêt (SLOT_FILTER_*)
+        self.slot_filter = SlotFilter.from_env()
+        self.slot_index = SlotIndex.from_env()
+        self.slot_container = os.getenv('SLOT_CONTAINER_SELECTOR') or None
 
-        # Initialiser le résolveur hybride optimisé
-        self.captcha_solver = HybridOptimizedSolver()
-        self.notifier = Notifier()
+        # Empreintes des pages /creneau/: travail aval seulement si le contenu change
+        self.fingerprints = FingerprintStore.from_env()
+
+        # Manifeste des tentatives: la rétention garde les artefacts utiles
+        self.attempt_manifest = get_attempt_manifest()
 
         logger.info("=" * 60)
         logger.info("🎯 SCANNER RDV MULTIMODAL INITIALISÉ")
@@ -73,14 +122,45 @@ class MultimodalRDVScanner:
         logger.info("Mode arrière-plan: %s", self.background_mode)
         logger.info("Intervalle: %ss", self.check_interval)
         logger.info("Max retries: %s", self.max_retries)
-
-    def capture_captcha_resources(self, page, attempt: int) -> Dict[str, str]:
+        logger.info("Mode captcha: %s", os.getenv('CAPTCHA_SOLVER_MODE', 'fallback').lower())
+        logger.info("Filtre créneaux: %s", self.slot_filter.describe())
+
+    @property
+    def captcha_solver(self):
+        """Résolveur hybride optimisé (Gemini importé au premier usage)"""
+        if self._captcha_solver is None:
+            with startup_report.measure('import hybrid_optimized_solver_clean'):
+                from hybrid_optimized_solver_clean import HybridOptimizedSolver
+            with startup_report.measure('init HybridOptimizedSolver'):
+                self._captcha_solver = HybridOptimizedSolver()
+        return self._captcha_solver
+
+    @property
+    def notifier(self):
+        """Notifier (requests importé au premier usage)"""
+        if self._notifier is None:
+            with startup_report.measure('import notifier'):
+                from notifier import get_notifier
+            with startup_report.measure('init Notifier'):
+                self._notifier = get_notifier()
+        return self._notifier
+
+    def warm_up(self):
+        """Charge tous les composants paresseux (utilisé par --startup-report)"""
+        _load_sync_playwright()
+        self.captcha_solver
+        self.notifier
+        _load_health_server()
+        _load_screenshot_viewer()
+
+    def capture_captcha_resources(self, page, attempt: int, deadline: Optional[Deadline] = None) -> Dict[str, str]:
         """
         Capture les ressources captcha (image + audio)
 
         Returns:
             Dict avec chemins vers image et audio
         """
+        deadline = deadline or Deadline.from_env()
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         resources = {'image': None, 'audio': None}
 
@@ -90,25 +170,29 @@ class MultimodalRDVScanner:
             if captcha_images.count() > 0:
                 os.makedirs('screenshots', exist_ok=True)
                 image_path = f"screenshots/captcha_image_{timestamp}_attempt_{attempt}.png"
-                captcha_images.first.screenshot(path=image_path)
+                captcha_images.first.screenshot(
+                    path=image_path, timeout=deadline.timeout_ms(10000, 'capture image'))
                 resources['image'] = image_path
                 logger.info("   📸 Image captcha: %s", image_path)
 
             # Capture de l'audio captcha
             audio_path = f"screenshots/captcha_audio_{timestamp}_attempt_{attempt}.wav"
-            audio_captured = self.capture_audio_captcha(page, audio_path)
+            audio_captured = self.capture_audio_captcha(page, audio_path, deadline)
             if audio_captured:
                 resources['audio'] = audio_path
                 logger.info("   🎵 Audio captcha: %s", audio_path)
 
             return resources
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error("   ❌ Erreur capture: %s", e)
             return resources
 
-    def capture_audio_captcha(self, page, audio_path: str) -> bool:
+    def capture_audio_captcha(self, page, audio_path: str, deadline: Optional[Deadline] = None) -> bool:
         """Capture l'audio captcha en cliquant sur le bouton"""
+        deadline = deadline or Deadline.from_env()
         try:
             # Trouver le bouton audio
             audio_button = page.locator(
@@ -131,8 +215,11 @@ class MultimodalRDVScanner:
             page.on('response', handle_response)
 
             # Cliquer et attendre l'audio
-            audio_button.click()
-            page.wait_for_timeout(3000)
+            audio_button.click(timeout=deadline.timeout_ms(5000, 'capture audio'))
+            # Attente jusqu'à 3s (bornée par le budget), interrompue dès réception
+            wait_until = time.monotonic() + deadline.timeout(3.0, 'capture audio')
+            while audio_data is None and time.monotonic() < wait_until:
+                page.wait_for_timeout(AUDIO_POLL_MS)
 
             # Sauvegarder si capturé
             if audio_data:
@@ -142,17 +229,58 @@ class MultimodalRDVScanner:
 
             return False
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error("   ⚠️ Erreur capture audio: %s", e)
             return False
 
-    def try_captcha_submission_multimodal(self, page, url: str, page_name: str, attempt: int) -> Dict[str, Any]:
+    def refresh_captcha(self, page, deadline: Deadline) -> bool:
+        """
+        Demande un nouveau captcha sans quitter la page
+
+        Clique sur le bouton de rafraîchissement du widget et attend que l'image
+        change; à défaut (bouton absent, image inchangée), recharge la page.
+
+        Returns:
+            True si le widget a été rafraîchi sur place
+        """
+        try:
+            refresh_button = page.locator(self.captcha_refresh_selector)
+            if refresh_button.count() > 0:
+                image = page.locator('img').first
+                previous_src = image.get_attribute('src', timeout=deadline.timeout_ms(2000, 'refresh'))
+                refresh_button.first.click(timeout=deadline.timeout_ms(5000, 'refresh'))
+                page.wait_for_function(
+                    "previous => { const img = document.querySelector('img'); return img && img.src !== previous; }",
+                    arg=previous_src,
+                    timeout=deadline.timeout_ms(5000, 'refresh')
+                )
+                logger.info("🔃 Nouveau captcha affiché (sans rechargement)")
+                return True
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning("⚠️ Rafraîchissement du captcha impossible, rechargement de la page: %s", e)
+
+        page.reload(wait_until='domcontentloaded', timeout=deadline.timeout_ms(30000, 'refresh'))
+        return False
+
+    def try_captcha_submission_multimodal(
+        self, page, url: str, page_name: str, attempt: int, deadline: Optional[Deadline] = None,
+        navigate: bool = False
+    ) -> Dict[str, Any]:
         """
         Tentative de soumission avec approche multimodale
 
+        Toute la tentative (navigation, captures, résolution, soumission)
+        partage un même budget (CAPTCHA_ATTEMPT_DEADLINE); s'il est épuisé,
+        le statut est 'DEADLINE' et 'deadline' indique l'étape fautive.
+
         Returns:
             Dict avec statut et informations détaillées
         """
+        deadline = deadline or Deadline.from_env()
         result = {
             'status': 'ERROR',
             'message': '',
@@ -162,14 +290,16 @@ class MultimodalRDVScanner:
             'captcha_method': '',
             'captcha_confidence': '',
             'url': '',
-            'available': False
+            'available': False,
+            'artifacts': []
         }
 
         try:
-            # Navigation seulement si première tentative
-            if attempt == 1:
+            # Navigation si première tentative (ou page à reprendre depuis l'URL)
+            if attempt == 1 or navigate:
                 logger.info("🚀 Navigation vers %s...", page_name)
-                page.goto(url, wait_until='domcontentloaded', timeout=30000)
+                deadline.begin('navigation')
+                page.goto(url, wait_until='domcontentloaded', timeout=deadline.timeout_ms(30000, 'navigation'))
                 logger.info("✅ %s chargée", page_name)
             else:
                 logger.info("🔄 Continuation sur %s...", page_name)
@@ -185,7 +315,9 @@ class MultimodalRDVScanner:
 
             # Capture des ressources captcha
             logger.info("📋 Capture des ressources captcha...")
-            resources = self.capture_captcha_resources(page, attempt)
+            deadline.begin('capture')
+            resources = self.capture_captcha_resources(page, attempt, deadline)
+            result['artifacts'].extend(path for path in resources.values() if path)
 
             if not resources['image']:
                 result['message'] = "Image captcha non capturée"
@@ -193,15 +325,39 @@ class MultimodalRDVScanner:
 
             # Résolution avec approche multimodale
             logger.info("🧠 Résolution multimodale du captcha...")
-            solver_result = self.captcha_solver.solve_captcha_with_fallback(
+            deadline.begin('solve')
+            solver_result = self.captcha_solver.solve_captcha(
                 resources['image'],
-                resources['audio']
+                resources['audio'],
+                target=page_name,
+                deadline=deadline
             )
+            deadline.begin('submit')
+
+            if solver_result['status'] == 'REFRESH':
+                # Toutes les lectures de ce captcha ont déjà été refusées
+                result['status'] = 'CAPTCHA_REFRESH'
+                result['message'] = f"Réponses déjà refusées, nouveau captcha demandé: {solver_result.get('attempts', [])}"
+                self.refresh_captcha(page, deadline)
+                return result
 
             if solver_result['status'] != 'SUCCESS':
                 result['message'] = f"Échec résolution: {solver_result.get('attempts', [])}"
                 return result
 
+            # Un rafraîchissement coûte moins cher qu'une soumission rejetée
+            score = solver_result.get('confidence_score')
+            if score is not None and score < self.min_captcha_confidence:
+                result.update({
+                    'status': 'LOW_CONFIDENCE',
+                    'captcha_text': solver_result['text'],
+                    'captcha_method': solver_result['method'],
+                    'captcha_confidence': solver_result['confidence'],
+                    'message': f"Confiance trop faible ({score:.2f} < {self.min_captcha_confidence:.2f}), captcha rafraîchi"
+                })
+                self.refresh_captcha(page, deadline)
+                return result
+
             captcha_text = solver_result['text']
             result.update({
                 'captcha_text': captcha_text,
@@ -228,25 +384,47 @@ class MultimodalRDVScanner:
             # Screenshots avant/après
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             before_path = f"screenshots/before_submit_{timestamp}_attempt_{attempt}.png"
-            page.screenshot(path=before_path, full_page=True)
+            page.screenshot(path=before_path, full_page=True, timeout=deadline.timeout_ms(10000, 'submit'))
+            result['artifacts'].append(before_path)
 
             # Soumission
-            submit_btn.click()
+            submit_btn.click(timeout=deadline.timeout_ms(10000, 'submit'))
             logger.info("✅ Formulaire soumis")
 
             # Attendre la réponse (navigation ou changement d'URL)
             try:
-                page.wait_for_load_state('networkidle', timeout=10000)
+                page.wait_for_load_state('networkidle', timeout=deadline.timeout_ms(10000, 'submit'))
+            except DeadlineExceeded:
+                raise
             except Exception:
                 # Si pas de changement de page, attendre un peu pour le contenu
-                page.wait_for_timeout(2000)
+                page.wait_for_timeout(deadline.timeout_ms(2000, 'submit'))
 
             # Analyser la réponse
             current_url = page.url
-            body_text = page.locator('body').inner_text()
-
-            after_path = f"screenshots/after_submit_{timestamp}_attempt_{attempt}.png"
-            page.screenshot(path=after_path, full_page=True)
+            body_text = page.locator('body').inner_text(timeout=deadline.timeout_ms(10000, 'submit'))
+
+            # Page de créneaux inchangée depuis le scan précédent: pas de nouvelle capture
+            html = page.content() if '/creneau/' in current_url else None
+            fingerprint = self._compare_fingerprint(html, page_name) if html else None
+            if fingerprint:
+                result['fingerprint'] = fingerprint['content']
+            if fingerprint and fingerprint['breakage']:
+                result['selector_breakage'] = fingerprint['breakage']
+            if fingerprint is None or fingerprint['changed']:
+                after_path = f"screenshots/after_submit_{timestamp}_attempt_{attempt}.png"
+                try:
+                    page.screenshot(path=after_path, full_page=True,
+                                    timeout=deadline.timeout_ms(10000, 'screenshot'))
+                    result['artifacts'].append(after_path)
+                except Exception as e:
+                    # La réponse du site est déjà là: une capture manquée ne doit pas la perdre
+                    logger.warning("⚠️ Capture après soumission impossible: %s", e)
+            else:
+                result['unchanged'] = True
+                logger.info("🟰 %s: page de créneaux inchangée (%s), capture ignorée",
+                            page_name, fingerprint['content'])
+            deadline.finish()
 
             result['url'] = current_url
             body_lower = body_text.lower()
@@ -259,20 +437,27 @@ class MultimodalRDVScanner:
             elif 'error=invalidcaptcha' in current_url.lower():
                 result['status'] = 'INVALID_CAPTCHA'
                 result['message'] = f"Captcha '{captcha_text}' invalide ({solver_result['method']})"
+                self.captcha_solver.record_rejection(solver_result.get('cache_key'), captcha_text)
+                self._record_corpus_sample(resources, solver_result, page_name, accepted=False)
 
             elif '/creneau/' in current_url:
                 result['status'] = 'SUCCESS'
                 result['message'] = "Accès aux créneaux réussi"
+                self.captcha_solver.record_outcome(solver_result.get('cache_key'), accepted=True)
+                self._record_corpus_sample(resources, solver_result, page_name, accepted=True)
 
-                # Analyser la disponibilité
+                # Disponibilité d'après les textes de la page; les créneaux extraits l'enrichissent
+                slots = self._extract_slots(html, page_name, unchanged=result.get('unchanged', False))
                 if 'aucun créneau disponible' in body_lower:
                     result['available'] = False
                     result['message'] += " - Aucun créneau disponible"
                 elif 'choisissez votre créneau' in body_lower or 'sélectionnez' in body_lower:
                     result['available'] = True
                     result['message'] += " - 🎉 CRÉNEAUX DISPONIBLES!"
+                    self._apply_slot_filter(result, slots)
                 else:
                     result['available'] = False
+                    result['undetermined'] = True
                     result['message'] += " - Statut indéterminé"
 
             else:
@@ -282,12 +467,37 @@ class MultimodalRDVScanner:
             return result
 
         except Exception as e:
+            deadline.finish()
+            if isinstance(e, DeadlineExceeded) or deadline.expired:
+                # Timeout Playwright/Gemini borné par le budget, ou budget épuisé
+                stage = deadline.overrun_stage or getattr(e, 'stage', 'inconnue')
+                result['status'] = 'DEADLINE'
+                result['message'] = f"Budget de {deadline.budget:.0f}s épuisé (étape: {stage})"
+                result['deadline'] = deadline.summary()
+                logger.warning("⏱️ Tentative %s: %s %s", attempt, result['message'], deadline.summary()['stages'])
+                return result
             result['message'] = f"Erreur: {str(e)}"
             logger.error("Erreur tentative %s: %s", attempt, e)
             return result
 
+    def _record_corpus_sample(self, resources: Dict[str, str], solver_result: Dict[str, Any],
+                              page_name: str, accepted: bool) -> None:
+        """Ajoute le captcha soumis au corpus étiqueté (si activé)"""
+        if not self.corpus:
+            return
+        self.corpus.add_files(
+            resources['image'],
+            resources.get('audio'),
+            label=solver_result['text'],
+            accepted=accepted,
+            method=solver_result.get('method', ''),
+            model=solver_result.get('model') or '',
+            target=page_name
+        )
+
     def scan_single_page_with_retry(self, page, url: str, page_name: str) -> Dict[str, Any]:
         """Scanne une page unique avec retry"""
+        navigate = False
         for attempt in range(1, self.max_retries + 1):
             logger.info(
                 "🔄 %s - TENTATIVE %s/%s",
@@ -297,7 +507,10 @@ class MultimodalRDVScanner:
             )
 
             result = self.try_captcha_submission_multimodal(
-                page, url, page_name, attempt)
+                page, url, page_name, attempt, navigate=navigate)
+            navigate = False
+            self.attempt_manifest.record(
+                page_name, attempt, result['status'], result.get('available', False), result['artifacts'])
 
             # Log détaillé du résultat
             logger.info("   Status: %s", result['status'])
@@ -318,6 +531,19 @@ class MultimodalRDVScanner:
                 logger.warning("❌ %s BLOQUÉ: %s", page_name, result['message'])
                 return result
 
+            elif result['status'] in ('LOW_CONFIDENCE', 'CAPTCHA_REFRESH'):
+                logger.info("🔁 %s: %s", page_name, result['message'])
+                if attempt >= self.max_retries:
+                    return result
+
+            elif result['status'] == 'DEADLINE':
+                logger.warning("⏱️ %s: %s", page_name, result['message'])
+                if attempt >= self.max_retries:
+                    return result
+                # Page dans un état inconnu (chargement ou captcha expiré): la tentative
+                # suivante repart de l'URL, navigation comprise dans son budget
+                navigate = True
+
             elif result['status'] == 'INVALID_CAPTCHA':
                 logger.warning(
                     "❌ %s CAPTCHA INVALIDE: %s",
@@ -357,6 +583,8 @@ class MultimodalRDVScanner:
 
         results = []
 
+        sync_playwright = _load_sync_playwright()
+
         with sync_playwright() as p:
             # Arguments de lancement avec muting si configuré
             launch_args = [
@@ -442,6 +670,96 @@ class MultimodalRDVScanner:
 
         return results
 
+    def _compare_fingerprint(self, html: str, page_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Empreinte de la page /creneau/ comparée au scan précédent
+
+        None si le calcul échoue: la page est alors traitée comme modifiée,
+        l'optimisation « page inchangée » ne masque jamais un résultat.
+        """
+        try:
+            return self.fingerprints.compare(page_name, html)
+        except Exception as e:
+            logger.warning("⚠️ Empreinte de %s impossible, page traitée comme modifiée: %s", page_name, e)
+            return None
+
+    def _extract_slots(self, html: str, page_name: str, unchanged: bool = False) -> Optional[List]:
+        """
+        Créneaux de la page /creneau/ (None si l'extraction échoue)
+
+        Page inchangée: les créneaux indexés au scan précédent sont réutilisés.
+        """
+        if unchanged:
+            return self.slot_index.slots(page_name)
+        try:
+            slots = extract_slots(html, self.slot_container)
+        except Exception as e:
+            logger.warning("⚠️ Extraction des créneaux impossible: %s", e)
+            return None
+        self.slot_index.update(page_name, slots)
+        if slots:
+            logger.info("📅 %s créneau(x) extrait(s) sur %s jour(s)",
+                        len(slots), len({slot.day for slot in slots}))
+        return slots
+
+    def _apply_slot_filter(self, result: Dict[str, Any], slots: Optional[List]) -> None:
+        """
+        Restreint le résultat aux créneaux correspondant aux critères
+
+        Si aucun créneau ne correspond, la page est traitée comme sans
+        disponibilité et n'alimente pas les notifications.
+        """
+        if not slots:
+            result['slots'] = []
+            if self.slot_filter.active:
+                logger.warning("⚠️ Aucun créneau extrait: filtre non applicable, alerte conservée")
+            return
+
+        matching = self.slot_filter.apply(slots) if self.slot_filter.active else slots
+        result['slots'] = [slot.to_dict() for slot in matching]
+        result['slots_total'] = len(slots)
+        if not matching:
+            result['available'] = False
+            result['filtered_out'] = True
+            result['message'] += f" ({len(slots)} créneau(x) hors critères: {self.slot_filter.describe()})"
+            logger.info("🔕 Créneaux hors critères (%s), pas de notification", self.slot_filter.describe())
+
+    def notify_availability(self, results: List[Dict[str, Any]]) -> bool:
+        """
+        Notifie les changements de disponibilité d'un scan (une alerte au plus)
+
+        Les créneaux déjà notifiés ne sont rappelés qu'après
+        NOTIFICATION_DEDUP_WINDOW, et seulement si la page diffère de celle notifiée;
+        leur disparition est notifiée.
+
+        Returns:
+            True si une alerte a été émise
+        """
+        pages = [
+            {
+                'page': result.get('page', 'Unknown'),
+                'url': result.get('url', ''),
+                'available': bool(result.get('available')),
+                # Seul un accès réussi aux créneaux établit l'état de la cible
+                'conclusive': result.get('status') == 'SUCCESS' and not result.get('undetermined'),
+                'message': result['message'],
+                'captcha_method': result.get('captcha_method', ''),
+                'slots': result.get('slots', []),
+                'fingerprint': result.get('fingerprint'),
+                'timestamp': datetime.now().isoformat()
+            }
+            for result in results
+        ]
+        decision = self.alert_dedup.observe(pages)
+        if not decision['available'] and not decision['gone']:
+            return False
+        try:
+            self.notifier.send_notification(decision['available'], gone=decision['gone'])
+            return True
+        except Exception as e:
+            logger.warning("Erreur notification: %s", e)
+            return False
+
     def run_once(self) -> List[Dict[str, Any]]:
         """Lance un scan unique"""
         logger.info("🚀 Démarrage du scanner multimodal (mode unique)")
@@ -452,7 +770,7 @@ class MultimodalRDVScanner:
         logger.info("=" * 60)
         logger.info("📊 RÉSULTATS FINAUX:")
 
-        available_pages = []
+        available_count = 0
 
         for result in results:
             page_name = result.get('page', 'Unknown')
@@ -468,32 +786,25 @@ class MultimodalRDVScanner:
 
             if result.get('available'):
                 logger.info("  🎉 CRÉNEAUX DISPONIBLES DÉTECTÉS!")
-                available_pages.append({
-                    'page': page_name,
-                    'url': result.get('url', ''),
-                    'available': True,
-                    'message': result['message'],
-                    'captcha_method': result.get('captcha_method', ''),
-                    'timestamp': datetime.now().isoformat()
-                })
+                available_count += 1
             else:
                 logger.info("  😔 Pas de créneaux disponibles")
 
         # Notifications si des créneaux sont disponibles
-        if available_pages:
+        if available_count:
             logger.info(
                 "\n🎉 %s PAGE(S) AVEC CRÉNEAUX TROUVÉES!",
-                len(available_pages)
+                available_count
             )
-            try:
-                self.notifier.send_notification(available_pages)
-            except Exception as e:
-                logger.warning("Erreur notification: %s", e)
         else:
             logger.info(
                 "\n😔 Aucun créneau disponible sur les %s pages",
                 len(results)
             )
+        if self.notify_availability(results):
+            # Le dispatcher est en arrière-plan: on lui laisse le temps de livrer avant de quitter
+            if not self.notifier.flush(timeout=30):
+                logger.warning("📮 Notification non livrée à temps, conservée dans la boîte d'envoi")
 
         logger.info("=" * 60)
 
@@ -507,20 +818,26 @@ class MultimodalRDVScanner:
         )
 
         # Démarrer le health check server si disponible (pour déploiement cloud)
-        if HEALTH_CHECK_AVAILABLE:
+        start_health_server = _load_health_server()
+        if start_health_server:
             try:
                 start_health_server()
             except Exception as e:
                 logger.warning("Health check server non démarré: %s", e)
 
         # Démarrer le screenshot viewer si disponible
-        if SCREENSHOT_VIEWER_AVAILABLE:
+        run_screenshot_viewer = _load_screenshot_viewer()
+        if run_screenshot_viewer:
             try:
                 run_screenshot_viewer(8081)
                 logger.info("🖼️ Screenshot viewer sécurisé disponible sur :8081")
             except Exception as e:
                 logger.warning("Screenshot viewer non démarré: %s", e)
 
+        # Rétention des captures et audios en arrière-plan (suspendue pendant les scans)
+        retention = get_retention_engine()
+        retention.start()
+
         scan_count = 0
 
         try:
@@ -532,36 +849,25 @@ class MultimodalRDVScanner:
                     datetime.now().strftime('%H:%M:%S')
                 )
 
-                results = self.scan_with_multimodal_retry()
-
-                # Vérifier les créneaux disponibles
-                available_pages = []
-                for result in results:
-                    if result.get('available'):
-                        available_pages.append({
-                            'page': result.get('page'),
-                            'url': result.get('url', ''),
-                            'available': True,
-                            'message': result['message'],
-                            'captcha_method': result.get('captcha_method', ''),
-                            'timestamp': datetime.now().isoformat()
-                        })
+                retention.scan_started()
+                try:
+                    results = self.scan_with_multimodal_retry()
+                finally:
+                    retention.scan_finished()
 
                 # Notification si disponible
-                if available_pages:
+                available_count = sum(1 for result in results if result.get('available'))
+                if available_count:
                     logger.info(
                         "\n🎉 %s PAGE(S) AVEC CRÉNEAUX TROUVÉES!",
-                        len(available_pages)
+                        available_count
                     )
-                    try:
-                        self.notifier.send_notification(available_pages)
-                    except Exception as e:
-                        logger.warning("Erreur notification: %s", e)
                 else:
                     logger.info(
                         "\n😔 Aucun créneau disponible sur les %s pages",
                         len(results)
                     )
+                self.notify_availability(results)
 
                 # Attendre avant le prochain scan
                 logger.info("💤 Attente %ss avant le prochain scan...", self.check_interval)
@@ -583,11 +889,20 @@ def main():
                         help='Exécuter une seule fois')
     parser.add_argument('--continuous', action='store_true',
                         help='Exécuter en continu')
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Afficher les temps d'import et d'initialisation par composant")
 
     args = parser.parse_args()
 
     try:
-        scanner = MultimodalRDVScanner()
+        with startup_report.measure('init MultimodalRDVScanner'):
+            scanner = MultimodalRDVScanner()
+
+        if args.startup_report:
+            scanner.warm_up()
+            print(startup_report.format())
+            if not (args.once or args.continuous):
+                return
 
         if args.once:
             scanner.run_once()
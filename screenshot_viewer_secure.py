@@ -5,118 +5,60 @@ Interface Web sécurisée pour visualiser les screenshots du scanner RDV
 import os
 import json
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import mimetypes
 import threading
 import base64
 import hashlib
 import secrets
+import gzip
 
-class AuthMixin:
-    """Mixin pour l'authentification des endpoints"""
-    
-    def check_auth(self):
-        """Vérifie l'authentification via token ou basic auth"""
-        # 1. Token dans query params ou header
-        if self.check_token_auth():
-            return True
-            
-        # 2. Basic Auth si configuré
-        if self.check_basic_auth():
-            return True
-            
+from artifact_index import get_artifact_index, parse_artifact_name, screenshots_dir
+from thumbnails import get_thumbnail_cache
+
+# Pagination de /api/screenshots
+DEFAULT_PAGE_SIZE = 60
+MAX_PAGE_SIZE = 500
+
+# Envoi des fichiers: par blocs (repli si os.sendfile est indisponible)
+STREAM_CHUNK_SIZE = 64 * 1024
+# Artefacts horodatés, jamais réécrits: cache navigateur d'un an
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+# Réponses HTML/JSON compressées au-delà de cette taille si le client accepte gzip
+GZIP_MIN_SIZE = 512
+
+
+def parse_range(header, size):
+    """
+    Intervalle (début, fin inclus) d'un en-tête Range à plage unique
+
+    Returns:
+        (start, end), None si non satisfiable, ou False si l'en-tête est
+        ignoré (syntaxe inconnue, plages multiples: réponse complète)
+    """
+    if not header.startswith('bytes=') or ',' in header:
         return False
-    
-    def check_token_auth(self):
-        """Vérifie l'authentification par token"""
-        expected_token = os.getenv('SCREENSHOT_TOKEN')
-        if not expected_token:
-            return False
-            
-        # Token dans l'URL
-        parsed_url = urlparse(self.path)
-        query_params = parse_qs(parsed_url.query)
-        token_from_url = query_params.get('token', [None])[0]
-        
-        # Token dans le header
-        token_from_header = self.headers.get('X-Screenshot-Token')
-        
-        return (token_from_url == expected_token or 
-                token_from_header == expected_token)
-    
-    def check_basic_auth(self):
-        """Vérifie l'authentification basique"""
-        username = os.getenv('SCREENSHOT_USERNAME')
-        password = os.getenv('SCREENSHOT_PASSWORD')
-        
-        if not username or not password:
-            return False
-            
-        auth_header = self.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Basic '):
-            return False
-            
-        try:
-            encoded_credentials = auth_header[6:]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-            provided_username, provided_password = decoded_credentials.split(':', 1)
-            return provided_username == username and provided_password == password
-        except:
-            return False
-    
-    def send_auth_required(self):
-        """Envoie une réponse 401 avec demande d'authentification"""
-        self.send_response(401)
-        self.send_header('WWW-Authenticate', 'Basic realm="Screenshot Viewer"')
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        
-        response = {
-            'error': 'Authentification requise',
-            'message': 'Token manquant ou invalide',
-            'help': {
-                'token_url': '?token=YOUR_TOKEN',
-                'token_header': 'X-Screenshot-Token: YOUR_TOKEN',
-                'basic_auth': 'Authorization: Basic base64(username:password)'
-            }
-        }
-        self.wfile.write(json.dumps(response, indent=2).encode())
+    start_text, _, end_text = header[6:].strip().partition('-')
+    try:
+        if not start_text:
+            # bytes=-N: les N derniers octets
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return False
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
 
-class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
-    
-    def do_GET(self):
-        """Gère les requêtes GET"""
-        try:
-            parsed_url = urlparse(self.path)
-            path = parsed_url.path
-            
-            # Health check public (pour Railway)
-            if path == '/health':
-                self.serve_health()
-                return
-            
-            # Vérification de l'authentification pour les autres endpoints
-            if not self.check_auth():
-                self.send_auth_required()
-                return
-            
-            if path == '/' or path == '/index.html':
-                self.serve_index()
-            elif path == '/api/screenshots':
-                self.serve_api_screenshots()
-            elif path == '/api/cleanup':
-                self.serve_cleanup()
-            elif path.startswith('/screenshots/'):
-                self.serve_screenshot_file(path)
-            else:
-                self.send_error(404, 'Page non trouvée')
-        except Exception as e:
-            self.send_error(500, f'Erreur serveur: {str(e)}')
-    
-    def serve_index(self):
-        """Page d'accueil avec liste des screenshots"""
-        html = """
+
+INDEX_HTML = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -298,6 +240,12 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                 <div class="toolbar">
                     <div class="stats-info">
                         <span id="fileCount">Chargement...</span>
+                        <select id="typeFilter" onchange="changeFilter()">
+                            <option value="">Tous les types</option>
+                        </select>
+                        <button class="btn" id="prevPage" onclick="changePage(-1)">◀</button>
+                        <span id="pageInfo"></span>
+                        <button class="btn" id="nextPage" onclick="changePage(1)">▶</button>
                     </div>
                     <div class="cleanup-section">
                         <div class="cleanup-status" id="cleanupStatus"></div>
@@ -320,19 +268,32 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
             </div>
 
             <script>
+                const PAGE_SIZE = 60;
+                let currentOffset = 0;
+                let currentTotal = 0;
+
+                function apiUrl(path, params) {
+                    const urlParams = new URLSearchParams(window.location.search);
+                    const token = urlParams.get('token');
+                    const query = new URLSearchParams(params);
+                    if (token) query.set('token', token);
+                    return `${path}?${query.toString()}`;
+                }
+
                 async function loadScreenshots() {
                     try {
-                        const urlParams = new URLSearchParams(window.location.search);
-                        const token = urlParams.get('token');
-                        const url = token ? `/api/screenshots?token=${token}` : '/api/screenshots';
+                        const params = {offset: currentOffset, limit: PAGE_SIZE};
+                        const type = document.getElementById('typeFilter').value;
+                        if (type) params.type = type;
                         
-                        const response = await fetch(url);
+                        const response = await fetch(apiUrl('/api/screenshots', params));
                         if (!response.ok) {
                             throw new Error(`HTTP ${response.status}`);
                         }
                         
                         const data = await response.json();
-                        displayFiles(data.files);
+                        updateTypes(data.types);
+                        displayFiles(data);
                         
                         document.querySelector('.loading').style.display = 'none';
                         
@@ -342,17 +303,39 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                     }
                 }
 
-                function displayFiles(files) {
+                function updateTypes(types) {
+                    const select = document.getElementById('typeFilter');
+                    const known = Array.from(select.options).map(option => option.value);
+                    (types || []).filter(type => !known.includes(type)).forEach(type => {
+                        select.add(new Option(type, type));
+                    });
+                }
+
+                function changeFilter() {
+                    currentOffset = 0;
+                    loadScreenshots();
+                }
+
+                function changePage(direction) {
+                    const offset = currentOffset + direction * PAGE_SIZE;
+                    if (offset < 0 || offset >= currentTotal) return;
+                    currentOffset = offset;
+                    loadScreenshots();
+                }
+
+                function displayFiles(data) {
+                    const files = data.files;
                     const container = document.getElementById('filesList');
                     const fileCountElement = document.getElementById('fileCount');
+                    currentTotal = data.total;
                     
                     // Mettre à jour les statistiques
-                    if (files && files.length > 0) {
-                        const totalSize = files.reduce((sum, file) => sum + file.size, 0);
-                        fileCountElement.textContent = `📊 ${files.length} fichiers • ${formatSize(totalSize)}`;
-                    } else {
-                        fileCountElement.textContent = '📊 0 fichiers • 0 B';
-                    }
+                    fileCountElement.textContent = `📊 ${data.total} fichiers • ${formatSize(data.total_size)}`;
+                    const pages = Math.max(1, Math.ceil(data.total / PAGE_SIZE));
+                    document.getElementById('pageInfo').textContent =
+                        `Page ${Math.floor(currentOffset / PAGE_SIZE) + 1}/${pages}`;
+                    document.getElementById('prevPage').disabled = currentOffset === 0;
+                    document.getElementById('nextPage').disabled = currentOffset + PAGE_SIZE >= data.total;
                     
                     if (!files || files.length === 0) {
                         container.innerHTML = '<div class="status">📭 Aucun screenshot disponible</div>';
@@ -364,7 +347,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                     const tokenParam = token ? `?token=${token}` : '';
 
                     container.innerHTML = `
-                        <h2>📸 Screenshots (${files.length})</h2>
+                        <h2>📸 Screenshots (${data.total})</h2>
                         <div class="file-grid">
                             ${files.map(file => `
                                 <div class="file-item">
@@ -372,9 +355,10 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                                     <div class="file-info">
                                         📏 ${formatSize(file.size)} | 
                                         🕒 ${formatDate(file.modified)}
+                                        ${file.attempt ? `| 🔁 tentative ${file.attempt}` : ''}
                                     </div>
                                     ${file.name.endsWith('.png') ? 
-                                        `<img src="/screenshots/${file.name}${tokenParam}" 
+                                        `<img src="/thumbnails/${file.name}${tokenParam}" 
                                               class="preview" 
                                               alt="Preview" 
                                               loading="lazy">` : ''}
@@ -409,11 +393,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                         button.innerHTML = '⏳ Nettoyage...';
                         status.textContent = 'Suppression en cours...';
                         
-                        const urlParams = new URLSearchParams(window.location.search);
-                        const token = urlParams.get('token');
-                        const url = token ? `/api/cleanup?token=${token}` : '/api/cleanup';
-                        
-                        const response = await fetch(url);
+                        const response = await fetch(apiUrl('/api/cleanup', {}));
                         if (!response.ok) {
                             throw new Error(`HTTP ${response.status}`);
                         }
@@ -426,6 +406,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                             
                             // Recharger la liste après 1 seconde
                             setTimeout(() => {
+                                currentOffset = 0;
                                 loadScreenshots();
                                 status.textContent = '';
                                 status.style.color = '#666';
@@ -470,48 +451,208 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
             </script>
         </body>
         </html>
-        """
+"""
+# Coquille statique (les données viennent de /api/screenshots): rendue une
+# seule fois, indentation retirée, compressée d'avance
+INDEX_BODY = '\n'.join(line.strip() for line in INDEX_HTML.splitlines() if line.strip()).encode('utf-8')
+INDEX_GZIP = gzip.compress(INDEX_BODY, compresslevel=9, mtime=0)
+INDEX_ETAG = f'"{hashlib.sha256(INDEX_BODY).hexdigest()[:32]}"'
+
+
+class AuthMixin:
+    """Mixin pour l'authentification des endpoints"""
+    
+    def check_auth(self):
+        """Vérifie l'authentification via token ou basic auth"""
+        # 1. Token dans query params ou header
+        if self.check_token_auth():
+            return True
+            
+        # 2. Basic Auth si configuré
+        if self.check_basic_auth():
+            return True
+            
+        return False
+    
+    def check_token_auth(self):
+        """Vérifie l'authentification par token"""
+        expected_token = os.getenv('SCREENSHOT_TOKEN')
+        if not expected_token:
+            return False
+            
+        # Token dans l'URL
+        parsed_url = urlparse(self.path)
+        query_params = parse_qs(parsed_url.query)
+        token_from_url = query_params.get('token', [None])[0]
         
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html; charset=utf-8')
-        self.end_headers()
-        self.wfile.write(html.encode())
+        # Token dans le header
+        token_from_header = self.headers.get('X-Screenshot-Token')
+        
+        return (token_from_url == expected_token or 
+                token_from_header == expected_token)
     
-    def serve_api_screenshots(self):
-        """API REST pour lister les screenshots"""
-        screenshots_dir = "/app/screenshots"
-        if not os.path.exists(screenshots_dir):
-            screenshots_dir = "./screenshots"
+    def check_basic_auth(self):
+        """Vérifie l'authentification basique"""
+        username = os.getenv('SCREENSHOT_USERNAME')
+        password = os.getenv('SCREENSHOT_PASSWORD')
         
-        files = []
+        if not username or not password:
+            return False
+            
+        auth_header = self.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Basic '):
+            return False
+            
         try:
-            if os.path.exists(screenshots_dir):
-                for filename in os.listdir(screenshots_dir):
-                    if filename.endswith(('.png', '.wav')):
-                        filepath = os.path.join(screenshots_dir, filename)
-                        stat = os.stat(filepath)
-                        files.append({
-                            'name': filename,
-                            'size': stat.st_size,
-                            'modified': datetime.fromtimestamp(stat.st_mtime).isoformat()
-                        })
-                
-                # Trier par date de modification (plus récent en premier)
-                files.sort(key=lambda x: x['modified'], reverse=True)
-        except Exception as e:
-            files = []
-        
+            encoded_credentials = auth_header[6:]
+            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
+            provided_username, provided_password = decoded_credentials.split(':', 1)
+            return provided_username == username and provided_password == password
+        except:
+            return False
+    
+    def send_auth_required(self):
+        """Envoie une réponse 401 avec demande d'authentification"""
         response = {
-            'files': files,
-            'total': len(files),
-            'timestamp': datetime.now().isoformat()
+            'error': 'Authentification requise',
+            'message': 'Token manquant ou invalide',
+            'help': {
+                'token_url': '?token=YOUR_TOKEN',
+                'token_header': 'X-Screenshot-Token: YOUR_TOKEN',
+                'basic_auth': 'Authorization: Basic base64(username:password)'
+            }
         }
+        self.send_json(response, status=401,
+                       headers={'WWW-Authenticate': 'Basic realm="Screenshot Viewer"'})
+
+class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
+    
+    def do_GET(self):
+        """Gère les requêtes GET"""
+        try:
+            parsed_url = urlparse(self.path)
+            path = parsed_url.path
+            
+            # Health check public (pour Railway)
+            if path == '/health':
+                self.serve_health()
+                return
+            
+            # Vérification de l'authentification pour les autres endpoints
+            if not self.check_auth():
+                self.send_auth_required()
+                return
+            
+            if path == '/' or path == '/index.html':
+                self.serve_index()
+            elif path == '/api/screenshots':
+                self.serve_api_screenshots()
+            elif path == '/api/cleanup':
+                self.serve_cleanup()
+            elif path.startswith('/screenshots/'):
+                self.serve_screenshot_file(path)
+            elif path.startswith('/thumbnails/'):
+                self.serve_thumbnail(path)
+            else:
+                self.send_error(404, 'Page non trouvée')
+        except Exception as e:
+            self.send_error(500, f'Erreur serveur: {str(e)}')
+    
+    def serve_index(self):
+        """Page d'accueil avec liste des screenshots (rendue une fois, ETag fort)"""
+        self.send_body(INDEX_BODY, 'text/html; charset=utf-8', etag=INDEX_ETAG, gzipped=INDEX_GZIP)
+    
+    def serve_api_screenshots(self):
+        """
+        API REST pour lister les screenshots (index en mémoire, paginé)
+
+        Paramètres: type, attempt, since, until (dates ISO), offset, limit
+        """
+        params = parse_qs(urlparse(self.path).query)
+
+        def param(name):
+            value = params.get(name, [''])[0].strip()
+            return value or None
+
+        try:
+            attempt = param('attempt')
+            since = param('since')
+            until = param('until')
+            offset = max(0, int(param('offset') or 0))
+            limit = min(MAX_PAGE_SIZE, max(1, int(param('limit') or DEFAULT_PAGE_SIZE)))
+            result = get_artifact_index().query(
+                artifact_type=param('type'),
+                attempt=int(attempt) if attempt else None,
+                since=datetime.fromisoformat(since).timestamp() if since else None,
+                until=datetime.fromisoformat(until).timestamp() if until else None,
+                offset=offset,
+                limit=limit
+            )
+        except ValueError as e:
+            self.send_json({'error': f'Paramètre invalide: {e}'}, status=400)
+            return
+
+        result['timestamp'] = datetime.now().isoformat(timespec='seconds')
+        self.send_json(result, cors=True)
+
+    def send_json(self, data, status=200, cors=False, headers=None):
+        """Réponse JSON compacte (gzip si accepté)"""
+        body = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        headers = dict(headers or {})
+        if cors:
+            headers['Access-Control-Allow-Origin'] = '*'
+        self.send_body(body, 'application/json; charset=utf-8', status=status, headers=headers)
+    
+    def accepts_gzip(self):
+        """Accept-Encoding contient gzip avec un q non nul"""
+        for part in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = part.partition(';')
+            if name.strip().lower() != 'gzip':
+                continue
+            params = params.replace(' ', '')
+            if params.startswith('q='):
+                try:
+                    return float(params[2:]) > 0
+                except ValueError:
+                    return False
+            return True
+        return False
+    
+    def send_body(self, body, content_type, status=200, headers=None, etag=None, gzipped=None):
+        """
+        Envoie une réponse en mémoire, compressée en gzip si le client l'accepte
+
+        gzipped: version déjà compressée du corps (évite de recompresser).
+        Avec un ETag, If-None-Match correspondant donne une 304 sans corps.
+        """
+        encoding = None
+        if len(body) >= GZIP_MIN_SIZE and self.accepts_gzip():
+            body = gzipped or gzip.compress(body, compresslevel=5)
+            encoding = 'gzip'
+            # ETag fort: une valeur distincte par représentation
+            etag = f'{etag[:-1]}-gz"' if etag else None
+        
+        if etag and etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', REVALIDATE_CACHE_CONTROL)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', REVALIDATE_CACHE_CONTROL)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(response, indent=2).encode())
+        self.wfile.write(body)
     
     def serve_screenshot_file(self, path):
         """Sert un fichier screenshot spécifique"""
@@ -522,11 +663,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
             self.send_error(403, 'Accès interdit')
             return
         
-        screenshots_dir = "/app/screenshots"
-        if not os.path.exists(screenshots_dir):
-            screenshots_dir = "./screenshots"
-        
-        filepath = os.path.join(screenshots_dir, filename)
+        filepath = os.path.join(screenshots_dir(), filename)
         
         if not os.path.exists(filepath):
             self.send_error(404, 'Fichier non trouvé')
@@ -537,41 +674,153 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
         if content_type is None:
             content_type = 'application/octet-stream'
         
+        immutable = parse_artifact_name(filename)['attempt'] is not None
+        self.send_static_file(filepath, content_type, immutable)
+    
+    def send_static_file(self, filepath, content_type, immutable=False):
+        """
+        Envoie un fichier en flux (os.sendfile si possible)
+
+        Gère ETag/If-None-Match, Last-Modified/If-Modified-Since et les
+        requêtes Range à plage unique (If-Range compris).
+        """
         try:
-            with open(filepath, 'rb') as f:
-                content = f.read()
+            f = open(filepath, 'rb')
+        except FileNotFoundError:
+            self.send_error(404, 'Fichier non trouvé')
+            return
+        
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+            validators = {
+                'ETag': etag,
+                'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+                'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            }
             
-            self.send_response(200)
+            if self.is_not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                for name, value in validators.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+            
+            start, end, status = 0, size - 1, 200
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if range_header and size and (not if_range or if_range == etag):
+                byte_range = parse_range(range_header, size)
+                if byte_range is None:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if byte_range:
+                    start, end = byte_range
+                    status = 206
+            
+            self.send_response(status)
             self.send_header('Content-type', content_type)
-            self.send_header('Content-Length', str(len(content)))
-            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            for name, value in validators.items():
+                self.send_header(name, value)
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
             self.end_headers()
-            self.wfile.write(content)
             
+            try:
+                self.copy_file(f, start, end - start + 1)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client parti en cours de téléchargement
+                pass
+    
+    def is_not_modified(self, etag, mtime):
+        """Requête conditionnelle satisfaite par la version en cache du client"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            candidates = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+    
+    def copy_file(self, f, offset, count):
+        """Copie count octets du fichier vers le socket, sans tout charger en mémoire"""
+        self.wfile.flush()
+        if hasattr(os, 'sendfile'):
+            try:
+                while count > 0:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, count)
+                    if sent == 0:
+                        return
+                    offset += sent
+                    count -= sent
+                return
+            except OSError as e:
+                if isinstance(e, (BrokenPipeError, ConnectionResetError)):
+                    raise
+                # sendfile non supporté ici (ex: socket TLS): repli par blocs
+        f.seek(offset)
+        while count > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, count))
+            if not chunk:
+                return
+            self.wfile.write(chunk)
+            count -= len(chunk)
+    
+    def serve_thumbnail(self, path):
+        """Sert la miniature d'une capture PNG (générée au premier appel)"""
+        filename = path.split('/')[-1]
+        
+        # Vérification de sécurité
+        if '..' in filename or '/' in filename or not filename.endswith('.png'):
+            self.send_error(403, 'Accès interdit')
+            return
+        
+        try:
+            thumb_path, content_type = get_thumbnail_cache().get(os.path.join(screenshots_dir(), filename))
+        except FileNotFoundError:
+            self.send_error(404, 'Fichier non trouvé')
+            return
+        except TimeoutError:
+            self.send_error(503, 'Miniature en cours de génération')
+            return
         except Exception as e:
-            self.send_error(500, f'Erreur de lecture: {str(e)}')
+            self.send_error(500, f'Miniature impossible: {str(e)}')
+            return
+        
+        immutable = parse_artifact_name(filename)['attempt'] is not None
+        self.send_static_file(thumb_path, content_type, immutable)
     
     def serve_cleanup(self):
         """Nettoie le dossier screenshots"""
         try:
-            screenshots_dir = "/app/screenshots"
-            if not os.path.exists(screenshots_dir):
-                screenshots_dir = "./screenshots"
+            directory = screenshots_dir()
             
             deleted_count = 0
             deleted_files = []
             errors = []
             
-            if os.path.exists(screenshots_dir):
-                for filename in os.listdir(screenshots_dir):
+            if os.path.exists(directory):
+                for filename in os.listdir(directory):
                     if filename.endswith(('.png', '.wav')) and not filename.startswith('.'):
-                        filepath = os.path.join(screenshots_dir, filename)
+                        filepath = os.path.join(directory, filename)
                         try:
                             os.remove(filepath)
+                            get_thumbnail_cache().discard(filename)
                             deleted_files.append(filename)
                             deleted_count += 1
                         except Exception as e:
                             errors.append(f"{filename}: {str(e)}")
+                get_artifact_index().refresh(force=True)
             
             response = {
                 'success': True,
@@ -585,10 +834,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                 response['success'] = False
                 response['error'] = f"{len(errors)} erreur(s) lors de la suppression"
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self.send_json(response)
             
             # Log de l'action
             client_ip = self.client_address[0]
@@ -602,10 +848,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
                 'timestamp': datetime.now().isoformat()
             }
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(error_response, indent=2).encode())
+            self.send_json(error_response, status=500)
     
     def serve_health(self):
         """Health check public pour Railway"""
@@ -616,10 +859,7 @@ class ScreenshotViewerHandler(AuthMixin, BaseHTTPRequestHandler):
             'version': '1.0.0'
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(health_data, indent=2).encode())
+        self.send_json(health_data)
     
     def log_message(self, format, *args):
         """Surcharge pour logger les accès"""
@@ -638,7 +878,8 @@ def run_screenshot_viewer(port=8081):
             print(f"🔑 Token auto-généré: {token}")
             print(f"🔗 URL d'accès: http://localhost:{port}/?token={token}")
         
-        server = HTTPServer(('', port), ScreenshotViewerHandler)
+        # Un thread par connexion: un client lent ne bloque ni les autres ni /health
+        server = ThreadingHTTPServer(('', port), ScreenshotViewerHandler)
         print(f"🖼️ Screenshot viewer sécurisé démarré sur :{port}")
         
         # Informations d'authentification
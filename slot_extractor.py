@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Extraction structurée des créneaux de la page /creneau/
+
+Chaque élément réservable (bouton, lien, option, attributs data-date/
+data-time...) de la liste de créneaux (SLOT_CONTAINER_SELECTOR, toute la page
+sinon) donne un créneau: son heure (09h30, 09:30) et la date (« mardi 21
+octobre 2026 », 21/10/2026, 2026-10-21) qu'il porte ou que porte l'en-tête de
+sa ligne. Les créneaux sont indexés par date et filtrables (SLOT_FILTER_*);
+ils enrichissent une page déjà classée disponible, sans décider seuls de la
+disponibilité.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from datetime import time as dtime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import json_state
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    'janvier': 1, 'février': 2, 'fevrier': 2, 'mars': 3, 'avril': 4, 'mai': 5, 'juin': 6,
+    'juillet': 7, 'août': 8, 'aout': 8, 'septembre': 9, 'octobre': 10, 'novembre': 11,
+    'décembre': 12, 'decembre': 12,
+}
+WEEKDAYS = {'lun': 0, 'mar': 1, 'mer': 2, 'jeu': 3, 'ven': 4, 'sam': 5, 'dim': 6}
+
+_FRENCH_DATE = re.compile(
+    r'\b(\d{1,2})(?:er)?\s+(' + '|'.join(MONTHS) + r')\s+(\d{4})\b', re.IGNORECASE)
+_NUMERIC_DATE = re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b')
+_ISO_DATE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+_TIME = re.compile(r'\b([01]?\d|2[0-3])\s*[h:]\s*([0-5]\d)\b', re.IGNORECASE)
+
+# Attributs où le site peut porter la date ou l'heure d'un créneau
+SLOT_ATTRIBUTES = ('value', 'data-date', 'data-time', 'data-slot', 'datetime', 'aria-label', 'title')
+# Éléments cliquables: une date seule y vaut un créneau (jour réservable)
+SELECTABLE_TAGS = {'button', 'a', 'option', 'input', 'label'}
+# Attributs qui font d'un élément quelconque un créneau
+SLOT_DATA_ATTRIBUTES = ('data-date', 'data-time', 'data-slot')
+# Ancêtres remontés pour trouver la date d'un créneau (jour ou ligne de tableau)
+SLOT_ROW_DEPTH = 3
+
+
+class Slot(NamedTuple):
+    """Créneau: jour et, si la page la donne, heure de début"""
+    day: date
+    start: Optional[dtime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'date': self.day.isoformat(),
+            'time': self.start.strftime('%H:%M') if self.start else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Slot':
+        start = datetime.strptime(data['time'], '%H:%M').time() if data.get('time') else None
+        return cls(date.fromisoformat(data['date']), start)
+
+
+def parse_dates(text: str) -> List[date]:
+    """Dates présentes dans un texte (formats français, numérique et ISO)"""
+    found = []
+    for day, month, year in _FRENCH_DATE.findall(text):
+        found.append((int(year), MONTHS[month.lower()], int(day)))
+    for day, month, year in _NUMERIC_DATE.findall(text):
+        found.append((int(year), int(month), int(day)))
+    for year, month, day in _ISO_DATE.findall(text):
+        found.append((int(year), int(month), int(day)))
+
+    dates = []
+    for year, month, day in found:
+        try:
+            dates.append(date(year, month, day))
+        except ValueError:
+            continue
+    return dates
+
+
+def parse_times(text: str) -> List[dtime]:
+    """Heures présentes dans un texte (09h30, 9:30, 14 h 00)"""
+    # Les dates ISO/numériques ne doivent pas passer pour des heures
+    text = _ISO_DATE.sub(' ', _NUMERIC_DATE.sub(' ', text))
+    return [dtime(int(hour), int(minute)) for hour, minute in _TIME.findall(text)]
+
+
+def _element_text(element) -> str:
+    """Texte propre à l'élément (sans ses enfants) et attributs de créneau"""
+    from bs4 import NavigableString
+
+    own_text = ' '.join(str(child) for child in element.children if isinstance(child, NavigableString))
+    attributes = ' '.join(str(element.get(name, '')) for name in SLOT_ATTRIBUTES)
+    return f"{own_text} {attributes}"
+
+
+def _is_slot_element(element) -> bool:
+    """Élément réservable: cliquable ou portant des attributs de créneau"""
+    return element.name in SELECTABLE_TAGS or any(element.has_attr(name) for name in SLOT_DATA_ATTRIBUTES)
+
+
+def _day_of(element) -> Optional[date]:
+    """
+    Date d'un élément de créneau: la sienne, sinon celle de l'en-tête de sa ligne
+
+    La ligne est l'un des SLOT_ROW_DEPTH premiers ancêtres; sa date est portée
+    par l'ancêtre lui-même ou par un enfant qui n'est pas un créneau
+    (titre de jour, cellule de date). Une date ailleurs dans la page (date de
+    mise à jour, bandeau) ne s'applique donc jamais aux heures d'un créneau.
+    """
+    days = parse_dates(_element_text(element))
+    if days:
+        return days[0]
+    ancestor = element
+    for _ in range(SLOT_ROW_DEPTH):
+        ancestor = ancestor.parent
+        if ancestor is None or ancestor.name in ('body', '[document]'):
+            return None
+        days = parse_dates(_element_text(ancestor))
+        for child in ancestor.find_all(True, recursive=False):
+            if days:
+                break
+            if not _is_slot_element(child) and not child.find(_is_slot_element):
+                days = parse_dates(child.get_text(' '))
+        if days:
+            return days[0]
+    return None
+
+
+def extract_slots(html: str, container: Optional[str] = None) -> List[Slot]:
+    """
+    Créneaux présents dans le HTML de la page /creneau/ (ordre chronologique)
+
+    Seuls les éléments réservables (boutons, liens, options, attributs
+    data-date/data-time...) donnent des créneaux: une heure dans un texte
+    (horaires d'ouverture, « mis à jour le 19/10/2026 14:05 ») n'en est pas un.
+
+    Args:
+        container: sélecteur CSS de la liste de créneaux (toute la page sinon)
+
+    Returns:
+        Liste dédupliquée; vide si aucun créneau reconnaissable
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript', 'head']):
+        tag.decompose()
+    roots = soup.select(container) if container else [soup]
+
+    slots: Set[Slot] = set()
+    for root in roots:
+        for element in root.find_all(_is_slot_element):
+            text = _element_text(element)
+            times = parse_times(text)
+            if times:
+                day = _day_of(element)
+                if day is not None:
+                    slots.update(Slot(day, start) for start in times)
+                continue
+            # Jour réservable sans heure: la date doit être portée par l'élément lui-même
+            days = parse_dates(text)
+            if days:
+                slots.add(Slot(days[0]))
+
+    # Un jour qui a des heures n'a pas besoin d'une entrée « jour seul »
+    days_with_times = {slot.day for slot in slots if slot.start}
+    return sorted((slot for slot in slots if slot.start or slot.day not in days_with_times),
+                  key=lambda slot: (slot.day, slot.start or dtime.min))
+
+
+def index_by_date(slots: Iterable[Slot]) -> Dict[str, List[Optional[str]]]:
+    """Créneaux regroupés par jour ISO: {'2026-10-21': ['09:30', '10:00']}"""
+    index: Dict[str, List[Optional[str]]] = {}
+    for slot in slots:
+        record = slot.to_dict()
+        index.setdefault(record['date'], []).append(record['time'])
+    return index
+
+
+def summarize_slots(slots: List[Dict[str, Any]], limit: int = 6) -> str:
+    """Résumé court pour les notifications: « 21/10 09:30, 10:00 · 22/10 »"""
+    index: Dict[str, List[str]] = {}
+    for slot in slots:
+        times = index.setdefault(slot['date'], [])
+        if slot.get('time'):
+            times.append(slot['time'])
+    parts = []
+    for day, times in list(index.items())[:limit]:
+        label = date.fromisoformat(day).strftime('%d/%m')
+        parts.append(f"{label} {', '.join(times)}" if times else label)
+    if len(index) > limit:
+        parts.append(f"+{len(index) - limit} jour(s)")
+    return ' · '.join(parts)
+
+
+def _weekday_index(bound: str, value: str) -> int:
+    """Indice 0-6 d'un jour (« lun » ou « 1 »), ValueError si inconnu"""
+    if bound.isdigit() and 1 <= int(bound) <= 7:
+        return int(bound) - 1
+    if bound in WEEKDAYS:
+        return WEEKDAYS[bound]
+    raise ValueError(f"Jour invalide: {value!r}")
+
+
+def _parse_weekdays(value: str) -> Optional[Set[int]]:
+    """« lun-ven », « sam,dim », « ven-lun » (plage sur la fin de semaine) ou « 1-5 » (1 = lundi)"""
+    if not value:
+        return None
+    weekdays: Set[int] = set()
+    for part in value.lower().split(','):
+        bounds = [bound.strip()[:3] for bound in part.split('-')]
+        if len(bounds) > 2:
+            raise ValueError(f"Jour invalide: {value!r}")
+        indices = [_weekday_index(bound, value) for bound in bounds]
+        if len(indices) == 2:
+            # « sam-lun » couvre samedi, dimanche et lundi
+            span = (indices[1] - indices[0]) % 7
+            weekdays.update((indices[0] + offset) % 7 for offset in range(span + 1))
+        else:
+            weekdays.add(indices[0])
+    return weekdays
+
+
+def _parse_time(value: str) -> Optional[dtime]:
+    if not value:
+        return None
+    times = parse_times(value)
+    if not times:
+        raise ValueError(f"Heure invalide: {value!r}")
+    return times[0]
+
+
+class SlotFilter:
+    """Critères d'intérêt des créneaux (bornes de dates, jours, plage horaire)"""
+
+    def __init__(self, before: Optional[date] = None, after: Optional[date] = None,
+                 weekdays: Optional[Set[int]] = None, time_from: Optional[dtime] = None,
+                 time_to: Optional[dtime] = None):
+        self.before = before
+        self.after = after
+        self.weekdays = weekdays
+        self.time_from = time_from
+        self.time_to = time_to
+
+    @classmethod
+    def from_env(cls) -> 'SlotFilter':
+        """
+        Critères depuis .env (tous optionnels)
+
+        SLOT_FILTER_BEFORE / SLOT_FILTER_AFTER: dates ISO (bornes exclues)
+        SLOT_FILTER_WEEKDAYS: ex. « lun-ven »
+        SLOT_FILTER_TIME_FROM / SLOT_FILTER_TIME_TO: ex. « 08:00 » et « 12:00 »
+        """
+        before = os.getenv('SLOT_FILTER_BEFORE')
+        after = os.getenv('SLOT_FILTER_AFTER')
+        return cls(
+            before=date.fromisoformat(before) if before else None,
+            after=date.fromisoformat(after) if after else None,
+            weekdays=_parse_weekdays(os.getenv('SLOT_FILTER_WEEKDAYS', '')),
+            time_from=_parse_time(os.getenv('SLOT_FILTER_TIME_FROM', '')),
+            time_to=_parse_time(os.getenv('SLOT_FILTER_TIME_TO', ''))
+        )
+
+    @property
+    def active(self) -> bool:
+        return any(value is not None for value in
+                   (self.before, self.after, self.weekdays, self.time_from, self.time_to))
+
+    def matches(self, slot: Slot) -> bool:
+        if self.before and slot.day >= self.before:
+            return False
+        if self.after and slot.day <= self.after:
+            return False
+        if self.weekdays is not None and slot.day.weekday() not in self.weekdays:
+            return False
+        # Un créneau sans heure connue n'est pas écarté par la plage horaire
+        if slot.start is not None:
+            if self.time_from and slot.start < self.time_from:
+                return False
+            if self.time_to and slot.start > self.time_to:
+                return False
+        return True
+
+    def apply(self, slots: Iterable[Slot]) -> List[Slot]:
+        return [slot for slot in slots if self.matches(slot)]
+
+    def describe(self) -> str:
+        """Libellé des critères pour les logs"""
+        parts = []
+        if self.after:
+            parts.append(f"après le {self.after.isoformat()}")
+        if self.before:
+            parts.append(f"avant le {self.before.isoformat()}")
+        if self.weekdays is not None:
+            names = [name for name, index in WEEKDAYS.items() if index in self.weekdays]
+            parts.append('/'.join(names))
+        if self.time_from or self.time_to:
+            start = self.time_from.strftime('%H:%M') if self.time_from else '00:00'
+            end = self.time_to.strftime('%H:%M') if self.time_to else '23:59'
+            parts.append(f"{start}-{end}")
+        return ', '.join(parts) or 'aucun'
+
+
+class SlotIndex:
+    """Derniers créneaux vus par cible, indexés par date (persistés sur disque)"""
+
+    def __init__(self, persist_path: Optional[str] = None):
+        self.persist_path = persist_path
+        self._lock = threading.Lock()
+        self._targets: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'SlotIndex':
+        return cls(os.getenv('SLOT_INDEX_PATH', 'data/slots.json') or None)
+
+    def update(self, target: str, slots: List[Slot]) -> None:
+        with self._lock:
+            self._targets[target] = {'updated_at': time.time(), 'dates': index_by_date(slots)}
+            self._save()
+
+    def slots(self, target: str) -> List[Slot]:
+        """Créneaux mémorisés pour une cible"""
+        with self._lock:
+            dates = self._targets.get(target, {}).get('dates', {})
+            return [Slot.from_dict({'date': day, 'time': start})
+                    for day, times in dates.items() for start in times]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return json.loads(json.dumps(self._targets))
+
+    def _load(self) -> None:
+        state = json_state.load(self.persist_path, "Index des créneaux")
+        if isinstance(state, dict):
+            self._targets = state.get('targets', {})
+
+    def _save(self) -> None:
+        json_state.save_atomic(self.persist_path, {'updated_at': time.time(), 'targets': self._targets},
+                               "l'index des créneaux")
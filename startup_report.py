@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Mesure des temps d'import et d'initialisation au démarrage (--startup-report)
+"""
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Tuple
+
+# Référence: premier import de ce module (au tout début de scanner.py)
+PROCESS_START = time.perf_counter()
+
+
+class StartupReport:
+    """Collecte la durée de chaque composant chargé au démarrage"""
+
+    def __init__(self):
+        self.entries: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def measure(self, component: str) -> Iterator[None]:
+        """Chronomètre un import ou une initialisation (seul le premier passage compte)"""
+        if any(name == component for name, _ in self.entries):
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.entries.append((component, time.perf_counter() - started))
+
+    def format(self) -> str:
+        """Rapport lisible trié par ordre de chargement"""
+        total = time.perf_counter() - PROCESS_START
+        lines = ["⏱️ RAPPORT DE DÉMARRAGE", "=" * 50]
+        for component, duration in self.entries:
+            lines.append(f"   {component:<35} {duration * 1000:8.1f} ms")
+        lines.append("-" * 50)
+        lines.append(f"   {'Total depuis le lancement':<35} {total * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+startup_report = StartupReport()
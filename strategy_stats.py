@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Statistiques d'acceptation et de latence par stratégie de résolution et par cible
+
+Fenêtre glissante des N derniers essais de chaque stratégie (multimodal,
+image_only, audio_only...) pour chaque page cible, persistée sur disque.
+Sert à ordonner le fallback (temps attendu avant une réponse acceptée) et à
+dériver l'étiquette de confiance du taux d'acceptation observé.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import json_state
+from captcha_ensemble import confidence_label
+
+logger = logging.getLogger(__name__)
+
+# Taux d'acceptation supposé avant toute observation (ordre historique)
+PRIOR_RATES = {'multimodal': 0.8, 'image_only': 0.6, 'audio_only': 0.4}
+DEFAULT_PRIOR_RATE = 0.5
+# Poids du prior, en nombre d'essais fictifs
+PRIOR_STRENGTH = 3.0
+# Latence supposée (s) d'une stratégie jamais essayée
+DEFAULT_LATENCY = 3.0
+
+
+class StrategyStats:
+    """Fenêtres glissantes (accepté, latence) par cible et stratégie"""
+
+    def __init__(self, window: int = 50, persist_path: Optional[str] = None):
+        self.window = window
+        self.persist_path = persist_path
+        self._lock = threading.Lock()
+        self._windows: Dict[str, Dict[str, Deque[Tuple[int, float]]]] = {}
+        self._load()
+
+    @classmethod
+    def from_env(cls) -> 'StrategyStats':
+        """Construit les statistiques depuis la configuration .env"""
+        return cls(
+            window=int(os.getenv('CAPTCHA_STRATEGY_WINDOW', '50')),
+            persist_path=os.getenv('CAPTCHA_STRATEGY_STATS_PATH', 'data/strategy_stats.json') or None
+        )
+
+    def record(self, target: str, strategy: str, accepted: bool, latency: float) -> None:
+        """Ajoute un essai (réponse acceptée par le site ou non) à la fenêtre"""
+        with self._lock:
+            window = self._windows.setdefault(target, {}).setdefault(
+                strategy, deque(maxlen=self.window))
+            window.append((int(accepted), round(latency, 3)))
+            self._save()
+
+    def acceptance_rate(self, target: str, strategy: str) -> float:
+        """Taux d'acceptation lissé par le prior de la stratégie"""
+        prior = PRIOR_RATES.get(strategy, DEFAULT_PRIOR_RATE)
+        with self._lock:
+            window = self._windows.get(target, {}).get(strategy, ())
+            accepted = sum(outcome for outcome, _ in window)
+            return (accepted + prior * PRIOR_STRENGTH) / (len(window) + PRIOR_STRENGTH)
+
+    def mean_latency(self, target: str, strategy: str) -> float:
+        """
+        Latence moyenne observée; pour une stratégie jamais essayée, moyenne
+        des autres stratégies de la cible (seul le prior départage alors)
+        """
+        with self._lock:
+            strategies = self._windows.get(target, {})
+            window = strategies.get(strategy)
+            if window:
+                return sum(latency for _, latency in window) / len(window)
+            observed = [w for w in strategies.values() if w]
+            if not observed:
+                return DEFAULT_LATENCY
+            return sum(sum(latency for _, latency in w) / len(w) for w in observed) / len(observed)
+
+    def expected_cost(self, target: str, strategy: str) -> float:
+        """Temps attendu (s) avant une réponse acceptée: latence / taux d'acceptation"""
+        return self.mean_latency(target, strategy) / max(0.01, self.acceptance_rate(target, strategy))
+
+    def order(self, target: str, strategies: Sequence[str]) -> List[str]:
+        """Stratégies triées de la plus rentable à la moins rentable (stable)"""
+        return sorted(strategies, key=lambda strategy: self.expected_cost(target, strategy))
+
+    def confidence(self, target: str, strategy: str) -> str:
+        """Étiquette de confiance (high/medium/low) d'après le taux d'acceptation"""
+        return confidence_label(self.acceptance_rate(target, strategy))
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Taux, latence moyenne et volume par cible et stratégie"""
+        with self._lock:
+            keys = [(target, strategy, len(window))
+                    for target, strategies in self._windows.items()
+                    for strategy, window in strategies.items()]
+        snapshot: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for target, strategy, samples in keys:
+            snapshot.setdefault(target or 'default', {})[strategy] = {
+                'samples': samples,
+                'acceptance': round(self.acceptance_rate(target, strategy), 3),
+                'avg_latency': round(self.mean_latency(target, strategy), 3),
+            }
+        return snapshot
+
+    def _load(self) -> None:
+        state = json_state.load(self.persist_path, "Statistiques de stratégies")
+        if not isinstance(state, dict):
+            return
+        for target, strategies in state.get('windows', {}).items():
+            for strategy, entries in strategies.items():
+                self._windows.setdefault(target, {})[strategy] = deque(
+                    ((int(a), float(l)) for a, l in entries), maxlen=self.window)
+
+    def _save(self) -> None:
+        """Fenêtres glissantes sur disque (verrou tenu)"""
+        json_state.save_atomic(self.persist_path, {
+            'updated_at': time.time(),
+            'windows': {
+                target: {strategy: list(window) for strategy, window in strategies.items()}
+                for target, strategies in self._windows.items()
+            },
+        }, "les statistiques de stratégies")
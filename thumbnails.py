@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Miniatures des captures pour l'aperçu du viewer
+
+Générées à la première demande (PIL, WebP si disponible sinon JPEG), gardées
+sur disque (THUMBNAIL_CACHE_DIR) et régénérées si la capture source est plus
+récente. La génération passe par un pool borné (THUMBNAIL_WORKERS) et les
+demandes simultanées d'une même miniature partagent le même calcul: un
+chargement de page ne peut pas monopoliser le CPU dont le scanner a besoin.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+class ThumbnailCache:
+    """Cache disque de miniatures, invalidé par le mtime de la source"""
+
+    def __init__(self, cache_dir: str = 'data/thumbnails', width: int = 320,
+                 workers: int = 1, quality: int = 70, image_format: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.width = width
+        self.quality = quality
+        self._format = image_format
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='thumbnail')
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self.stats = {'hits': 0, 'generated': 0, 'errors': 0}
+
+    @classmethod
+    def from_env(cls) -> 'ThumbnailCache':
+        """Construit le cache depuis la configuration .env"""
+        return cls(
+            cache_dir=os.getenv('THUMBNAIL_CACHE_DIR', 'data/thumbnails'),
+            width=int(os.getenv('THUMBNAIL_WIDTH', '320')),
+            workers=int(os.getenv('THUMBNAIL_WORKERS', '1'))
+        )
+
+    @property
+    def image_format(self) -> str:
+        """WebP si le Pillow installé sait l'encoder, sinon JPEG"""
+        if self._format is None:
+            from PIL import features
+            self._format = 'webp' if features.check('webp') else 'jpeg'
+        return self._format
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.image_format]
+
+    def get(self, source_path: str, timeout: float = 30.0) -> Tuple[str, str]:
+        """
+        Chemin de la miniature à jour de source_path (générée si besoin)
+
+        Returns:
+            (chemin de la miniature, type MIME)
+
+        Raises:
+            FileNotFoundError: source absente
+            concurrent.futures.TimeoutError: génération trop longue (pool saturé)
+        """
+        source_mtime = os.stat(source_path).st_mtime
+        thumb_path = self._thumb_path(source_path)
+        if self._is_fresh(thumb_path, source_mtime):
+            with self._lock:
+                self.stats['hits'] += 1
+            return thumb_path, self.content_type
+
+        with self._lock:
+            future = self._in_flight.get(thumb_path)
+            if future is None:
+                future = self._executor.submit(self._generate, source_path, thumb_path, source_mtime)
+                self._in_flight[thumb_path] = future
+                future.add_done_callback(lambda _, key=thumb_path: self._release(key))
+        return future.result(timeout=timeout), self.content_type
+
+    def discard(self, source_name: str) -> None:
+        """Supprime les miniatures d'une capture supprimée"""
+        prefix = f"{os.path.splitext(source_name)[0]}."
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.cache_dir, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Miniature de {source_name} non supprimée: {e}")
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _thumb_path(self, source_path: str) -> str:
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        extension = 'jpg' if self.image_format == 'jpeg' else self.image_format
+        return os.path.join(self.cache_dir, f"{name}.{self.width}.{extension}")
+
+    @staticmethod
+    def _is_fresh(thumb_path: str, source_mtime: float) -> bool:
+        try:
+            # La miniature porte le mtime de sa source (os.utime à la génération)
+            return os.stat(thumb_path).st_mtime == source_mtime
+        except FileNotFoundError:
+            return False
+
+    def _generate(self, source_path: str, thumb_path: str, source_mtime: float) -> str:
+        """Redimensionne le haut de la capture (pool de workers)"""
+        from PIL import Image
+
+        if self._is_fresh(thumb_path, source_mtime):
+            return thumb_path
+        try:
+            with Image.open(source_path) as image:
+                # Capture pleine page: l'aperçu montre le haut, au format 4:3
+                crop_height = min(image.height, image.width * 3 // 4)
+                preview = image.crop((0, 0, image.width, crop_height)).convert('RGB')
+                preview.thumbnail((self.width, self.width), Image.LANCZOS)
+
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{thumb_path}.tmp"
+            preview.save(tmp_path, format=self.image_format.upper(), quality=self.quality)
+            os.utime(tmp_path, (source_mtime, source_mtime))
+            os.replace(tmp_path, thumb_path)
+        except Exception:
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        with self._lock:
+            self.stats['generated'] += 1
+        return thumb_path
+
+
+_shared_cache: Optional[ThumbnailCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Cache de miniatures partagé (un seul pool par processus)"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ThumbnailCache.from_env()
+        return _shared_cache